@@ -1,11 +1,48 @@
 from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Left, Now, StrIndex
 
-from .models import Item, Order, OrderItem, Discount, Tax
+from .models import Item, Order, OrderItem, Discount, Tax, StripeEvent, CheckoutJob
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Базовый класс админки для больших таблиц.
+
+    Количество строк без фильтров оценивается по статистике PostgreSQL (EstimatedCountPaginator),
+    дополнительный COUNT(*) по всей таблице для отфильтрованного списка не выполняется.
+    Поиск выполняется только точным совпадением по полям из search_fields (по индексам), а не
+    через icontains: поля, в тип которых строка поиска не преобразуется (например, число), пропускаются.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+
+        if not search_term:
+            return queryset, False
+
+        query = Q()
+
+        for path in self.get_search_fields(request):
+            try:
+                value = get_fields_from_path(self.model, path)[-1].to_python(search_term)
+            except ValidationError:
+                continue
+
+            query |= Q(**{path: value})
+
+        return (queryset.filter(query) if query else queryset.none()), False
 
 
 class ItemAdmin(admin.ModelAdmin):
     list_display = [
         'id',
+        'sku',
         'name',
         'description',
         'price',
@@ -20,14 +57,40 @@ class ItemAdmin(admin.ModelAdmin):
         'currency',
         # 'image',
     ]
+    search_fields = [
+        'sku',
+        'name',
+    ]
+    actions = [
+        'resync_to_stripe',
+    ]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
+    @admin.action(description='Синхронизировать со Stripe')
+    def resync_to_stripe(self, request, queryset):
+        # Сброс отпечатков одним UPDATE: товары будут отправлены в Stripe при следующем sync_stripe_catalog.
+        # Префикс "<валюта>:" отпечатка цены сохраняется, иначе вместо обновления Product был бы создан новый
+        updated = queryset.update(
+            stripe_price_fingerprint=Concat(
+                Left('stripe_price_fingerprint', StrIndex('stripe_price_fingerprint', Value(':'))),
+                Value('resync'),
+            ),
+            stripe_product_fingerprint='',
+        )
+        self.message_user(
+            request, f'Отмечено товаров для синхронизации: {updated}. Запустите manage.py sync_stripe_catalog.'
+        )
 
-class OrderItemAdmin(admin.ModelAdmin):
+
+class OrderItemAdmin(LargeTableAdmin):
     list_display = [
         'id',
         'order',
         'item',
         'quantity',
+        'unit_price',
+        'currency',
     ]
     list_display_links = [
         'id',
@@ -35,9 +98,33 @@ class OrderItemAdmin(admin.ModelAdmin):
         'item',
         'quantity',
     ]
+    list_select_related = [
+        'order',
+        'item',
+    ]
+    raw_id_fields = [
+        'order',
+        'item',
+    ]
+    readonly_fields = [
+        'unit_price',
+        'currency',
+    ]
+    search_fields = [
+        'order_id',
+        'item_id',
+    ]
+    search_help_text = 'Номер заказа или товара'
+
+    def save_model(self, request, obj, form, change):
+        # Цена фиксируется при добавлении товара в заказ и обновляется только при замене товара
+        if 'item' in form.changed_data:
+            obj.snapshot_price()
 
+        super().save_model(request, obj, form, change)
 
-class OrderAdmin(admin.ModelAdmin):
+
+class OrderAdmin(LargeTableAdmin):
     list_display = [
         'id',
         'user',
@@ -45,6 +132,9 @@ class OrderAdmin(admin.ModelAdmin):
         'telephone',
         'discount',
         'tax',
+        'total',
+        'status',
+        'paid_at',
     ]
     list_display_links = [
         'id',
@@ -53,8 +143,40 @@ class OrderAdmin(admin.ModelAdmin):
         'telephone',
         'discount',
         'tax',
+        'total',
+        'status',
+        'paid_at',
+    ]
+    list_select_related = [
+        'user',
+        'discount',
+        'tax',
+    ]
+    list_filter = [
+        'status',
+        'created_at',
+    ]
+    raw_id_fields = [
+        'user',
+    ]
+    autocomplete_fields = [
+        'discount',
+        'tax',
+    ]
+    search_fields = [
+        'id',
+        'user__username',
+    ]
+    search_help_text = 'Номер заказа или имя пользователя'
+    actions = [
+        'mark_paid',
     ]
 
+    @admin.action(description='Отметить как оплаченные')
+    def mark_paid(self, request, queryset):
+        updated = queryset.exclude(status=Order.STATUS_PAID).update(status=Order.STATUS_PAID, paid_at=Now())
+        self.message_user(request, f'Отмечено оплаченными заказов: {updated}')
+
 
 class DiscountAdmin(admin.ModelAdmin):
     list_display = [
@@ -67,6 +189,9 @@ class DiscountAdmin(admin.ModelAdmin):
         'name',
         'amount',
     ]
+    search_fields = [
+        'name',
+    ]
 
 
 class TaxAdmin(admin.ModelAdmin):
@@ -80,6 +205,69 @@ class TaxAdmin(admin.ModelAdmin):
         'name',
         'rate',
     ]
+    search_fields = [
+        'name',
+    ]
+
+
+class StripeEventAdmin(LargeTableAdmin):
+    list_display = [
+        'id',
+        'event_id',
+        'type',
+        'received_at',
+        'processed_at',
+    ]
+    list_display_links = [
+        'id',
+        'event_id',
+        'type',
+        'received_at',
+        'processed_at',
+    ]
+    search_fields = [
+        'event_id',
+    ]
+    readonly_fields = [
+        'event_id',
+        'type',
+        'payload',
+        'received_at',
+        'processed_at',
+    ]
+
+
+class CheckoutJobAdmin(LargeTableAdmin):
+    list_display = [
+        'id',
+        'kind',
+        'object_id',
+        'status',
+        'attempts',
+        'created_at',
+        'finished_at',
+    ]
+    list_display_links = [
+        'id',
+        'kind',
+        'object_id',
+        'status',
+    ]
+    list_filter = [
+        'status',
+        'kind',
+    ]
+    readonly_fields = [
+        'kind',
+        'object_id',
+        'base_url',
+        'session_id',
+        'error',
+        'attempts',
+        'created_at',
+        'started_at',
+        'finished_at',
+    ]
 
 
 admin.site.register(Item, ItemAdmin)
@@ -87,6 +275,8 @@ admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem, OrderItemAdmin)
 admin.site.register(Discount, DiscountAdmin)
 admin.site.register(Tax, TaxAdmin)
+admin.site.register(StripeEvent, StripeEventAdmin)
+admin.site.register(CheckoutJob, CheckoutJobAdmin)
 
 admin.site.site_title = 'Админ-панель test_3_project'
 admin.site.site_header = 'Админ-панель test_3_project'
@@ -1,34 +1,135 @@
-from typing import Any, Dict
-from django.http import JsonResponse, HttpResponse, Http404
-from django.views.generic import TemplateView
+import asyncio
+import hmac
+import math
+import time
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseBase, HttpResponseForbidden, Http404, StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import TemplateView, View
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.response import Response
 
 import stripe
 import logging
-from .models import Item, Order, OrderItem
-from .serializers import OrderCreateSerializer
-from .service import PaymentSessionCreator, OrderCreationService, ItemPaymentDataService, OrderPaymentDataService
+from .currency import StaleRatesError
+from .metrics import measure, registry
+from .models import CheckoutJob, Item, Order, OrderItem
+from .filters import OrderFilter
+from .pagination import ItemCatalogCursorPagination, OrderCursorPagination
+from .serializers import OrderListSerializer, ItemCatalogSerializer
+from .stripe_clients import CircuitOpenError
+from .service import (
+    PaymentSessionCreator, OrderCreationService, ItemPaymentDataService, OrderPaymentDataService, OrderLoader,
+    ItemPageCache, StripeEventInbox, ItemCatalogVersion, CheckoutJobQueue, OrderQuoteService, OrderExportService
+)
+from .validators import OrderPayloadError, OrderPayloadValidator
 from test_3_project.settings import (
     STRIPE_PUBLISHABLE_KEY, STRIPE_PUBLIC_KEY_CURRENCY_1, STRIPE_PUBLIC_KEY_CURRENCY_2, STRIPE_SECRET_KEY
 )
 
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-file_handler = logging.FileHandler('app.log')
-file_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
 
+# Через сколько секунд повторить запрос, если курсы валют устарели: после неудачного обновления
+# CurrencyConverter повторяет его не реже раза в минуту
+RATES_RETRY_AFTER = 60
+
+
+def stripe_unavailable_response(error: stripe.StripeError, response_class=Response):
+    """
+    Ответ 503 при недоступности Stripe. Если предохранитель разомкнут, добавляет заголовок Retry-After.
+
+    Parameters:
+        - error (stripe.StripeError): Таймаут, ошибка соединения, ответ 5xx или CircuitOpenError.
+        - response_class: Класс ответа (Response для DRF-представлений, JsonResponse для остальных).
+
+    Returns:
+        Ответ со статусом 503.
+
+    """
+    response = response_class({'error': 'Платёжный сервис временно недоступен'}, status=503)
+
+    if isinstance(error, CircuitOpenError):
+        response['Retry-After'] = str(error.retry_after)
+
+    return response
+
+
+def rates_unavailable_response(response_class=Response):
+    """
+    Ответ 503, если стоимость заказа нельзя рассчитать из-за устаревших курсов валют (StaleRatesError).
+    Retry-After - интервал повторного обновления курсов после неудачи (см. CurrencyConverter).
+
+    Parameters:
+        - response_class: Класс ответа (Response для DRF-представлений, JsonResponse для остальных).
+
+    Returns:
+        Ответ со статусом 503.
+
+    """
+    response = response_class({'error': 'Курсы валют временно недоступны'}, status=503)
+    response['Retry-After'] = str(RATES_RETRY_AFTER)
+    return response
+
+
+def get_order_reuse_key(request, order: Order) -> Optional[str]:
+    """
+    Ключ переиспользования сессии оплаты заказа. Сессия переиспользуется только для заказа,
+    ожидающего оплаты: для оплаченного или неудавшегося заказа создается новая.
+    """
+    if order.status != Order.STATUS_PENDING:
+        return None
+
+    return PaymentSessionCreator.get_reuse_key(request, f"order-{order.pk}")
+
+
+class CheckoutJobMixin:
+    """
+    Постановка задания на создание сессии оплаты в очередь (режим CHECKOUT_JOBS_ENABLED).
+    """
+
+    @classmethod
+    def enqueue_checkout_job(cls, request, kind: str, object_id: int) -> Response:
+        """
+        Ставит задание в очередь и возвращает ответ 202 с его идентификатором и адресом статуса.
+        """
+        return cls.checkout_job_response(CheckoutJobQueue.enqueue(request, kind, object_id))
 
-class ItemPaymentView(APIView):
+    @classmethod
+    async def aenqueue_checkout_job(cls, request, kind: str, object_id: int) -> JsonResponse:
+        """
+        Асинхронная версия enqueue_checkout_job для асинхронных представлений.
+        """
+        return cls.checkout_job_response(await CheckoutJobQueue.aenqueue(request, kind, object_id), JsonResponse)
+
+    @staticmethod
+    def checkout_job_response(job: CheckoutJob, response_class=Response):
+        status_url = f"{reverse('checkout_job', args=[job.pk])}?wait={settings.CHECKOUT_JOB_POLL_WAIT}"
+        return response_class({'job_id': str(job.pk), 'status_url': status_url}, status=status.HTTP_202_ACCEPTED)
+
+
+class ItemPaymentView(CheckoutJobMixin, APIView):
     """
     Представление для обработки GET-запроса и создания платежной сессии.
 
+    В режиме CHECKOUT_JOBS_ENABLED сессия создается в фоне, а ответ содержит job_id и status_url.
+
     Attributes:
         - None
 
@@ -48,12 +149,21 @@ class ItemPaymentView(APIView):
         Returns:
             - Response: Объект HTTP-ответа, содержащий session_id для платежной сессии.
         """
+        if settings.CHECKOUT_JOBS_ENABLED:
+            get_object_or_404(Item.objects.only('pk'), pk=pk)
+            return self.enqueue_checkout_job(request, CheckoutJob.KIND_ITEM, pk)
+
         item = get_object_or_404(Item, pk=pk)
 
         try:
             currency = item.get_currency_display()
             payment_data, stripe_secret_key = ItemPaymentDataService.generate_payment_data(request, item, currency)
-            session_id = PaymentSessionCreator.create_session(stripe_secret_key, payment_data)
+            session_id = PaymentSessionCreator.create_session(
+                stripe_secret_key, payment_data,
+                reuse_key=PaymentSessionCreator.get_reuse_key(request, f"item-{item.pk}"),
+            )
+        except (stripe.APIConnectionError, stripe.APIError) as e:
+            return stripe_unavailable_response(e)
         except Exception as e:
             logger.error(f"ItemPaymentView - An error occurred: {str(e)}")
             return Response({'error': str(e)}, status=500)
@@ -121,12 +231,43 @@ class ItemView(TemplateView):
     """
     Представление для отображения информации о товаре.
 
+    Отрисованная страница кэшируется (ItemPageCache) и отдаётся с заголовками ETag и Last-Modified,
+    на условные запросы с совпадающими валидаторами возвращается 304.
+
     Attributes:
         - template_name: str, имя шаблона для отображения
 
     """
     template_name = "simple_app_1/item.html"
 
+    def get(self, request, *args: Any, **kwargs: Any) -> HttpResponse:
+        """
+        Обрабатывает GET-запрос страницы товара.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+
+        Returns:
+            - HttpResponse: Страница товара или ответ 304, если страница не изменилась.
+        """
+        pk = self.kwargs.get('pk')
+        page = ItemPageCache.get(pk)
+
+        if page is None:
+            response = super().get(request, *args, **kwargs)
+
+            with measure('template'):
+                response.render()
+            page = ItemPageCache.set(pk, response.content, self.item.updated_at)
+
+        response = HttpResponse(page['content'])
+        response.headers['ETag'] = page['etag']
+        response.headers['Last-Modified'] = http_date(page['last_modified'])
+        patch_cache_control(response, public=True, no_cache=True)
+        return get_conditional_response(
+            request, etag=page['etag'], last_modified=page['last_modified'], response=response
+        )
+
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         """
         Получение контекста данных для отображения информации о товаре.
@@ -139,8 +280,8 @@ class ItemView(TemplateView):
         """
         context = super().get_context_data(**kwargs)
         pk = self.kwargs.get('pk')
-        item = Item.objects.get(id=pk)
-        currency = item.get_currency_display()
+        self.item = get_object_or_404(Item, id=pk)
+        currency = self.item.get_currency_display()
 
         if currency == 'usd':
             stripe_public_key = STRIPE_PUBLIC_KEY_CURRENCY_1
@@ -148,10 +289,62 @@ class ItemView(TemplateView):
             stripe_public_key = STRIPE_PUBLIC_KEY_CURRENCY_2
 
         context['stripe_public_key'] = stripe_public_key
-        context['item'] = Item.objects.get(id=pk)
+        context['item'] = self.item
         return context
 
 
+class ItemCatalogView(ListAPIView):
+    """
+    Класс API-представления каталога товаров (только чтение).
+
+    Поддерживает:
+        - keyset-пагинацию (параметры cursor и page_size);
+        - выборку по списку идентификаторов: ?ids=1,2,3 (не более MAX_IDS);
+        - условные запросы: ETag строится из версии каталога, при совпадении If-None-Match
+          ответ 304 отдаётся без обращения к БД.
+    """
+    serializer_class = ItemCatalogSerializer
+    pagination_class = ItemCatalogCursorPagination
+    MAX_IDS = 1000
+
+    def get(self, request, *args: Any, **kwargs: Any) -> HttpResponse:
+        """
+        Обрабатывает GET-запрос каталога.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+
+        Returns:
+            - Response: Страница каталога или ответ 304, если каталог не изменился.
+        """
+        etag = f'"catalog-{ItemCatalogVersion.get()}"'
+        response = get_conditional_response(request, etag=etag)
+
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        response.headers['ETag'] = etag
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def get_queryset(self):
+        queryset = Item.objects.only('id', 'sku', 'name', 'price', 'currency', 'stripe_price_id')
+        ids = self.request.query_params.get('ids')
+
+        if ids:
+            try:
+                ids = [int(pk) for pk in ids.split(',')]
+            except ValueError:
+                raise ValidationError({'ids': 'Ожидается список целых чисел через запятую.'})
+
+            if len(ids) > self.MAX_IDS:
+                raise ValidationError({'ids': f'Не более {self.MAX_IDS} идентификаторов.'})
+
+            queryset = queryset.filter(pk__in=ids)
+
+        return queryset
+
+
 class OrderCreateView(APIView):
     """
     Класс API-представления для создания заказа.
@@ -161,10 +354,14 @@ class OrderCreateView(APIView):
       "items": [
         {"item_id": 1, "quantity": 2},
         {"item_id": 3, "quantity": 1},
-        {"item_id": 5, "item": 3}
+        {"item_id": 5, "quantity": 3}
       ]
     }
 
+    Данные проверяются OrderPayloadValidator до создания заказа: позиции с одинаковым item_id
+    объединяются, при ошибках возвращается 400 (413 для слишком большого запроса) со списком
+    ошибок {"errors": [{"field": "items.0.quantity", "code": "invalid", "message": "..."}]}.
+
     Возвращает JSON с информацией о созданном заказе или ошибкой валидации.
     """
 
@@ -178,21 +375,165 @@ class OrderCreateView(APIView):
         Returns:
             - Response: Объект HTTP-ответа, содержащий информацию о созданном заказе или ошибки валидации.
         """
-        serializer = OrderCreateSerializer(data=request.data)
+        try:
+            order_items_data = OrderPayloadValidator.validate_order(request.body, request.META.get('CONTENT_LENGTH'))
+        except OrderPayloadError as e:
+            logger.error(f"OrderCreateView - Validation error: {e.errors}")
+            return Response(e.as_dict(), status=e.status_code)
 
-        if serializer.is_valid():
-            order_items_data = serializer.validated_data['items']
+        try:
             order_id = OrderCreationService.create_order(order_items_data)
-            return Response({'order_id': order_id}, status=status.HTTP_201_CREATED)
-        else:
-            logger.error(f"OrderCreateView - Validation error: {serializer.errors}")
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except Item.DoesNotExist as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'order_id': order_id}, status=status.HTTP_201_CREATED)
+
+
+class OrderBatchCreateView(APIView):
+    """
+    Класс API-представления для пакетного создания заказов.
+
+    Принимает POST-запрос с данными в формате:
+    {
+      "orders": [
+        {"items": [{"item_id": 1, "quantity": 2}, {"item_id": 3, "quantity": 1}]},
+        {"items": [{"item_id": 5, "quantity": 4}]}
+      ]
+    }
+
+    Все заказы создаются в одной транзакции: если хотя бы один товар не найден, не создается ни один заказ.
+    Данные проверяются так же, как в OrderCreateView (OrderPayloadValidator.validate_batch).
+    Возвращает JSON со списком идентификаторов созданных заказов или ошибкой валидации.
+    """
+
+    def post(self, request) -> Response:
+        """
+        Обрабатывает POST-запрос для пакетного создания заказов.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+
+        Returns:
+            - Response: Объект HTTP-ответа, содержащий идентификаторы созданных заказов или ошибки валидации.
+        """
+        try:
+            orders_data = OrderPayloadValidator.validate_batch(request.body, request.META.get('CONTENT_LENGTH'))
+        except OrderPayloadError as e:
+            logger.error(f"OrderBatchCreateView - Validation error: {e.errors}")
+            return Response(e.as_dict(), status=e.status_code)
+
+        try:
+            order_ids = OrderCreationService.create_orders(orders_data)
+        except Item.DoesNotExist as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'order_ids': order_ids}, status=status.HTTP_201_CREATED)
+
 
+class OrderListView(ListAPIView):
+    """
+    Класс API-представления для списка заказов (для бэк-офиса).
+
+    Поддерживает:
+        - keyset-пагинацию (параметры cursor и page_size);
+        - фильтры status, user, created_after, created_before, paid_after, paid_before;
+        - выбор полей параметром fields, например ?fields=id,status,total.
 
-class OrderPaymentView(APIView):
+    Доступно только администраторам.
+    """
+    permission_classes = [IsAdminUser]
+    serializer_class = OrderListSerializer
+    pagination_class = OrderCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderFilter
+
+    def get_requested_fields(self) -> Optional[List[str]]:
+        """
+        Возвращает поля из параметра fields или None, если параметр не передан.
+        """
+        fields = self.request.query_params.get('fields')
+
+        if not fields:
+            return None
+
+        allowed_fields = OrderListSerializer.Meta.fields
+        return [field for field in fields.split(',') if field in allowed_fields] or None
+
+    def get_queryset(self):
+        queryset = Order.objects.all()
+        fields = self.get_requested_fields()
+
+        if fields is not None:
+            queryset = queryset.only(*set(fields) | {'id'})
+
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class OrderExportView(APIView):
+    """
+    Класс API-представления потоковой выгрузки заказов с позициями (для бэк-офиса).
+
+    Поддерживает:
+        - формат file_format=csv (по умолчанию) или file_format=jsonl;
+        - сжатие gzip=1 (файл .gz сжимается по мере выгрузки);
+        - фильтры списка заказов: status, user, created_after, created_before, paid_after, paid_before.
+
+    Ответ формируется порциями (StreamingHttpResponse), строки читаются через серверный курсор,
+    поэтому расход памяти не зависит от объёма выгрузки. Под ASGI порции отдаются асинхронным
+    итератором (OrderExportService.astream), иначе Django собрал бы весь файл в памяти.
+    Доступно только администраторам.
+    """
+    permission_classes = [IsAdminUser]
+    CONTENT_TYPES = {
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request) -> HttpResponseBase:
+        """
+        Обрабатывает GET-запрос выгрузки.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+
+        Returns:
+            - StreamingHttpResponse: Файл выгрузки или ответ 400, если параметры некорректны.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        compress = request.query_params.get('gzip') in ('1', 'true')
+
+        if file_format not in OrderExportService.FORMATS:
+            raise ValidationError({'file_format': f'Допустимые значения: {", ".join(OrderExportService.FORMATS)}.'})
+
+        try:
+            orders = OrderExportService.filter_orders(request.query_params)
+        except DjangoValidationError as e:
+            raise ValidationError(e.message_dict)
+
+        filename = f'orders.{file_format}' + ('.gz' if compress else '')
+        chunks = OrderExportService.stream(OrderExportService.iter_rows(orders), file_format, compress)
+
+        if isinstance(request._request, ASGIRequest):
+            chunks = OrderExportService.astream(chunks)
+
+        response = StreamingHttpResponse(
+            chunks,
+            content_type='application/gzip' if compress else self.CONTENT_TYPES[file_format],
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class OrderPaymentView(CheckoutJobMixin, APIView):
     """
     Класс API-представления для обработки GET-запроса оплаты заказа.
 
+    В режиме CHECKOUT_JOBS_ENABLED сессия создается в фоне, а ответ содержит job_id и status_url.
+
     Attributes:
         - None
 
@@ -212,17 +553,64 @@ class OrderPaymentView(APIView):
         Returns:
             - Response: Объект HTTP-ответа, содержащий session_id для платежной сессии.
         """
-        order = get_object_or_404(Order, pk=order_id)
+        if settings.CHECKOUT_JOBS_ENABLED:
+            get_object_or_404(Order.objects.only('pk'), pk=order_id)
+            return self.enqueue_checkout_job(request, CheckoutJob.KIND_ORDER, order_id)
+
+        order = get_object_or_404(OrderLoader.get_queryset(), pk=order_id)
 
         try:
             payment_data = OrderPaymentDataService.generate_payment_data(request, order)
-            session_id = PaymentSessionCreator.create_session(STRIPE_SECRET_KEY, payment_data)
+            session_id = PaymentSessionCreator.create_session(
+                STRIPE_SECRET_KEY, payment_data, reuse_key=get_order_reuse_key(request, order)
+            )
+        except StaleRatesError:
+            return rates_unavailable_response()
+        except (stripe.APIConnectionError, stripe.APIError) as e:
+            return stripe_unavailable_response(e)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
         return Response({'session_id': session_id})
 
 
+class MetricsView(View):
+    """
+    Метрики процесса в текстовом формате Prometheus.
+
+    Доступны только с адресов METRICS_ALLOWED_IPS или с заголовком "Authorization: Bearer <METRICS_TOKEN>",
+    остальным отвечает 403.
+    """
+
+    def get(self, request) -> HttpResponse:
+        """
+        Возвращает все собранные метрики.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+
+        Returns:
+            - HttpResponse: Метрики в формате text/plain или ответ 403.
+        """
+        if not self.has_access(request):
+            return HttpResponseForbidden()
+
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @staticmethod
+    def has_access(request) -> bool:
+        """
+        Проверяет адрес клиента и токен доступа.
+        """
+        if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+            return True
+
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(
+            token.encode(), settings.METRICS_TOKEN.encode()
+        )
+
+
 class OrderView(TemplateView):
     """
     Представление для отображения информации о заказе.
@@ -232,6 +620,14 @@ class OrderView(TemplateView):
     """
     template_name = "simple_app_1/order.html"
 
+    def get(self, request, *args, **kwargs) -> HttpResponseBase:
+        try:
+            return super().get(request, *args, **kwargs)
+        except StaleRatesError:
+            response = HttpResponse('Курсы валют временно недоступны', status=503)
+            response['Retry-After'] = str(RATES_RETRY_AFTER)
+            return response
+
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         """
         Обрабатывает GET-запрос для оплаты заказа.
@@ -246,5 +642,277 @@ class OrderView(TemplateView):
         context = super().get_context_data(**kwargs)
         order_id = self.kwargs.get('order_id')
         context['stripe_public_key'] = STRIPE_PUBLISHABLE_KEY
-        context['order'] = Order.objects.get(id=order_id)
+
+        try:
+            context['quote'] = OrderQuoteService.get_quote(order_id)
+        except Order.DoesNotExist:
+            raise Http404
+
         return context
+
+
+class OrderQuoteView(APIView):
+    """
+    Расчёт стоимости заказа: итоговые суммы и позиции с ценой, скидкой и налогом в валюте оплаты.
+
+    Тот же расчёт выводится на странице заказа и передаётся в Stripe Checkout. Ответ кэшируется
+    до изменения заказа (OrderQuoteService).
+
+    Methods:
+        - get(request, order_id: int) -> Response: Возвращает расчёт стоимости заказа.
+
+    """
+
+    def get(self, request, order_id: int) -> Response:
+        """
+        Возвращает расчёт стоимости заказа.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+            - order_id (int): Идентификатор заказа.
+
+        Returns:
+            - Response: Расчёт стоимости, 404, если заказ не найден, или 503, если курсы валют устарели.
+        """
+        try:
+            return Response(OrderQuoteService.get_quote(order_id))
+        except Order.DoesNotExist:
+            raise Http404
+        except StaleRatesError:
+            return rates_unavailable_response()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StripeWebhookView(View):
+    """
+    Приём вебхуков Stripe.
+
+    Проверяет подпись и сохраняет событие в inbox (StripeEvent), не изменяя заказы:
+    статусы применяет обработчик manage.py process_stripe_events.
+    """
+
+    def post(self, request) -> JsonResponse:
+        """
+        Обрабатывает POST-запрос вебхука Stripe.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+
+        Returns:
+            - JsonResponse: {"received": true} или ошибка 400 при неверной подписи или данных.
+        """
+        try:
+            StripeEventInbox.receive(request.body, request.headers.get('Stripe-Signature', ''))
+        except stripe.SignatureVerificationError as e:
+            logger.error(f"StripeWebhookView - Signature verification failed: {str(e)}")
+            return JsonResponse({'error': 'Invalid signature'}, status=400)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"StripeWebhookView - Invalid payload: {str(e)}")
+            return JsonResponse({'error': 'Invalid payload'}, status=400)
+
+        return JsonResponse({'received': True})
+
+
+class AsyncItemPaymentView(CheckoutJobMixin, View):
+    """
+    Асинхронная версия ItemPaymentView для запуска через ASGI (test_3_project.asgi).
+
+    Товар загружается асинхронным ORM, сессия оплаты создается асинхронным клиентом Stripe,
+    поэтому ожидание ответа Stripe не занимает поток воркера. В режиме CHECKOUT_JOBS_ENABLED
+    сессия, как и в ItemPaymentView, создается в фоне.
+    """
+
+    async def get(self, request, pk: int) -> JsonResponse:
+        """
+        Обрабатывает GET-запрос для создания платежной сессии.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+            - pk (int): Первичный ключ товара для создания платежной сессии.
+
+        Returns:
+            - JsonResponse: Ответ, содержащий session_id для платежной сессии.
+        """
+        if settings.CHECKOUT_JOBS_ENABLED:
+            if not await Item.objects.filter(pk=pk).aexists():
+                raise Http404
+
+            return await self.aenqueue_checkout_job(request, CheckoutJob.KIND_ITEM, pk)
+
+        try:
+            item = await Item.objects.aget(pk=pk)
+        except Item.DoesNotExist:
+            raise Http404
+
+        try:
+            currency = item.get_currency_display()
+            payment_data, stripe_secret_key = await ItemPaymentDataService.agenerate_payment_data(
+                request, item, currency
+            )
+            session_id = await PaymentSessionCreator.acreate_session(
+                stripe_secret_key, payment_data,
+                reuse_key=PaymentSessionCreator.get_reuse_key(request, f"item-{item.pk}"),
+            )
+        except (stripe.APIConnectionError, stripe.APIError) as e:
+            return stripe_unavailable_response(e, JsonResponse)
+        except Exception as e:
+            logger.error(f"AsyncItemPaymentView - An error occurred: {str(e)}")
+            return JsonResponse({'error': str(e)}, status=500)
+
+        return JsonResponse({'session_id': session_id})
+
+
+class AsyncOrderPaymentView(CheckoutJobMixin, View):
+    """
+    Асинхронная версия OrderPaymentView для запуска через ASGI (test_3_project.asgi).
+
+    В режиме CHECKOUT_JOBS_ENABLED сессия, как и в OrderPaymentView, создается в фоне.
+    """
+
+    async def get(self, request, order_id: int) -> JsonResponse:
+        """
+        Обрабатывает GET-запрос для оплаты заказа.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+            - order_id (int): Идентификатор заказа для оплаты.
+
+        Returns:
+            - JsonResponse: Ответ, содержащий session_id для платежной сессии.
+        """
+        if settings.CHECKOUT_JOBS_ENABLED:
+            if not await Order.objects.filter(pk=order_id).aexists():
+                raise Http404
+
+            return await self.aenqueue_checkout_job(request, CheckoutJob.KIND_ORDER, order_id)
+
+        try:
+            order = await OrderLoader.aload(order_id)
+        except Order.DoesNotExist:
+            raise Http404
+
+        try:
+            payment_data = OrderPaymentDataService.generate_payment_data(request, order)
+            session_id = await PaymentSessionCreator.acreate_session(
+                STRIPE_SECRET_KEY, payment_data, reuse_key=get_order_reuse_key(request, order)
+            )
+        except StaleRatesError:
+            return rates_unavailable_response(JsonResponse)
+        except (stripe.APIConnectionError, stripe.APIError) as e:
+            return stripe_unavailable_response(e, JsonResponse)
+        except Exception as e:
+            logger.error(f"AsyncOrderPaymentView - An error occurred: {str(e)}")
+            return JsonResponse({'error': str(e)}, status=500)
+
+        return JsonResponse({'session_id': session_id})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncOrderCreateView(View):
+    """
+    Асинхронная версия OrderCreateView для запуска через ASGI (test_3_project.asgi).
+
+    Принимает JSON в том же формате, что и OrderCreateView. CSRF проверяется так же, как в DRF
+    (SessionAuthentication): для пользователя, вошедшего через сессию, токен обязателен, а запросы
+    без сессии (API-клиенты) его не требуют - браузер не может отправить их от имени пользователя.
+    """
+
+    async def post(self, request) -> JsonResponse:
+        """
+        Обрабатывает POST-запрос для создания заказа.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+
+        Returns:
+            - JsonResponse: Ответ, содержащий идентификатор созданного заказа или ошибки валидации.
+        """
+        if (await request.auser()).is_authenticated:
+            reason = self.check_csrf(request)
+
+            if reason:
+                return JsonResponse({'error': f'CSRF Failed: {reason}'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            order_items_data = await OrderPayloadValidator.avalidate_order(
+                request.body, request.META.get('CONTENT_LENGTH')
+            )
+        except OrderPayloadError as e:
+            logger.error(f"AsyncOrderCreateView - Validation error: {e.errors}")
+            return JsonResponse(e.as_dict(), status=e.status_code)
+
+        try:
+            order_id = await OrderCreationService.acreate_order(order_items_data)
+        except Item.DoesNotExist as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return JsonResponse({'order_id': order_id}, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def check_csrf(request) -> Optional[str]:
+        """
+        Проверяет CSRF-токен запроса, как SessionAuthentication.enforce_csrf в DRF.
+
+        Returns:
+            Optional[str]: Причина отказа или None, если проверка пройдена.
+
+        """
+        check = CSRFCheck(lambda request: None)
+        check.process_request(request)
+        return check.process_view(request, None, (), {})
+
+
+class CheckoutJobStatusView(View):
+    """
+    Статус задания на создание сессии оплаты.
+
+    Параметр wait (секунды, не более CHECKOUT_JOB_POLL_WAIT) включает long polling: ответ возвращается,
+    как только задание завершится, или по истечении wait. Представление асинхронное, поэтому под ASGI
+    ожидание не занимает поток воркера.
+    """
+    POLL_INTERVAL = 0.25
+
+    async def get(self, request, job_id) -> JsonResponse:
+        """
+        Обрабатывает GET-запрос статуса задания.
+
+        Parameters:
+            - request: Объект, представляющий входящий HTTP-запрос.
+            - job_id (UUID): Идентификатор задания.
+
+        Returns:
+            - JsonResponse: Статус задания (pending, running, done, failed), session_id и ошибка.
+        """
+        try:
+            wait = float(request.GET.get('wait', 0))
+        except ValueError:
+            wait = math.nan
+
+        if not math.isfinite(wait):
+            return JsonResponse({'error': 'wait должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+
+        wait = min(max(wait, 0), settings.CHECKOUT_JOB_POLL_WAIT)
+
+        deadline = time.monotonic() + wait
+
+        while True:
+            try:
+                job = await CheckoutJob.objects.aget(pk=job_id)
+            except CheckoutJob.DoesNotExist:
+                raise Http404
+
+            finished = job.status in (CheckoutJob.STATUS_DONE, CheckoutJob.STATUS_FAILED)
+
+            if finished or time.monotonic() >= deadline:
+                break
+
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+        response = JsonResponse({
+            'job_id': str(job.pk),
+            'status': job.get_status_display(),
+            'session_id': job.session_id or None,
+            'error': job.error if job.status == CheckoutJob.STATUS_FAILED else None,
+        })
+        patch_cache_control(response, no_store=True)
+        return response
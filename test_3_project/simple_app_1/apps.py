@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class SimpleApp1Config(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "simple_app_1"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import checks, signals  # noqa: F401
+        from .logs import dropped_records_metrics
+        from .metrics import registry
+        from .middleware import install_query_timer
+        from .stripe_clients import StripeClientRegistry
+
+        registry.register_collector(dropped_records_metrics)
+        registry.register_collector(StripeClientRegistry.metrics)
+        connection_created.connect(install_query_timer)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Проверяет, что без DEBUG используется общий для всех процессов кэш.
+
+    В кэше хранятся версия каталога (ETag /catalog/items), страницы товаров и сессии оплаты. В памяти
+    процесса у каждого воркера своя версия каталога: изменение, сделанное в одном воркере, не видно
+    остальным, и они отвечают 304 на устаревший ETag.
+    """
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+
+    return [
+        Warning(
+            'Кэш по умолчанию не общий для процессов: ETag каталога и кэш страниц товаров '
+            'расходятся между воркерами.',
+            hint='Задайте CACHE_URL (например, redis://127.0.0.1:6379/1) или запускайте один процесс.',
+            id='simple_app_1.W001',
+        )
+    ]
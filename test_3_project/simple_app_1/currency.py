@@ -0,0 +1,287 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class StaleRatesError(Exception):
+    """
+    Курсы валют старше допустимого возраста (CURRENCY_RATES_MAX_AGE) или время их получения неизвестно.
+    """
+
+
+class ForexRateProvider:
+    """
+    Источник курсов валют на основе forex-python.
+    """
+
+    def get_rates(self, base: str) -> Dict[str, Decimal]:
+        """
+        Возвращает курсы валют относительно base: {код валюты: количество валюты за 1 base}.
+        """
+        from forex_python.converter import CurrencyRates
+
+        rates = CurrencyRates(force_decimal=True).get_rates(base.upper())
+        return {code.lower(): Decimal(rate) for code, rate in rates.items()}
+
+
+class StaticRateProvider:
+    """
+    Локальный источник курсов с фиксированной таблицей (для тестов и офлайн-окружений).
+    """
+
+    def __init__(self, rates: Dict[str, Decimal]):
+        self.rates = {code.lower(): Decimal(rate) for code, rate in rates.items()}
+        self.calls = 0
+
+    def get_rates(self, base: str) -> Dict[str, Decimal]:
+        self.calls += 1
+        base_rate = self.rates[base.lower()]
+        return {code: rate / base_rate for code, rate in self.rates.items()}
+
+
+class CurrencyConverter:
+    """
+    Конвертер валют с таблицей курсов в памяти.
+
+    Курсы обновляются фоновым потоком раз в ttl секунд (или командой refresh_currency_rates)
+    и сохраняются в файл-снимок. Конвертация никогда не обращается к сети: если курсы ещё не загружены,
+    используется снимок, а если его нет или он повреждён - снимок, поставляемый с приложением (fallback_path).
+    Курсы старше max_age секунд не используются: конвертация завершается StaleRatesError. Исключение -
+    поставляемый снимок: он используется как последнее средство, пока нет ни свежих курсов, ни снимка
+    (с предупреждением в логе), иначе без доступного источника курсов не работала бы ни одна конвертация.
+
+    Methods:
+        - convert(amount: Decimal, from_currency: str, to_currency: str) -> Decimal:
+            Конвертирует сумму.
+        - refresh() -> bool:
+            Загружает курсы из источника.
+        - start() -> None:
+            Запускает фоновое обновление курсов.
+
+    """
+    BASE_CURRENCY = 'usd'
+
+    def __init__(self, provider, snapshot_path: Optional[Path] = None, fallback_path: Optional[Path] = None,
+                 ttl: int = 3600, max_age: Optional[int] = None):
+        self.provider = provider
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.fallback_path = Path(fallback_path) if fallback_path else None
+        self.ttl = ttl
+        self.max_age = max_age
+        self.rates: Dict[str, Decimal] = {}
+        self.updated_at: Optional[float] = None
+        self.fallback_in_use = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def convert(self, amount: Decimal, from_currency: str, to_currency: str) -> Decimal:
+        """
+        Конвертирует сумму из одной валюты в другую по текущей таблице курсов.
+
+        Parameters:
+            - amount (Decimal): Сумма.
+            - from_currency (str): Код исходной валюты, например "rub".
+            - to_currency (str): Код целевой валюты, например "usd".
+
+        Returns:
+            Decimal: Сумма в целевой валюте.
+
+        Raises:
+            - KeyError: Если курса одной из валют нет ни в таблице, ни в снимке.
+            - StaleRatesError: Если курсы старше max_age секунд.
+
+        """
+        if from_currency == to_currency:
+            return Decimal(amount)
+
+        if not self.rates:
+            self.load_snapshot()
+
+        self.check_age()
+        rates = self.rates
+        return Decimal(amount) * rates[to_currency.lower()] / rates[from_currency.lower()]
+
+    def refresh(self) -> bool:
+        """
+        Загружает курсы из источника и сохраняет снимок. При ошибке оставляет прежние курсы.
+
+        Returns:
+            bool: True, если курсы обновлены.
+
+        """
+        try:
+            rates = {**self.provider.get_rates(self.BASE_CURRENCY), self.BASE_CURRENCY: Decimal(1)}
+        except Exception as e:
+            logger.error(f"An error occurred in CurrencyConverter: {str(e)}")
+            return False
+
+        self.rates = rates
+        self.updated_at = time.time()
+        self.fallback_in_use = False
+        self.save_snapshot()
+        return True
+
+    def is_stale(self) -> bool:
+        """
+        Проверяет, старше ли курсы max_age секунд (или время их получения неизвестно).
+        Курсы из поставляемого снимка устаревшими не считаются.
+        """
+        return not self.fallback_in_use and self.max_age is not None and (self.updated_at is None or time.time() - self.updated_at > self.max_age)
+
+    def check_age(self) -> None:
+        """
+        Проверяет возраст курсов. Устаревшие курсы (и курсы из поставляемого снимка) сначала перечитываются
+        из снимка: его могла обновить команда refresh_currency_rates или другой процесс.
+
+        Raises:
+            - StaleRatesError: Если курсы устарели или время их получения неизвестно.
+
+        """
+        if not self.is_stale() and not self.fallback_in_use:
+            return
+
+        self.load_snapshot(reload=True)
+
+        if self.updated_at is None:
+            raise StaleRatesError('Время получения курсов валют неизвестно')
+
+        if self.is_stale():
+            raise StaleRatesError(
+                f'Курсы валют устарели: получены {int(time.time() - self.updated_at)} с назад, '
+                f'допустимо не более {self.max_age} с'
+            )
+
+    def load_snapshot(self, reload: bool = False) -> Dict[str, Decimal]:
+        """
+        Загружает курсы из файла-снимка, если таблица в памяти пуста. Повреждённый снимок пропускается,
+        поставляемый снимок (fallback_path) читается, только если других курсов нет.
+
+        Parameters:
+            - reload (bool): Заменить таблицу в памяти, если снимок новее неё.
+
+        Returns:
+            Dict[str, Decimal]: Таблица курсов.
+
+        """
+        with self._lock:
+            for path in (self.snapshot_path, self.fallback_path):
+                if self.rates and not reload:
+                    break
+
+                if not path or not path.exists() or path == self.fallback_path and self.rates:
+                    continue
+
+                try:
+                    data = json.loads(path.read_text())
+                    rates = {code: Decimal(rate) for code, rate in data['rates'].items()}
+                    fetched_at = data.get('fetched_at')
+                    fetched_at = datetime.fromisoformat(fetched_at).timestamp() if fetched_at else None
+                except (OSError, ValueError, KeyError, TypeError, ArithmeticError) as e:
+                    logger.error(f"An error occurred in CurrencyConverter: {path}: {str(e)}")
+                    continue
+
+                if self.rates and (fetched_at is None or fetched_at <= (self.updated_at or 0)):
+                    continue
+
+                self.rates = rates
+                self.updated_at = fetched_at
+                self.fallback_in_use = path == self.fallback_path
+
+                if self.fallback_in_use:
+                    logger.warning(f"CurrencyConverter: курсы валют загружены из поставляемого снимка {path}")
+
+                break
+
+        return self.rates
+
+    def save_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+
+        data = {
+            'base': self.BASE_CURRENCY,
+            'fetched_at': datetime.now(timezone.utc).isoformat(),
+            'rates': {code: str(rate) for code, rate in sorted(self.rates.items())},
+        }
+
+        try:
+            tmp_path = self.snapshot_path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(data, indent=2))
+            tmp_path.replace(self.snapshot_path)
+        except OSError as e:
+            logger.error(f"An error occurred in CurrencyConverter: {str(e)}")
+
+    def start(self) -> None:
+        """
+        Запускает фоновый поток обновления курсов (один раз на процесс).
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self._run, name='currency-rates', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            refreshed = self.refresh()
+            # После неудачи повторяем раньше, но не чаще раза в минуту
+            self._stop.wait(self.ttl if refreshed else min(self.ttl, 60))
+
+
+_converter: Optional[CurrencyConverter] = None
+_converter_lock = threading.Lock()
+
+
+def get_converter() -> CurrencyConverter:
+    """
+    Возвращает конвертер процесса, при первом вызове создавая его и запуская фоновое обновление.
+    """
+    global _converter
+
+    if _converter is None:
+        with _converter_lock:
+            if _converter is None:
+                converter = build_converter()
+
+                if settings.CURRENCY_RATES_BACKGROUND_REFRESH:
+                    converter.start()
+
+                _converter = converter
+
+    return _converter
+
+
+def build_converter() -> CurrencyConverter:
+    """
+    Создает конвертер по настройкам CURRENCY_RATE_PROVIDER, CURRENCY_RATES_* (без фонового обновления).
+    """
+    return CurrencyConverter(
+        import_string(settings.CURRENCY_RATE_PROVIDER)(),
+        snapshot_path=settings.CURRENCY_RATES_SNAPSHOT,
+        fallback_path=Path(__file__).resolve().parent / 'fixtures' / 'currency_rates.json',
+        ttl=settings.CURRENCY_RATES_TTL,
+        max_age=settings.CURRENCY_RATES_MAX_AGE or None,
+    )
+
+
+def set_converter(converter: Optional[CurrencyConverter]) -> None:
+    """
+    Подменяет конвертер процесса (например, в тестах).
+    """
+    global _converter
+    _converter = converter
@@ -0,0 +1,17 @@
+import django_filters
+
+from .models import Order
+
+
+class OrderFilter(django_filters.FilterSet):
+    """
+    Фильтры списка заказов: статус, пользователь, период создания и оплаты.
+    """
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+    paid_after = django_filters.IsoDateTimeFilter(field_name='paid_at', lookup_expr='gte')
+    paid_before = django_filters.IsoDateTimeFilter(field_name='paid_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = ['status', 'user']
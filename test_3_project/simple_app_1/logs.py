@@ -0,0 +1,106 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import List
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Добавляет к записи лога идентификатор текущего запроса (request_id).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует запись лога в одну строку JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc_info'] = record.exc_text
+
+        return json.dumps(data, ensure_ascii=False)
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    Неблокирующий обработчик логов.
+
+    Записи складываются в ограниченную очередь, а в файл их пишет один поток QueueListener.
+    Если очередь заполнена (например, диск не успевает), новые записи отбрасываются и учитываются
+    в счётчике dropped, поток запроса при этом не ждёт.
+
+    Attributes:
+        - dropped (int): Количество отброшенных записей.
+
+    """
+    instances = []
+
+    def __init__(self, filename: str, max_queue_size: int = 10000, encoding: str = 'utf-8'):
+        super().__init__(queue.Queue(maxsize=max_queue_size))
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+        file_handler = logging.FileHandler(filename, encoding=encoding, delay=True)
+        file_handler.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, file_handler, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+        QueueFileHandler.instances.append(self)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и traceback форматируются в потоке запроса, пока доступны их аргументы,
+        # а JSON собирается уже в потоке записи
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def close(self) -> None:
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+        super().close()
+
+
+def dropped_records_metrics() -> List[str]:
+    """
+    Метрика числа отброшенных из-за переполнения очереди записей лога.
+    """
+    dropped = sum(handler.dropped for handler in QueueFileHandler.instances)
+    return ['# TYPE app_log_records_dropped_total counter', f'app_log_records_dropped_total {dropped}']
@@ -0,0 +1,245 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+from django.urls import reverse
+
+from simple_app_1.currency import CurrencyConverter, StaticRateProvider, set_converter
+from simple_app_1.models import Discount, Item, Order, OrderItem, Tax
+from simple_app_1.stripe_clients import StripeClientRegistry
+from simple_app_1.stripe_stub import StripeStubServer
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный замер основных эндпоинтов.
+
+    Создает временную тестовую БД, заполняет её данными из заданного seed, поднимает локальную замену
+    Stripe с настраиваемой задержкой и прогоняет запросы к /buy, /buy_all, /order/create, /item и /order.
+    Для каждого эндпоинта выводит p50/p95/p99, запросы в секунду и число запросов к БД на запрос,
+    а результат дописывает в JSONL-файл для сравнения между коммитами.
+    """
+    help = 'Нагрузочный замер эндпоинтов на локальной замене Stripe'
+
+    ENDPOINTS = ['buy', 'buy_all', 'order_create', 'item', 'order']
+    CURRENCY_RATES = {'usd': Decimal('1'), 'rub': Decimal('90')}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Количество запросов на эндпоинт')
+        parser.add_argument('--concurrency', type=int, default=4, help='Количество параллельных клиентов')
+        parser.add_argument('--latency', type=float, default=0.05, help='Задержка ответа Stripe, секунд')
+        parser.add_argument('--items', type=int, default=200, help='Количество товаров в тестовых данных')
+        parser.add_argument('--orders', type=int, default=50, help='Количество заказов в тестовых данных')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора тестовых данных и запросов')
+        parser.add_argument('--endpoint', action='append', choices=self.ENDPOINTS, help='Замерять только эти эндпоинты')
+        parser.add_argument(
+            '--output',
+            default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'results.jsonl'),
+            help='Файл, в который дописываются результаты',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_database_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            with StripeStubServer(latency=options['latency']) as stub, override_settings(STRIPE_API_BASE=stub.url):
+                StripeClientRegistry.reset()
+                set_converter(CurrencyConverter(StaticRateProvider(self.CURRENCY_RATES)))
+                cache.clear()
+                rng = random.Random(options['seed'])
+                item_ids, order_ids = self.seed_data(rng, options['items'], options['orders'])
+
+                results = {}
+
+                for name in options['endpoint'] or self.ENDPOINTS:
+                    results[name] = self.run_endpoint(
+                        name, item_ids, order_ids, options['requests'], options['concurrency'], options['seed']
+                    )
+                    self.write_row(name, results[name])
+
+                stripe_requests = stub.request_count
+        finally:
+            StripeClientRegistry.reset()
+            set_converter(None)
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+            teardown_test_environment()
+
+        self.save_results(options, results, stripe_requests)
+
+    def seed_data(self, rng: random.Random, items_count: int, orders_count: int):
+        """
+        Создает пользователя, товары, скидки, налоги и заказы с 1-10 позициями.
+        """
+        get_user_model().objects.create(id=1, username='benchmark')
+        discounts = Discount.objects.bulk_create([Discount(name=f'Скидка {i}', amount=i * 5) for i in range(1, 4)])
+        taxes = Tax.objects.bulk_create([Tax(name=f'Налог {i}', rate=i * 10) for i in range(1, 3)])
+        items = Item.objects.bulk_create([
+            Item(
+                name=f'Товар {i}',
+                description=f'Описание товара {i}',
+                price=Decimal(rng.randint(100, 100000)) / 100,
+                currency=rng.choice([1, 2]),
+            )
+            for i in range(items_count)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(discount=rng.choice(discounts + [None]), tax=rng.choice(taxes + [None]))
+            for _ in range(orders_count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, item=item, quantity=rng.randint(1, 5), unit_price=item.price, currency=item.currency
+            )
+            for order in orders
+            for item in rng.sample(items, rng.randint(1, min(10, len(items))))
+        ])
+        Order.objects.update_totals()
+        return [item.pk for item in items], [order.pk for order in orders]
+
+    def run_endpoint(self, name, item_ids, order_ids, requests_count, concurrency, seed):
+        """
+        Выполняет requests_count запросов к эндпоинту в concurrency потоков и собирает статистику.
+        """
+        latencies = []
+        queries = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(worker_index, count):
+            rng = random.Random(f'{seed}-{name}-{worker_index}')
+            client = Client()
+
+            try:
+                for _ in range(count):
+                    method, path, data = self.build_request(name, rng, item_ids, order_ids)
+
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+
+                        if method == 'post':
+                            response = client.post(path, data, content_type='application/json')
+                        else:
+                            response = client.get(path)
+
+                        elapsed = time.perf_counter() - started
+
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(len(captured))
+
+                        if response.status_code >= 400:
+                            errors.append(response.status_code)
+            finally:
+                connection.close()
+
+        shares = [requests_count // concurrency + (1 if i < requests_count % concurrency else 0) for i in range(concurrency)]
+        threads = [threading.Thread(target=worker, args=(i, share)) for i, share in enumerate(shares) if share]
+        started = time.perf_counter()
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        wall_time = time.perf_counter() - started
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'p50_ms': round(percentiles[49] * 1000, 2),
+            'p95_ms': round(percentiles[94] * 1000, 2),
+            'p99_ms': round(percentiles[98] * 1000, 2),
+            'rps': round(len(latencies) / wall_time, 1),
+            'queries_per_request': round(statistics.mean(queries), 2),
+        }
+
+    @staticmethod
+    def build_request(name, rng, item_ids, order_ids):
+        if name == 'buy':
+            return 'get', reverse('buy', args=[rng.choice(item_ids)]), None
+        if name == 'buy_all':
+            return 'get', reverse('buy_all', args=[rng.choice(order_ids)]), None
+        if name == 'item':
+            return 'get', reverse('item', args=[rng.choice(item_ids)]), None
+        if name == 'order':
+            return 'get', reverse('order', args=[rng.choice(order_ids)]), None
+
+        items = [
+            {'item_id': item_id, 'quantity': rng.randint(1, 5)}
+            for item_id in rng.sample(item_ids, rng.randint(1, min(5, len(item_ids))))
+        ]
+        return 'post', reverse('order_create'), {'items': items}
+
+    def write_row(self, name, result):
+        self.stdout.write(
+            f"{name:<14} p50={result['p50_ms']:>8.2f}ms p95={result['p95_ms']:>8.2f}ms "
+            f"p99={result['p99_ms']:>8.2f}ms rps={result['rps']:>8.1f} "
+            f"queries/req={result['queries_per_request']:>6.2f} errors={result['errors']}"
+        )
+
+    def save_results(self, options, results, stripe_requests):
+        """
+        Дописывает результаты в JSONL-файл и выводит разницу с предыдущим запуском.
+        """
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        previous = None
+
+        if output.exists():
+            lines = output.read_text().splitlines()
+            previous = json.loads(lines[-1]) if lines else None
+
+        record = {
+            'commit': self.current_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'params': {
+                key: options[key] for key in ('requests', 'concurrency', 'latency', 'items', 'orders', 'seed')
+            },
+            'stripe_requests': stripe_requests,
+            'endpoints': results,
+        }
+
+        with output.open('a') as f:
+            f.write(json.dumps(record) + '\n')
+
+        self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {output}'))
+
+        if previous:
+            self.stdout.write(f"Сравнение с {previous.get('commit') or 'предыдущим запуском'}:")
+
+            for name, result in results.items():
+                before = previous.get('endpoints', {}).get(name)
+
+                if before:
+                    self.stdout.write(
+                        f"{name:<14} p50 {before['p50_ms']:.2f} -> {result['p50_ms']:.2f}ms, "
+                        f"rps {before['rps']:.1f} -> {result['rps']:.1f}"
+                    )
+
+    @staticmethod
+    def current_commit():
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,94 @@
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from simple_app_1.models import Order
+from simple_app_1.service import OrderExportService
+
+
+class Command(BaseCommand):
+    """
+    Потоковая выгрузка заказов с позициями в CSV или JSONL.
+
+    Строки читаются через серверный курсор и записываются порциями, поэтому расход памяти
+    не зависит от объёма выгрузки. Одна строка файла соответствует одной позиции заказа.
+    Файлы с расширением .gz (или при --gzip) сжимаются по мере записи.
+    Итог выводится в stderr, чтобы выгрузку можно было писать в stdout ("-").
+    """
+    help = 'Выгружает заказы с позициями в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для записи в stdout')
+        parser.add_argument(
+            '--format', choices=OrderExportService.FORMATS, help='Формат файла (по умолчанию по расширению)'
+        )
+        parser.add_argument('--gzip', action='store_true', help='Сжимать gzip (по умолчанию для файлов .gz)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Количество строк, читаемых из БД за раз')
+        parser.add_argument('--status', type=int, choices=[value for value, _ in Order.STATUS_CHOICES])
+        parser.add_argument('--user', type=int, help='Идентификатор покупателя')
+        parser.add_argument('--created-after', help='Созданные не раньше (ISO 8601)')
+        parser.add_argument('--created-before', help='Созданные раньше (ISO 8601)')
+        parser.add_argument('--paid-after', help='Оплаченные не раньше (ISO 8601)')
+        parser.add_argument('--paid-before', help='Оплаченные раньше (ISO 8601)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        compress = options['gzip'] or path.endswith('.gz')
+        file_format = options['format'] or self.detect_format(path[:-3] if path.endswith('.gz') else path)
+
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть больше нуля')
+
+        filters = {
+            name: options[name] for name in (
+                'status', 'user', 'created_after', 'created_before', 'paid_after', 'paid_before'
+            ) if options[name] is not None
+        }
+
+        try:
+            orders = OrderExportService.filter_orders(filters)
+        except ValidationError as e:
+            raise CommandError('; '.join(f'{field}: {" ".join(errors)}' for field, errors in e.message_dict.items()))
+
+        started = time.perf_counter()
+        rows_count = 0
+
+        def count_rows(rows):
+            nonlocal rows_count
+
+            for row in rows:
+                rows_count += 1
+                yield row
+
+        rows = count_rows(OrderExportService.iter_rows(orders, chunk_size=options['chunk_size']))
+
+        try:
+            stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            for chunk in OrderExportService.stream(rows, file_format, compress):
+                stream.write(chunk)
+        finally:
+            if path == '-':
+                stream.flush()
+            else:
+                stream.close()
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stderr.write(
+            f'Выгрузка завершена за {elapsed:.1f} с: строк {rows_count}, {rows_count / elapsed:.0f} строк/с',
+            style_func=self.style.SUCCESS,
+        )
+
+    @staticmethod
+    def detect_format(path: str) -> str:
+        if path == '-' or path.lower().endswith('.csv'):
+            return 'csv'
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            return 'jsonl'
+
+        raise CommandError('Не удалось определить формат файла, укажите --format')
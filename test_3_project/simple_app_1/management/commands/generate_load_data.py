@@ -0,0 +1,254 @@
+import io
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from simple_app_1.models import Discount, Item, Order, OrderItem, Tax
+from simple_app_1.pricing import PriceLine, PricingEngine
+from simple_app_1.service import ItemCatalogVersion
+
+
+class Command(BaseCommand):
+    """
+    Генератор синтетических данных для замеров на больших объёмах.
+
+    Создает товары, пользователей, заказы и позиции заказов с реалистичным распределением:
+    популярность товаров и покупателей подчиняется степенному закону, в большинстве заказов 1-3 позиции
+    с редкими крупными заказами, цены распределены логнормально, заказы равномерно распределены
+    по последним --days дням в порядке возрастания идентификатора. Скидки и налоги назначаются части заказов,
+    цены и валюты товаров фиксируются в позициях, стоимость заказа (Order.total) сразу рассчитывается PricingEngine.
+
+    Данные детерминированы seed (при одинаковом начальном состоянии БД). На PostgreSQL строки
+    загружаются через COPY, на других СУБД - через bulk_create. Сигналы при этом не отправляются.
+    """
+    help = 'Генерирует синтетические товары и заказы для нагрузочных замеров'
+
+    STATUS_WEIGHTS = ((Order.STATUS_PAID, 75), (Order.STATUS_PENDING, 20), (Order.STATUS_FAILED, 5))
+    DISCOUNT_AMOUNTS = (5, 10, 15, 20)
+    TAX_RATES = (10, 18, 20)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000, help='Количество товаров')
+        parser.add_argument('--orders', type=int, default=1000000, help='Количество заказов')
+        parser.add_argument('--users', type=int, default=1000, help='Количество покупателей')
+        parser.add_argument('--max-lines', type=int, default=50, help='Максимальное число позиций в заказе')
+        parser.add_argument('--days', type=int, default=365, help='Период, за который создаются заказы, дней')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Количество заказов в одной транзакции')
+
+    def handle(self, *args, **options):
+        if options['items'] < 1 or options['users'] < 1 or options['max_lines'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--items, --users, --max-lines и --batch-size должны быть больше нуля')
+
+        self.rng = random.Random(options['seed'])
+        self.use_copy = connection.vendor == 'postgresql'
+        started = time.perf_counter()
+
+        user_ids = self.create_users(options['seed'], options['users'])
+        discounts = self.get_or_create_rates(Discount, 'amount', self.DISCOUNT_AMOUNTS, 'Скидка')
+        taxes = self.get_or_create_rates(Tax, 'rate', self.TAX_RATES, 'Налог')
+        item_ids, item_prices, item_currencies = self.create_items(options['seed'], options['items'])
+        self.stdout.write(f'Создано товаров: {len(item_ids)}')
+
+        lines_count = self.create_orders(
+            options, user_ids, item_ids, item_prices, item_currencies, discounts, taxes, started
+        )
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Item, Order, OrderItem]):
+                cursor.execute(sql)
+
+            if self.use_copy:
+                for model in (Item, Order, OrderItem):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        ItemCatalogVersion.bump()
+
+        rows = len(item_ids) + options['orders'] + lines_count
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано строк: {rows} (товаров {len(item_ids)}, заказов {options['orders']}, позиций {lines_count}) "
+            f"за {elapsed:.1f} с, {rows / max(elapsed, 1e-9):.0f} строк/с"
+        ))
+
+    def create_users(self, seed, count):
+        """
+        Создает покупателей (без возможности входа) и возвращает их идентификаторы.
+        """
+        user_model = get_user_model()
+        prefix = f'load-{seed}-'
+        user_model.objects.bulk_create(
+            [user_model(username=f'{prefix}{i}', password='!') for i in range(count)],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        return list(user_model.objects.filter(username__startswith=prefix).order_by('pk').values_list('pk', flat=True))
+
+    @staticmethod
+    def get_or_create_rates(model, field_name, values, name):
+        """
+        Возвращает скидки или налоги с заданными значениями в виде списка (id, значение).
+        """
+        objects = []
+
+        for value in values:
+            obj = model.objects.filter(**{field_name: value}).order_by('pk').first()
+
+            if obj is None:
+                obj = model.objects.create(name=f'{name} {value}%', **{field_name: value})
+
+            objects.append((obj.pk, Decimal(getattr(obj, field_name))))
+
+        return objects
+
+    def create_items(self, seed, count):
+        """
+        Создает товары с логнормальным распределением цен. Возвращает их идентификаторы, цены и валюты.
+        """
+        first_id = self.next_id(Item)
+        now = datetime.now(timezone.utc)
+        item_ids = list(range(first_id, first_id + count))
+        item_prices = []
+        item_currencies = []
+        columns = ['id', 'sku', 'name', 'description', 'price', 'currency', 'stripe_price_id', 'stripe_product_id',
+                   'stripe_price_fingerprint', 'stripe_product_fingerprint', 'updated_at']
+
+        for start in range(0, count, 100000):
+            rows = []
+
+            for item_id in item_ids[start:start + 100000]:
+                price = self.money(min(max(int(self.rng.lognormvariate(math.log(3000), 1.0)), 50), 9999999))
+                currency = 1 if self.rng.random() < 0.7 else 2
+                item_prices.append(price)
+                item_currencies.append(currency)
+                rows.append((
+                    item_id, f'LOAD-{seed}-{item_id}', f'Товар {item_id}', f'Описание товара {item_id}',
+                    price, currency, 'None', 'None', '', '', now,
+                ))
+
+            with transaction.atomic():
+                self.write_rows(Item, columns, rows)
+
+        return item_ids, item_prices, item_currencies
+
+    def create_orders(self, options, user_ids, item_ids, item_prices, item_currencies, discounts, taxes, started):
+        """
+        Создает заказы и позиции заказов пакетами по --batch-size заказов. Возвращает число позиций.
+        """
+        order_columns = ['id', 'user_id', 'address', 'telephone', 'discount_id', 'tax_id', 'total', 'status',
+                         'paid_at', 'created_at']
+        line_columns = ['id', 'order_id', 'item_id', 'quantity', 'unit_price', 'currency']
+        currency_codes = dict(Item.CURRENCY_CHOICES)
+        statuses, status_weights = zip(*self.STATUS_WEIGHTS)
+        orders_count = options['orders']
+        max_lines = min(options['max_lines'], len(item_ids))
+        period_end = datetime.now(timezone.utc)
+        period = timedelta(days=options['days'])
+        order_id = self.next_id(Order)
+        line_id = self.next_id(OrderItem)
+        lines_count = 0
+
+        for batch_start in range(0, orders_count, options['batch_size']):
+            order_rows = []
+            line_rows = []
+
+            for index in range(batch_start, min(batch_start + options['batch_size'], orders_count)):
+                lines = min(max_lines, 1 + int(self.rng.expovariate(1 / 1.5)))
+                chosen = set()
+                price_lines = []
+
+                while len(chosen) < lines:
+                    position = self.skewed_index(len(item_ids), 3.0)
+
+                    if position in chosen:
+                        continue
+
+                    chosen.add(position)
+                    quantity = 1 if self.rng.random() < 0.7 else 2 + int(self.rng.expovariate(1 / 1.5))
+                    price, currency = item_prices[position], item_currencies[position]
+                    price_lines.append(PriceLine(line_id, price, currency_codes[currency], quantity))
+                    line_rows.append((line_id, order_id, item_ids[position], quantity, price, currency))
+                    line_id += 1
+
+                discount_id, discount = self.rng.choice(discounts) if self.rng.random() < 0.3 else (None, None)
+                tax_id, rate = self.rng.choice(taxes) if self.rng.random() < 0.8 else (None, None)
+                total = PricingEngine.quote(price_lines, discount, rate).total
+
+                created_at = period_end - period + period * (index + self.rng.random()) / orders_count
+                status = self.rng.choices(statuses, status_weights)[0]
+                paid_at = (
+                    created_at + timedelta(minutes=self.rng.expovariate(1 / 30))
+                    if status == Order.STATUS_PAID else None
+                )
+                order_rows.append((
+                    order_id, user_ids[self.skewed_index(len(user_ids), 2.0)], None, None,
+                    discount_id, tax_id, total, status, paid_at, created_at,
+                ))
+                order_id += 1
+
+            with transaction.atomic():
+                self.write_rows(Order, order_columns, order_rows)
+                self.write_rows(OrderItem, line_columns, line_rows)
+
+            lines_count += len(line_rows)
+            done = min(batch_start + options['batch_size'], orders_count)
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(f'Создано заказов: {done}/{orders_count}, позиций: {lines_count}, {elapsed:.0f} с')
+
+        return lines_count
+
+    def write_rows(self, model, columns, rows):
+        """
+        Загружает строки в таблицу модели: через COPY на PostgreSQL, иначе через bulk_create.
+        """
+        if not rows:
+            return
+
+        if not self.use_copy:
+            fields = [model._meta.get_field(column).attname if column != 'id' else 'id' for column in columns]
+            model.objects.bulk_create([model(**dict(zip(fields, row))) for row in rows], batch_size=1000)
+            return
+
+        buffer = io.StringIO()
+
+        for row in rows:
+            buffer.write('\t'.join(self.copy_value(value) for value in row))
+            buffer.write('\n')
+
+        buffer.seek(0)
+        table = connection.ops.quote_name(model._meta.db_table)
+        column_list = ', '.join(connection.ops.quote_name(column) for column in columns)
+
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {table} ({column_list}) FROM STDIN', buffer)
+
+    @staticmethod
+    def copy_value(value) -> str:
+        if value is None:
+            return '\\N'
+        if isinstance(value, datetime):
+            return value.isoformat()
+
+        return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+    def skewed_index(self, size: int, exponent: float) -> int:
+        """
+        Возвращает индекс от 0 до size - 1, где малые индексы выпадают значительно чаще (степенной закон).
+        """
+        return min(int(size * self.rng.random() ** exponent), size - 1)
+
+    @staticmethod
+    def money(cents: int) -> Decimal:
+        return Decimal(cents).scaleb(-2)
+
+    @staticmethod
+    def next_id(model) -> int:
+        return (model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
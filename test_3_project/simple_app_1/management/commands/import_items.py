@@ -0,0 +1,83 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simple_app_1.service import ItemImportService
+
+
+class Command(BaseCommand):
+    """
+    Потоковый импорт товаров из CSV или JSONL.
+
+    Файл читается построчно, товары сохраняются пакетами (upsert по артикулу), поэтому
+    расход памяти не зависит от размера файла. Некорректные строки пропускаются и выводятся в stderr.
+
+    Формат CSV: заголовок sku,name,description,price,currency.
+    Формат JSONL: по одному объекту с теми же полями на строку.
+    Валюта задаётся кодом (usd, rub) или значением из Item.CURRENCY_CHOICES.
+    """
+    help = 'Импортирует товары из CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для чтения из stdin')
+        parser.add_argument(
+            '--format', choices=ItemImportService.FORMATS, help='Формат файла (по умолчанию по расширению)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество товаров в пакете')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Кодировка файла')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or self.detect_format(options['path'])
+
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        started = time.perf_counter()
+
+        def on_error(line_number, error):
+            self.stderr.write(f'Строка {line_number}: {"; ".join(error.messages)}')
+
+        def on_batch(stats):
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(
+                f"Прочитано строк: {stats['rows']}, сохранено: {stats['imported']}, "
+                f"ошибок: {stats['errors']}, {stats['rows'] / elapsed:.0f} строк/с"
+            )
+
+        if options['path'] == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(options['path'], newline='', encoding=options['encoding'])
+            except OSError as e:
+                raise CommandError(str(e))
+
+        try:
+            stats = ItemImportService.import_rows(
+                ItemImportService.read_rows(stream, file_format),
+                batch_size=options['batch_size'],
+                on_error=on_error,
+                on_batch=on_batch,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Импорт завершён за {elapsed:.1f} с: строк {stats['rows']}, сохранено {stats['imported']}, "
+            f"ошибок {stats['errors']}, {stats['rows'] / elapsed:.0f} строк/с"
+        ))
+
+    @staticmethod
+    def detect_format(path: str) -> str:
+        suffix = Path(path).suffix.lower().lstrip('.')
+
+        if suffix in ('jsonl', 'ndjson'):
+            return 'jsonl'
+        if suffix == 'csv':
+            return 'csv'
+
+        raise CommandError('Не удалось определить формат файла, укажите --format')
@@ -0,0 +1,73 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from simple_app_1.service import CheckoutJobQueue
+
+
+class Command(BaseCommand):
+    """
+    Обработчик очереди заданий на создание сессий оплаты (режим CHECKOUT_JOBS_ENABLED).
+
+    Каждый из --concurrency потоков забирает по одному заданию и создает сессию в Stripe.
+    Можно запускать несколько экземпляров параллельно: задания забираются с SKIP LOCKED.
+    Раз в минуту удаляются задания, завершённые раньше чем --purge-after часов назад.
+    """
+    help = 'Создает сессии оплаты Stripe из очереди заданий'
+
+    PURGE_INTERVAL = 60
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Количество потоков')
+        parser.add_argument('--interval', type=float, default=0.1, help='Пауза, когда очередь пуста, секунд')
+        parser.add_argument('--purge-after', type=float, default=24, help='Хранить завершённые задания, часов')
+        parser.add_argument('--once', action='store_true', help='Обработать накопленные задания и завершиться')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self.worker, args=(stop, options), name=f'checkout-jobs-{i}')
+            for i in range(options['concurrency'])
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            next_purge = 0.0
+
+            while any(thread.is_alive() for thread in threads):
+                if time.monotonic() >= next_purge:
+                    purged = CheckoutJobQueue.purge(timedelta(hours=options['purge_after']))
+                    next_purge = time.monotonic() + self.PURGE_INTERVAL
+
+                    if purged:
+                        self.stdout.write(f'Удалено завершённых заданий: {purged}')
+
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            stop.set()
+
+        for thread in threads:
+            thread.join()
+
+    def worker(self, stop: threading.Event, options) -> None:
+        try:
+            while not stop.is_set():
+                jobs = CheckoutJobQueue.claim()
+
+                if not jobs:
+                    if options['once']:
+                        break
+
+                    stop.wait(options['interval'])
+                    continue
+
+                for job in jobs:
+                    created = CheckoutJobQueue.process(job)
+                    self.stdout.write(f"Задание {job.pk}: {'сессия создана' if created else 'ошибка'}")
+        finally:
+            connection.close()
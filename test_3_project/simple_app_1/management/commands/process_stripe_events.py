@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from simple_app_1.service import StripeEventProcessor
+
+
+class Command(BaseCommand):
+    """
+    Обработчик inbox событий Stripe.
+
+    Выбирает необработанные события пакетами и применяет изменения статусов заказов.
+    Можно запускать несколько экземпляров параллельно.
+    """
+    help = 'Обрабатывает события вебхуков Stripe из inbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество событий в пакете')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза, когда очередь пуста, секунд')
+        parser.add_argument('--once', action='store_true', help='Обработать накопленные события и завершиться')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                processed = StripeEventProcessor.process_batch(options['batch_size'])
+
+                if processed:
+                    self.stdout.write(f'Обработано событий: {processed}')
+
+                if processed < options['batch_size']:
+                    if options['once']:
+                        break
+
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
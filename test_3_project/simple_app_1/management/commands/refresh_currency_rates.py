@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simple_app_1.currency import build_converter
+
+
+class Command(BaseCommand):
+    """
+    Обновление курсов валют.
+
+    Загружает курсы из источника (CURRENCY_RATE_PROVIDER) и сохраняет снимок CURRENCY_RATES_SNAPSHOT.
+    Процессы приложения перечитывают снимок, когда их курсы устаревают, поэтому при
+    CURRENCY_RATES_BACKGROUND_REFRESH=False команду достаточно запускать по расписанию.
+    """
+    help = 'Загружает курсы валют и сохраняет снимок'
+
+    def handle(self, *args, **options):
+        converter = build_converter()
+
+        if not converter.refresh():
+            raise CommandError('Не удалось загрузить курсы валют, снимок не изменён')
+
+        rates = ', '.join(f'{code}={rate}' for code, rate in sorted(converter.rates.items()))
+        self.stdout.write(f'Курсы обновлены ({rates}), снимок: {settings.CURRENCY_RATES_SNAPSHOT}')
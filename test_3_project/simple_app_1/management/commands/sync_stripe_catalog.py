@@ -0,0 +1,56 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simple_app_1.service import StripeCatalogSyncService
+
+
+class Command(BaseCommand):
+    """
+    Синхронизация каталога товаров со Stripe.
+
+    Создает или обновляет Stripe Product и Price только для изменившихся товаров и заполняет
+    Item.stripe_price_id. Запросы выполняются параллельно с ограничением частоты для каждого аккаунта.
+    Прерванный запуск продолжается с контрольной точки (--restart начинает заново).
+    """
+    help = 'Синхронизирует товары со Stripe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Количество параллельных потоков')
+        parser.add_argument('--rate', type=float, default=20.0, help='Запросов в секунду на аккаунт Stripe')
+        parser.add_argument('--max-retries', type=int, default=5, help='Количество повторов после ответа 429')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Количество товаров в пакете')
+        parser.add_argument(
+            '--checkpoint',
+            default=str(Path(settings.BASE_DIR) / 'stripe_catalog_sync.checkpoint.json'),
+            help='Файл контрольной точки',
+        )
+        parser.add_argument('--restart', action='store_true', help='Начать с начала, игнорируя контрольную точку')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['rate'] <= 0 or options['chunk_size'] < 1:
+            raise CommandError('--workers, --rate и --chunk-size должны быть больше нуля')
+
+        service = StripeCatalogSyncService(
+            workers=options['workers'],
+            rate=options['rate'],
+            max_retries=options['max_retries'],
+            chunk_size=options['chunk_size'],
+            checkpoint_path=options['checkpoint'],
+        )
+        started = time.perf_counter()
+
+        def on_progress(stats):
+            self.stdout.write(
+                f"Проверено товаров: {stats['scanned']}, синхронизировано: {stats['synced']}, "
+                f"без изменений: {stats['skipped']}, ошибок: {stats['failed']}"
+            )
+
+        stats = service.run(restart=options['restart'], on_progress=on_progress)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Синхронизация завершена за {time.perf_counter() - started:.1f} с: синхронизировано {stats['synced']}, "
+            f"без изменений {stats['skipped']}, ошибок {stats['failed']}"
+        ))
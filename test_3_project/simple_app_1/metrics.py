@@ -0,0 +1,157 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин в формате Prometheus.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str, labels: str) -> List[str]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+
+        lines = []
+        cumulative = 0
+
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {total}')
+        lines.append(f'{name}_count{suffix} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса.
+
+    Хранит гистограммы по имени и меткам и функции-сборщики, которые при выдаче /metrics
+    возвращают текущие значения (например, число отброшенных записей лога).
+
+    Methods:
+        - observe(name: str, value: float, buckets: Tuple[float, ...], **labels: str) -> None:
+            Добавляет наблюдение в гистограмму.
+        - register_collector(collector: Callable[[], List[str]]) -> None:
+            Регистрирует функцию, возвращающую строки метрик.
+        - render() -> str:
+            Возвращает все метрики в текстовом формате Prometheus.
+
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Tuple[Tuple[float, ...], Dict[Tuple[Tuple[str, str], ...], Histogram]]] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = SECONDS_BUCKETS, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self._histograms.get(name)
+        histogram = series[1].get(key) if series else None
+
+        if histogram is None:
+            with self._lock:
+                buckets, by_labels = self._histograms.setdefault(name, (buckets, {}))
+                histogram = by_labels.setdefault(key, Histogram(buckets))
+
+        histogram.observe(value)
+
+    def register_collector(self, collector: Callable[[], List[str]]) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+
+    def render(self) -> str:
+        lines = []
+
+        with self._lock:
+            histograms = {name: (buckets, dict(by_labels)) for name, (buckets, by_labels) in self._histograms.items()}
+            collectors = list(self._collectors)
+
+        for name, (_, by_labels) in sorted(histograms.items()):
+            lines.append(f'# TYPE {name} histogram')
+
+            for key, histogram in sorted(by_labels.items()):
+                labels = ','.join(f'{label}="{value}"' for label, value in key)
+                lines.extend(histogram.render(name, labels))
+
+        for collector in collectors:
+            lines.extend(collector())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestTimings:
+    """
+    Накопленные за время запроса длительности по видам работы (db, template, stripe).
+    """
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, kind: str, duration: float) -> None:
+        self.durations[kind] = self.durations.get(kind, 0.0) + duration
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+
+current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    'current_timings', default=None
+)
+
+
+@contextmanager
+def measure(kind: str) -> Iterator[None]:
+    """
+    Замеряет длительность блока и добавляет её к текущему запросу и к гистограмме {kind}_duration_seconds.
+    """
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - started)
+
+
+def record(kind: str, duration: float) -> None:
+    """
+    Добавляет длительность к текущему запросу и к гистограмме {kind}_duration_seconds.
+    """
+    timings = current_timings.get()
+
+    if timings is not None:
+        timings.add(kind, duration)
+
+    registry.observe(f'{kind}_duration_seconds', duration)
@@ -0,0 +1,161 @@
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpRequest, HttpResponse
+
+from .logs import request_id_var
+from .metrics import COUNT_BUCKETS, RequestTimings, current_timings, measure, record, registry
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIdMiddleware:
+    """
+    Назначает каждому запросу идентификатор для логов.
+
+    Идентификатор берется из заголовка X-Request-ID (если он корректен) или генерируется,
+    сохраняется в request.request_id и возвращается в заголовке ответа X-Request-ID.
+    Работает как с синхронными, так и с асинхронными представлениями.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request_id, token = self.start(request)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+
+        response.headers['X-Request-ID'] = request_id
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        request_id, token = self.start(request)
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+
+        response.headers['X-Request-ID'] = request_id
+        return response
+
+    @staticmethod
+    def start(request: HttpRequest):
+        request_id = request.headers.get('X-Request-ID', '')
+
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        request.request_id = request_id
+        return request_id, request_id_var.set(request_id)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики производительности каждого запроса.
+
+    Для каждого представления (имени URL) замеряет общее время, число и время запросов к БД,
+    время отрисовки шаблонов и обращений к Stripe, добавляет их в гистограммы реестра метрик
+    (см. /metrics) и в заголовок ответа Server-Timing. Запросы к БД замеряет обёртка, которая
+    ставится на каждое соединение (install_query_timer), поэтому они учитываются и в асинхронных
+    представлениях, где ORM выполняется в отдельном потоке.
+    """
+    SERVER_TIMING_KINDS = (
+        ('db', 'DB'),
+        ('template', 'Templates'),
+        ('stripe', 'Stripe'),
+    )
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        return self.finish(request, response, timings, started)
+
+    def finish(self, request: HttpRequest, response: HttpResponse, timings: RequestTimings, started: float):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unknown'
+
+        registry.observe('request_duration_seconds', total, view=view)
+        registry.observe('request_db_queries', timings.counts.get('db', 0), buckets=COUNT_BUCKETS, view=view)
+
+        for kind, _ in self.SERVER_TIMING_KINDS:
+            registry.observe(f'request_{kind}_duration_seconds', timings.durations.get(kind, 0.0), view=view)
+
+        response.headers['Server-Timing'] = self.server_timing(timings, total)
+        return response
+
+    def process_template_response(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        # TemplateResponse отрисовывается после всех process_template_response
+        started = time.perf_counter()
+        response.add_post_render_callback(lambda rendered: record('template', time.perf_counter() - started))
+        return response
+
+    def server_timing(self, timings: RequestTimings, total: float) -> str:
+        entries = [f'total;dur={total * 1000:.1f}']
+
+        for kind, description in self.SERVER_TIMING_KINDS:
+            if kind in timings.counts:
+                entries.append(
+                    f'{kind};dur={timings.durations[kind] * 1000:.1f};desc="{description} x{timings.counts[kind]}"'
+                )
+
+        return ', '.join(entries)
+
+
+def measure_query(execute, sql, params, many, context):
+    with measure('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs) -> None:
+    """
+    Ставит замер запросов к БД (метрика db) на новое соединение (обработчик сигнала connection_created).
+    """
+    # В начало списка: connection.execute_wrapper() снимает свою обёртку через pop()
+    if measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, measure_query)
@@ -0,0 +1,87 @@
+# Generated by Django 5.0 on 2026-10-17 18:57
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple_app_1', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Discount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+            ],
+            options={
+                'verbose_name': 'Скидка',
+                'verbose_name_plural': 'Скидки',
+                'ordering': ['pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Tax',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+            ],
+            options={
+                'verbose_name': 'Налог',
+                'verbose_name_plural': 'Налоги',
+                'ordering': ['pk'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='item',
+            options={'ordering': ['pk'], 'verbose_name': 'Товар', 'verbose_name_plural': 'Товары'},
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='currency',
+            field=models.IntegerField(choices=[(1, 'usd'), (2, 'rub')], default=1, null=True, verbose_name='Валюта'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='stripe_price_id',
+            field=models.CharField(default='None', max_length=100),
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(blank=True, max_length=300, null=True)),
+                ('telephone', models.CharField(blank=True, max_length=20, null=True)),
+                ('discount', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='simple_app_1.discount')),
+                ('user', models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('tax', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='simple_app_1.tax')),
+            ],
+            options={
+                'verbose_name': 'Заказ',
+                'verbose_name_plural': 'Заказы',
+                'ordering': ['pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='simple_app_1.item')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_item', to='simple_app_1.order')),
+            ],
+            options={
+                'verbose_name': 'Товар в заказе',
+                'verbose_name_plural': 'Товары в заказе',
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple_app_1', '0002_discount_tax_order_orderitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='stripe_price_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='stripe_product_id',
+            field=models.CharField(default='None', max_length=100),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0 on 2026-10-17 18:58
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('simple_app_1', 'Order')
+    OrderItem = apps.get_model('simple_app_1', 'OrderItem')
+    Discount = apps.get_model('simple_app_1', 'Discount')
+    Tax = apps.get_model('simple_app_1', 'Tax')
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+
+    subtotal = Coalesce(
+        Subquery(
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .order_by()
+            .values('order')
+            .annotate(subtotal=Sum(F('item__price') * F('quantity')))
+            .values('subtotal')
+        ),
+        Value(Decimal('0')),
+        output_field=money,
+    )
+    discount_amount = Coalesce(
+        Subquery(Discount.objects.filter(pk=OuterRef('discount_id')).values('amount')),
+        Value(Decimal('0')),
+        output_field=money,
+    )
+    tax_rate = Coalesce(
+        Subquery(Tax.objects.filter(pk=OuterRef('tax_id')).values('rate')),
+        Value(Decimal('0')),
+        output_field=money,
+    )
+    Order.objects.update(
+        total=(subtotal - discount_amount) * (Value(Decimal('100')) + tax_rate) / Value(Decimal('100'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple_app_1', '0003_item_stripe_product_id_item_stripe_price_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Общая стоимость'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple_app_1', '0005_item_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата оплаты'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status',
+            field=models.IntegerField(choices=[(1, 'pending'), (2, 'paid'), (3, 'failed')], default=1, verbose_name='Статус оплаты'),
+        ),
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('type', models.CharField(max_length=100)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Событие Stripe',
+                'verbose_name_plural': 'События Stripe',
+                'ordering': ['pk'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='stripe_event_unprocessed_idx')],
+            },
+        ),
+    ]
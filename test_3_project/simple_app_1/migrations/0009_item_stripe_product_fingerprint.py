@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple_app_1', '0008_item_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='stripe_product_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0 on 2026-10-17 19:21
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple_app_1', '0009_item_stripe_product_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('item', 'item'), ('order', 'order')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('base_url', models.CharField(max_length=300)),
+                ('status', models.IntegerField(choices=[(1, 'pending'), (2, 'running'), (3, 'done'), (4, 'failed')], default=1)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('session_id', models.CharField(blank=True, default='', max_length=255)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Задание оплаты',
+                'verbose_name_plural': 'Задания оплаты',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 1)), fields=['available_at'], name='checkout_job_pending_idx'), models.Index(condition=models.Q(('status', 2)), fields=['started_at'], name='checkout_job_running_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.0 on 2026-10-17 19:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_prices(apps, schema_editor):
+    Item = apps.get_model('simple_app_1', 'Item')
+    OrderItem = apps.get_model('simple_app_1', 'OrderItem')
+    item = Item.objects.filter(pk=OuterRef('item_id'))
+
+    OrderItem.objects.update(
+        unit_price=Subquery(item.values('price')[:1]),
+        currency=Subquery(item.values('currency')[:1]),
+    )
+    OrderItem.objects.filter(currency__isnull=True).update(currency=1)
+
+
+def recalculate_order_totals(apps, schema_editor):
+    # Стоимость пересчитывается с процентной скидкой (раньше скидка вычиталась как сумма)
+    from simple_app_1.pricing import PriceLine, PricingEngine
+
+    Order = apps.get_model('simple_app_1', 'Order')
+    OrderItem = apps.get_model('simple_app_1', 'OrderItem')
+    currencies = {1: 'usd', 2: 'rub'}
+    last_pk = 0
+
+    while True:
+        chunk = list(
+            Order.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'discount__amount', 'tax__rate')[:2000]
+        )
+
+        if not chunk:
+            return
+
+        order_ids = [order_id for order_id, _, _ in chunk]
+        lines = {order_id: [] for order_id in order_ids}
+
+        for order_id, pk, unit_price, currency, quantity in (
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .order_by('pk')
+            .values_list('order_id', 'pk', 'unit_price', 'currency', 'quantity')
+        ):
+            lines[order_id].append(PriceLine(pk, unit_price, currencies[currency], quantity))
+
+        Order.objects.bulk_update(
+            [
+                Order(pk=order_id, total=PricingEngine.quote(lines[order_id], discount, rate).total)
+                for order_id, discount, rate in chunk
+            ],
+            ['total'],
+        )
+        last_pk = order_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple_app_1', '0010_checkoutjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Цена за единицу'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='currency',
+            field=models.IntegerField(choices=[(1, 'usd'), (2, 'rub')], null=True, verbose_name='Валюта'),
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена за единицу'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='currency',
+            field=models.IntegerField(choices=[(1, 'usd'), (2, 'rub')], verbose_name='Валюта'),
+        ),
+        migrations.RunPython(recalculate_order_totals, migrations.RunPython.noop),
+    ]
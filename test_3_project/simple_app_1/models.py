@@ -1,6 +1,14 @@
+import hashlib
+import uuid
+from decimal import Decimal
+
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 
 
 class Item(models.Model):
@@ -11,6 +19,13 @@ class Item(models.Model):
         (1, 'usd'),
         (2, 'rub'),
     )
+    sku = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="Артикул"
+    )
     name = models.CharField(
         max_length=100
     )
@@ -29,6 +44,24 @@ class Item(models.Model):
         max_length=100,
         default="None",
     )
+    stripe_product_id = models.CharField(
+        max_length=100,
+        default="None",
+    )
+    stripe_price_fingerprint = models.CharField(
+        max_length=100,
+        blank=True,
+        default="",
+    )
+    stripe_product_fingerprint = models.CharField(
+        max_length=100,
+        blank=True,
+        default="",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
 
     class Meta:
         verbose_name = 'Товар'
@@ -41,6 +74,23 @@ class Item(models.Model):
     def get_formatted_price(self):
         return f"{self.price:.2f} {self.get_currency_display()}"
 
+    def get_unit_amount(self):
+        return int(self.price * 100)
+
+    def get_stripe_price_fingerprint(self):
+        """
+        Отпечаток цены товара в Stripe: валюта и сумма в минимальных единицах.
+        Если он не совпадает с сохранённым, Stripe Price нужно пересоздать.
+        """
+        return f"{self.get_currency_display()}:{self.get_unit_amount()}"
+
+    def get_stripe_product_fingerprint(self):
+        """
+        Отпечаток Stripe Product товара: хэш названия и описания.
+        Если он не совпадает с сохранённым, Product в Stripe нужно обновить.
+        """
+        return hashlib.md5(f"{self.name}\0{self.description}".encode()).hexdigest()
+
     def __str__(self):
         return self.name
 
@@ -91,10 +141,118 @@ class Tax(models.Model):
         return f"{self.rate}%"
 
 
+class OrderQuerySet(models.QuerySet):
+    """
+    QuerySet заказов с расчётом стоимости на стороне БД и пересчётом сохранённой стоимости.
+
+    Стоимость заказа с позициями в одной валюте вычисляется в SQL по снимкам цен (unit_price, currency)
+    теми же правилами, что и в PricingEngine. Для заказа с позициями в разных валютах нужен перевод
+    по курсам CurrencyConverter, поэтому для него используется сохранённое поле Order.total.
+    """
+
+    @staticmethod
+    def _money(expression):
+        return Round(expression, 2, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    def with_totals(self):
+        """
+        Добавляет к заказам subtotal, discount_amount, tax_amount и total_amount, вычисленные одним запросом.
+
+        Скидка и налог - проценты, налог начисляется после скидки, суммы округляются до сотых.
+        У заказов с позициями в разных валютах subtotal, discount_amount и tax_amount равны None,
+        а total_amount - сохранённой стоимости (Order.total).
+        """
+        lines = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        currencies = Coalesce(
+            Subquery(lines.annotate(count=Count('currency', distinct=True)).values('count')),
+            Value(0),
+        )
+        subtotal = Coalesce(
+            Subquery(lines.annotate(subtotal=Sum(F('unit_price') * F('quantity'))).values('subtotal')),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        discount_percent = Coalesce(F('discount__amount'), Value(Decimal('0')), output_field=DecimalField())
+        tax_rate = Coalesce(F('tax__rate'), Value(Decimal('0')), output_field=DecimalField())
+        discount_amount = self._money(subtotal * discount_percent / Value(Decimal('100')))
+        tax_amount = self._money((subtotal - discount_amount) * tax_rate / Value(Decimal('100')))
+
+        def single_currency(expression, default=Value(None)):
+            return Case(
+                When(currencies__lte=1, then=expression),
+                default=default,
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+
+        return self.alias(currencies=currencies).annotate(
+            subtotal=single_currency(subtotal),
+            discount_amount=single_currency(discount_amount),
+            tax_amount=single_currency(tax_amount),
+            total_amount=single_currency(subtotal - discount_amount + tax_amount, default=F('total')),
+        )
+
+    def update_totals(self, chunk_size: int = 2000) -> int:
+        """
+        Пересчитывает сохранённую стоимость (Order.total) заказов движком PricingEngine по снимкам цен
+        позиций и сбрасывает закэшированные расчёты (/order/<id>/quote).
+
+        Заказы обрабатываются пакетами по chunk_size: на пакет два SELECT и один UPDATE. Если курсы валют
+        устарели, стоимость заказа с позициями в разных валютах сбрасывается в None (см. total_price).
+
+        Returns:
+            int: Количество пересчитанных заказов.
+
+        """
+        from .pricing import PriceLine, PricingEngine, quote_cache_key
+
+        currencies = dict(Item.CURRENCY_CHOICES)
+        orders = Order.objects.filter(pk__in=self.values('pk')).order_by('pk')
+        last_pk = 0
+        updated = 0
+
+        while True:
+            chunk = list(orders.filter(pk__gt=last_pk).values_list('pk', 'discount__amount', 'tax__rate')[:chunk_size])
+
+            if not chunk:
+                return updated
+
+            order_ids = [order_id for order_id, _, _ in chunk]
+            lines = {order_id: [] for order_id in order_ids}
+
+            for order_id, pk, unit_price, currency, quantity in (
+                OrderItem.objects.filter(order_id__in=order_ids)
+                .order_by('pk')
+                .values_list('order_id', 'pk', 'unit_price', 'currency', 'quantity')
+            ):
+                lines[order_id].append(PriceLine(pk, unit_price, currencies[currency], quantity))
+
+            Order.objects.bulk_update(
+                [
+                    Order(pk=order_id, total=PricingEngine.quote_total(lines[order_id], discount, rate))
+                    for order_id, discount, rate in chunk
+                ],
+                ['total'],
+            )
+            # Повторно после фиксации транзакции: расчёт мог попасть в кэш из другого запроса до неё
+            cache_keys = [quote_cache_key(order_id) for order_id in order_ids]
+            cache.delete_many(cache_keys)
+            transaction.on_commit(lambda keys=cache_keys: cache.delete_many(keys))
+            last_pk = order_ids[-1]
+            updated += len(order_ids)
+
+
 class Order(models.Model):
     """
     Модель заказа
     """
+    STATUS_PENDING = 1
+    STATUS_PAID = 2
+    STATUS_FAILED = 3
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'pending'),
+        (STATUS_PAID, 'paid'),
+        (STATUS_FAILED, 'failed'),
+    )
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, default=1)
     address = models.CharField(
         max_length=300,
@@ -118,25 +276,66 @@ class Order(models.Model):
         null=True,
         blank=True
     )
+    total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Общая стоимость"
+    )
+    status = models.IntegerField(
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус оплаты"
+    )
+    paid_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата оплаты"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания"
+    )
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['pk']
+        indexes = [
+            models.Index(fields=['status', '-id'], name='order_status_id_idx'),
+            models.Index(fields=['user', '-id'], name='order_user_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='order_created_at_id_idx'),
+            models.Index(fields=['status', 'paid_at'], name='order_status_paid_at_idx'),
+        ]
 
     @property
     def total_price(self):
-        total = 0
-        for order_item in OrderItem.objects.filter(order=self):
-            total += order_item.item.price * order_item.quantity
+        """
+        Общая стоимость заказа в валюте оплаты: из аннотации with_totals(), из сохранённого поля total
+        или, если ни того ни другого нет, расчёт PricingEngine по снимкам цен позиций. Поле total здесь
+        не записывается: его заполняют сигналы и пересчёт update_totals().
+        """
+        if self.__dict__.get('total_amount') is not None:
+            return self.total_amount
 
-        if self.discount:
-            total -= self.discount.amount
+        if self.total is not None:
+            return self.total
 
-        if self.tax:
-            total += (total * self.tax.rate / 100)
+        from .pricing import PriceLine, PricingEngine
 
-        return total
+        lines = [
+            PriceLine(order_item.pk, order_item.unit_price, order_item.get_currency_display(), order_item.quantity)
+            for order_item in self.order_item.all()
+        ]
+        return PricingEngine.quote(
+            lines,
+            discount_percent=self.discount.amount if self.discount else None,
+            tax_rate=self.tax.rate if self.tax else None,
+        ).total
 
 
 class OrderItem(models.Model):
@@ -155,11 +354,166 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(
         default=1
     )
+    unit_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Цена за единицу"
+    )
+    currency = models.IntegerField(
+        choices=Item.CURRENCY_CHOICES,
+        verbose_name="Валюта"
+    )
 
     class Meta:
         verbose_name = 'Товар в заказе'
         verbose_name_plural = 'Товары в заказе'
         ordering = ['pk']
 
+    def snapshot_price(self) -> None:
+        """
+        Запоминает цену и валюту товара на момент добавления в заказ. Последующие изменения
+        товара не меняют стоимость заказа.
+        """
+        self.unit_price = self.item.price
+        self.currency = self.item.currency
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None or self.currency is None:
+            self.snapshot_price()
+
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        # Название товара выводится, только если товар уже загружен (select_related), иначе - его номер:
+        # строковое представление не должно выполнять запрос на каждую позицию
+        if OrderItem.item.is_cached(self):
+            return f"{self.quantity} x {self.item.name}"
+
+        return f"{self.quantity} x товар #{self.item_id}"
+
+
+class StripeEvent(models.Model):
+    """
+    Входящее событие вебхука Stripe (inbox).
+
+    Вебхук только сохраняет проверенное событие, изменения заказов применяет обработчик
+    (manage.py process_stripe_events) пакетами.
+    """
+    event_id = models.CharField(
+        max_length=255,
+        unique=True
+    )
+    type = models.CharField(
+        max_length=100
+    )
+    payload = models.JSONField()
+    received_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    processed_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Событие Stripe'
+        verbose_name_plural = 'События Stripe'
+        ordering = ['pk']
+        indexes = [
+            models.Index(
+                fields=['id'],
+                name='stripe_event_unprocessed_idx',
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
+
+
+class CheckoutJob(models.Model):
+    """
+    Задание на создание сессии оплаты Stripe (очередь в PostgreSQL).
+
+    Эндпоинты оплаты в режиме CHECKOUT_JOBS_ENABLED только создают задание, сессию создает
+    обработчик (manage.py process_checkout_jobs), а страница оплаты опрашивает статус задания.
+    """
+    KIND_ITEM = 'item'
+    KIND_ORDER = 'order'
+    KIND_CHOICES = (
+        (KIND_ITEM, 'item'),
+        (KIND_ORDER, 'order'),
+    )
+    STATUS_PENDING = 1
+    STATUS_RUNNING = 2
+    STATUS_DONE = 3
+    STATUS_FAILED = 4
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'pending'),
+        (STATUS_RUNNING, 'running'),
+        (STATUS_DONE, 'done'),
+        (STATUS_FAILED, 'failed'),
+    )
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES
+    )
+    object_id = models.BigIntegerField()
+    base_url = models.CharField(
+        max_length=300
+    )
+    status = models.IntegerField(
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField(
+        default=0
+    )
+    session_id = models.CharField(
+        max_length=255,
+        blank=True,
+        default=""
+    )
+    error = models.TextField(
+        blank=True,
+        default=""
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Задание оплаты'
+        verbose_name_plural = 'Задания оплаты'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['available_at'],
+                name='checkout_job_pending_idx',
+                condition=models.Q(status=1),
+            ),
+            models.Index(
+                fields=['started_at'],
+                name='checkout_job_running_idx',
+                condition=models.Q(status=2),
+            ),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.item.name}"
+        return f"{self.kind}-{self.object_id} ({self.get_status_display()})"
@@ -0,0 +1,68 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки для больших таблиц.
+
+    Для запроса без фильтров на PostgreSQL количество строк берётся из статистики планировщика
+    (pg_class.reltuples) вместо COUNT(*) по всей таблице. Оценка используется, только если она
+    больше ESTIMATE_THRESHOLD: небольшие таблицы и отфильтрованные запросы считаются точно.
+    """
+    ESTIMATE_THRESHOLD = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+
+        if query is not None and not query.where:
+            estimate = self.estimate_count(self.object_list.model, self.object_list.db)
+
+            if estimate > self.ESTIMATE_THRESHOLD:
+                return estimate
+
+        return super().count
+
+    @staticmethod
+    def estimate_count(model, using: str) -> int:
+        """
+        Возвращает оценку количества строк в таблице модели или -1, если оценки нет
+        (не PostgreSQL или таблица ещё не анализировалась).
+        """
+        connection = connections[using]
+
+        if connection.vendor != 'postgresql':
+            return -1
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+                [connection.ops.quote_name(model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+
+        return row[0] if row and row[0] is not None else -1
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация заказов по первичному ключу: стоимость страницы не зависит от её номера,
+    общее количество не считается.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ItemCatalogCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация каталога товаров по возрастанию первичного ключа.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,231 @@
+import logging
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+from .currency import StaleRatesError, get_converter
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+def money(amount) -> Decimal:
+    """
+    Округляет сумму до сотых (половина - от нуля, как round() в PostgreSQL).
+    """
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def quote_cache_key(order_id: int) -> str:
+    return f"order-quote:{order_id}"
+
+
+class PriceLine:
+    """
+    Позиция для расчёта стоимости: цена за единицу в валюте товара и количество.
+
+    Attributes:
+        - key: Идентификатор позиции (например, pk OrderItem), возвращается в QuoteLine без изменений.
+        - unit_price (Decimal): Цена за единицу.
+        - currency (str): Код валюты цены, например "usd".
+        - quantity (int): Количество.
+
+    """
+
+    def __init__(self, key: Any, unit_price: Decimal, currency: str, quantity: int):
+        self.key = key
+        self.unit_price = Decimal(unit_price)
+        self.currency = currency
+        self.quantity = quantity
+
+
+class QuoteLine:
+    """
+    Рассчитанная позиция: все суммы в валюте оплаты, скидка и налог распределены по позициям.
+    """
+
+    def __init__(self, line: PriceLine, unit_price: Decimal):
+        self.key = line.key
+        self.quantity = line.quantity
+        self.original_currency = line.currency
+        self.original_unit_price = line.unit_price
+        self.unit_price = unit_price
+        self.subtotal = unit_price * line.quantity
+        self.discount = Decimal('0.00')
+        self.tax = Decimal('0.00')
+
+    @property
+    def total(self) -> Decimal:
+        return self.subtotal - self.discount + self.tax
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'quantity': self.quantity,
+            'original_currency': self.original_currency,
+            'original_unit_price': str(self.original_unit_price),
+            'unit_price': str(self.unit_price),
+            'subtotal': str(self.subtotal),
+            'discount': str(self.discount),
+            'tax': str(self.tax),
+            'total': str(self.total),
+        }
+
+
+class Quote:
+    """
+    Расчёт стоимости заказа в валюте оплаты.
+
+    Attributes:
+        - currency (str): Валюта оплаты.
+        - lines (List[QuoteLine]): Позиции в порядке входных данных.
+        - discount_percent (Decimal): Скидка, %.
+        - tax_rate (Decimal): Налог, %.
+        - subtotal, discount, tax, total (Decimal): Итоговые суммы; total равен сумме total позиций.
+
+    """
+
+    def __init__(self, currency: str, lines: List[QuoteLine], discount_percent: Decimal, tax_rate: Decimal):
+        self.currency = currency
+        self.lines = lines
+        self.discount_percent = discount_percent
+        self.tax_rate = tax_rate
+        self.subtotal = sum((line.subtotal for line in lines), Decimal('0.00'))
+        self.discount = money(self.subtotal * discount_percent / HUNDRED)
+        self.tax = money((self.subtotal - self.discount) * tax_rate / HUNDRED)
+        self.total = self.subtotal - self.discount + self.tax
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'currency': self.currency,
+            'discount_percent': str(self.discount_percent),
+            'tax_rate': str(self.tax_rate),
+            'subtotal': str(self.subtotal),
+            'discount': str(self.discount),
+            'tax': str(self.tax),
+            'total': str(self.total),
+            'lines': [line.as_dict() for line in self.lines],
+        }
+
+
+class PricingEngine:
+    """
+    Единый расчёт стоимости заказа в Decimal.
+
+    Все позиции заказа рассчитываются за один проход: цены переводятся в валюту оплаты
+    и округляются до сотых, скидка (процент) применяется к сумме позиций, налог (процент) -
+    к сумме после скидки. Скидка и налог распределяются по позициям с точностью до сотых
+    (метод наибольшего остатка), поэтому сумма позиций всегда равна итогу заказа.
+    Этот расчёт используют сохранённая стоимость заказа (Order.total), /order/<id>/quote,
+    страница заказа и данные для Stripe Checkout.
+
+    Methods:
+        - quote(lines, discount_percent, tax_rate, charge_currency) -> Quote:
+            Рассчитывает стоимость позиций.
+        - quote_total(lines, discount_percent, tax_rate) -> Optional[Decimal]:
+            Рассчитывает итог для сохранения в Order.total или возвращает None без актуальных курсов.
+        - get_charge_currency(currencies: Iterable[str]) -> str:
+            Возвращает валюту оплаты для набора валют позиций.
+
+    """
+
+    @classmethod
+    def quote(
+            cls,
+            lines: Iterable[PriceLine],
+            discount_percent: Optional[Decimal] = None,
+            tax_rate: Optional[Decimal] = None,
+            charge_currency: Optional[str] = None,
+    ) -> Quote:
+        """
+        Рассчитывает стоимость позиций.
+
+        Parameters:
+            - lines (Iterable[PriceLine]): Позиции.
+            - discount_percent (Optional[Decimal]): Скидка, % (None - без скидки).
+            - tax_rate (Optional[Decimal]): Налог, % (None - без налога).
+            - charge_currency (Optional[str]): Валюта оплаты. По умолчанию общая валюта позиций
+              или ORDER_CHARGE_CURRENCY, если валюты разные.
+
+        Returns:
+            Quote: Расчёт стоимости.
+
+        """
+        lines = list(lines)
+        charge_currency = charge_currency or cls.get_charge_currency(line.currency for line in lines)
+        converter = None
+        quote_lines = []
+
+        for line in lines:
+            if line.currency == charge_currency:
+                unit_price = money(line.unit_price)
+            else:
+                converter = converter or get_converter()
+                unit_price = money(converter.convert(line.unit_price, line.currency, charge_currency))
+
+            quote_lines.append(QuoteLine(line, unit_price))
+
+        quote = Quote(charge_currency, quote_lines, Decimal(discount_percent or 0), Decimal(tax_rate or 0))
+
+        discounts = cls.allocate(quote.discount, [line.subtotal for line in quote_lines])
+
+        for quote_line, discount in zip(quote_lines, discounts):
+            quote_line.discount = discount
+
+        taxes = cls.allocate(quote.tax, [line.subtotal - line.discount for line in quote_lines])
+
+        for quote_line, tax in zip(quote_lines, taxes):
+            quote_line.tax = tax
+
+        return quote
+
+    @classmethod
+    def quote_total(
+            cls,
+            lines: Iterable[PriceLine],
+            discount_percent: Optional[Decimal] = None,
+            tax_rate: Optional[Decimal] = None,
+    ) -> Optional[Decimal]:
+        """
+        Рассчитывает итог заказа для сохранения в Order.total.
+
+        Если курсы валют устарели (StaleRatesError), возвращает None: заказ сохраняется без стоимости,
+        а Order.total_price рассчитает её при обращении, когда курсы обновятся.
+
+        Returns:
+            Optional[Decimal]: Итог заказа или None.
+
+        """
+        try:
+            return cls.quote(lines, discount_percent, tax_rate).total
+        except StaleRatesError as e:
+            logger.warning(f"PricingEngine: стоимость заказа не рассчитана: {str(e)}")
+            return None
+
+    @staticmethod
+    def get_charge_currency(currencies: Iterable[str]) -> str:
+        currencies = set(currencies)
+        return currencies.pop() if len(currencies) == 1 else settings.ORDER_CHARGE_CURRENCY
+
+    @staticmethod
+    def allocate(amount: Decimal, weights: List[Decimal]) -> List[Decimal]:
+        """
+        Распределяет сумму по позициям пропорционально весам с точностью до сотых так,
+        что сумма долей равна исходной сумме.
+        """
+        cents = int(amount / CENT)
+        weight_sum = sum(weights)
+
+        if not cents or not weight_sum:
+            return [Decimal('0.00')] * len(weights)
+
+        exact = [cents * weight / weight_sum for weight in weights]
+        shares = [int(value) for value in exact]
+        by_remainder = sorted(range(len(weights)), key=lambda index: exact[index] - shares[index], reverse=True)
+
+        for index in by_remainder[:cents - sum(shares)]:
+            shares[index] += 1
+
+        return [share * CENT for share in shares]
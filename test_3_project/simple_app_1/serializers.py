@@ -1,12 +1,49 @@
 from rest_framework import serializers
 
+from .models import Item, Order
 
 
-class OrderItemSerializer(serializers.Serializer):
-    item_id = serializers.IntegerField()
-    quantity = serializers.IntegerField()
 
+class SparseFieldsMixin:
+    """
+    Позволяет ограничить набор полей сериализатора аргументом fields.
+    """
 
-class OrderCreateSerializer(serializers.Serializer):
-    items = OrderItemSerializer(many=True)
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
 
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class OrderListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = [
+            'id',
+            'user',
+            'address',
+            'telephone',
+            'discount',
+            'tax',
+            'total',
+            'status',
+            'created_at',
+            'paid_at',
+        ]
+
+
+class ItemCatalogSerializer(serializers.ModelSerializer):
+    currency = serializers.CharField(source='get_currency_display')
+
+    class Meta:
+        model = Item
+        fields = [
+            'id',
+            'sku',
+            'name',
+            'price',
+            'currency',
+            'stripe_price_id',
+        ]
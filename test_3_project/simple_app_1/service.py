@@ -1,20 +1,344 @@
-from typing import List, Dict
-import stripe
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import urljoin
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+import asyncio
+import csv
+import hashlib
+import io
+import json
 import os
 import logging
+import random
+import threading
+import time
+import uuid
+import weakref
+import zlib
 
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Prefetch, Q, QuerySet
 from django.http import HttpRequest
 from django.urls import reverse
-from test_3_project.settings import STRIPE_SECRET_KEY_CURRENCY_1, STRIPE_SECRET_KEY_CURRENCY_2
-from .models import Order, OrderItem, Item
+from django.utils import timezone
+from test_3_project.settings import STRIPE_SECRET_KEY, STRIPE_SECRET_KEY_CURRENCY_1, STRIPE_SECRET_KEY_CURRENCY_2
+from .filters import OrderFilter
+from .models import CheckoutJob, Order, OrderItem, Item, StripeEvent
+from .pricing import PriceLine, PricingEngine, Quote, quote_cache_key
+from .stripe_clients import CircuitOpenError, RateLimiter, StripeClientRegistry
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-file_handler = logging.FileHandler('app.log')
-file_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+
+class StripePriceCatalogService:
+    """
+    Сервис каталога цен Stripe.
+
+    Stripe Product и Price создаются один раз для товара, его валюты и цены, их идентификаторы
+    сохраняются в Item. При изменении цены или валюты Price пересоздаётся при следующей оплате,
+    при изменении названия или описания Product обновляется при синхронизации каталога.
+
+    Methods:
+        - get_price_id(item: Item, stripe_secret_key: str) -> str:
+            Возвращает идентификатор актуального Stripe Price для товара.
+        - aget_price_id(item: Item, stripe_secret_key: str) -> str:
+            Асинхронная версия get_price_id.
+        - needs_sync(item: Item) -> bool:
+            Проверяет, отличается ли товар от синхронизированного со Stripe.
+        - sync_item(item: Item, stripe_secret_key: str, save: bool, throttle: Callable) -> str:
+            Создает или обновляет Product и Price товара в Stripe.
+
+    """
+    SYNC_FIELDS = ['stripe_product_id', 'stripe_price_id', 'stripe_price_fingerprint', 'stripe_product_fingerprint']
+
+    @classmethod
+    def get_price_id(cls, item: Item, stripe_secret_key: str) -> str:
+        """
+        Возвращает идентификатор актуального Stripe Price для товара, при необходимости создавая его.
+
+        Parameters:
+            - item (Item): Объект товара.
+            - stripe_secret_key (str): Секретный ключ Stripe аккаунта, соответствующего валюте товара.
+
+        Returns:
+            str: Идентификатор Stripe Price.
+
+        """
+        if item.stripe_price_id != "None" and item.stripe_price_fingerprint == item.get_stripe_price_fingerprint():
+            return item.stripe_price_id
+
+        return cls.sync_item(item, stripe_secret_key)
+
+    @classmethod
+    async def aget_price_id(cls, item: Item, stripe_secret_key: str) -> str:
+        """
+        Асинхронная версия get_price_id.
+
+        Обычно Price уже создан и запросов к Stripe не требуется. Создание Product и Price выполняется
+        в потоке (sync_to_async), так как вместе с ним идёт обновление товара в БД.
+
+        Parameters:
+            - item (Item): Объект товара.
+            - stripe_secret_key (str): Секретный ключ Stripe аккаунта, соответствующего валюте товара.
+
+        Returns:
+            str: Идентификатор Stripe Price.
+
+        """
+        if item.stripe_price_id != "None" and item.stripe_price_fingerprint == item.get_stripe_price_fingerprint():
+            return item.stripe_price_id
+
+        return await sync_to_async(cls.sync_item)(item, stripe_secret_key)
+
+    @staticmethod
+    def needs_sync(item: Item) -> bool:
+        """
+        Проверяет, отличается ли товар от синхронизированного со Stripe (нет Price, изменились цена,
+        валюта, название или описание).
+
+        Parameters:
+            - item (Item): Объект товара.
+
+        Returns:
+            bool: True, если товар нужно синхронизировать.
+
+        """
+        return (
+            item.stripe_price_id == "None"
+            or item.stripe_price_fingerprint != item.get_stripe_price_fingerprint()
+            or item.stripe_product_fingerprint != item.get_stripe_product_fingerprint()
+        )
+
+    @classmethod
+    def sync_item(
+            cls,
+            item: Item,
+            stripe_secret_key: str,
+            save: bool = True,
+            throttle: Optional[Callable[[], None]] = None,
+    ) -> str:
+        """
+        Создает или обновляет Product и Price товара в Stripe и записывает их идентификаторы в товар.
+
+        Запросы идемпотентны, поэтому после ошибки синхронизацию товара можно безопасно повторить.
+
+        Parameters:
+            - item (Item): Объект товара.
+            - stripe_secret_key (str): Секретный ключ Stripe аккаунта, соответствующего валюте товара.
+            - save (bool): Сохранить идентификаторы в БД. При False поля меняются только у объекта.
+            - throttle (Optional[Callable]): Вызывается перед каждым запросом к API (ограничение частоты).
+
+        Returns:
+            str: Идентификатор Stripe Price.
+
+        """
+        price_fingerprint = item.get_stripe_price_fingerprint()
+        product_fingerprint = item.get_stripe_product_fingerprint()
+        throttle = throttle or (lambda: None)
+
+        try:
+            currency = item.get_currency_display()
+            product_id = item.stripe_product_id
+            price_id = item.stripe_price_id
+            synced_currency = item.stripe_price_fingerprint.split(':')[0]
+
+            client = StripeClientRegistry.get_client(stripe_secret_key)
+            product_params = {
+                'name': item.name,
+                'description': item.description,
+                'metadata': {'item_id': item.pk},
+            }
+
+            # Товары разных валют живут в разных аккаунтах Stripe
+            if product_id == "None" or synced_currency != currency:
+                throttle()
+                product = client.products.create(
+                    params=product_params,
+                    options={'idempotency_key': f"item-{item.pk}-product-{price_fingerprint}-{product_fingerprint}"},
+                )
+                product_id = product.id
+                price_id = "None"
+            elif item.stripe_product_fingerprint != product_fingerprint:
+                throttle()
+                client.products.update(
+                    product_id,
+                    params=product_params,
+                    options={'idempotency_key': f"item-{item.pk}-product-update-{product_fingerprint}"},
+                )
+
+            if price_id == "None" or item.stripe_price_fingerprint != price_fingerprint:
+                throttle()
+                price = client.prices.create(
+                    params={
+                        'product': product_id,
+                        'currency': currency,
+                        'unit_amount': item.get_unit_amount(),
+                        'metadata': {'item_id': item.pk},
+                    },
+                    options={'idempotency_key': f"item-{item.pk}-price-{product_id}-{price_fingerprint}"},
+                )
+                price_id = price.id
+
+            item.stripe_product_id = product_id
+            item.stripe_price_id = price_id
+            item.stripe_price_fingerprint = price_fingerprint
+            item.stripe_product_fingerprint = product_fingerprint
+
+            if save:
+                Item.objects.filter(pk=item.pk).update(**{field: getattr(item, field) for field in cls.SYNC_FIELDS})
+                ItemCatalogVersion.bump()
+
+            return price_id
+        except Exception as e:
+            logger.error(f"An error occurred in StripePriceCatalogService: {str(e)}")
+            raise
+
+
+class ItemPageCache:
+    """
+    Кэш отрисованных страниц товаров.
+
+    Ключ страницы строится из идентификатора товара, версии товара и версии публичных ключей Stripe.
+    Версия товара меняется сигналами post_save/post_delete, поэтому изменение товара (в том числе
+    через админку) сразу делает старую страницу недоступной. ITEM_PAGE_CACHE_SECONDS ограничивает
+    время жизни страницы, если кэш не общий для всех процессов.
+
+    Methods:
+        - get(pk: int) -> Optional[dict]:
+            Возвращает закэшированную страницу товара.
+        - set(pk: int, content: bytes, last_modified: datetime) -> dict:
+            Сохраняет страницу товара.
+        - invalidate(pk: int) -> None:
+            Делает закэшированные страницы товара недоступными.
+        - invalidate_many(pks: List[int]) -> None:
+            Делает закэшированные страницы нескольких товаров недоступными.
+
+    """
+    @classmethod
+    def get(cls, pk: int) -> Optional[dict]:
+        """
+        Возвращает закэшированную страницу товара.
+
+        Parameters:
+            - pk (int): Идентификатор товара.
+
+        Returns:
+            Optional[dict]: Словарь с ключами content, etag и last_modified или None.
+
+        """
+        return cache.get(cls._page_key(pk))
+
+    @classmethod
+    def set(cls, pk: int, content: bytes, last_modified: datetime) -> dict:
+        """
+        Сохраняет страницу товара.
+
+        Parameters:
+            - pk (int): Идентификатор товара.
+            - content (bytes): HTML страницы.
+            - last_modified (datetime): Дата изменения товара.
+
+        Returns:
+            dict: Сохранённая страница с ключами content, etag и last_modified.
+
+        """
+        page = {
+            'content': content,
+            'etag': f'"{hashlib.md5(content).hexdigest()}"',
+            'last_modified': int(last_modified.timestamp()),
+        }
+        cache.set(cls._page_key(pk), page, timeout=settings.ITEM_PAGE_CACHE_SECONDS)
+        return page
+
+    @classmethod
+    def invalidate(cls, pk: int) -> None:
+        """
+        Делает закэшированные страницы товара недоступными.
+
+        Parameters:
+            - pk (int): Идентификатор товара.
+
+        """
+        cache.set(cls._version_key(pk), time.time_ns(), timeout=None)
+
+    @classmethod
+    def invalidate_many(cls, pks: List[int]) -> None:
+        """
+        Делает закэшированные страницы нескольких товаров недоступными одним обращением к кэшу.
+
+        Parameters:
+            - pks (List[int]): Идентификаторы товаров.
+
+        """
+        version = time.time_ns()
+        cache.set_many({cls._version_key(pk): version for pk in pks}, timeout=None)
+
+    @classmethod
+    def _page_key(cls, pk: int) -> str:
+        version_key = cls._version_key(pk)
+        version = cache.get(version_key)
+
+        if version is None:
+            # Новая версия, а не 0: после вытеснения ключа версии старые страницы не должны совпасть
+            cache.add(version_key, time.time_ns(), timeout=None)
+            version = cache.get(version_key)
+
+        public_keys = f"{settings.STRIPE_PUBLIC_KEY_CURRENCY_1}:{settings.STRIPE_PUBLIC_KEY_CURRENCY_2}"
+        keys_version = hashlib.md5(public_keys.encode()).hexdigest()[:12]
+        return f"item-page:{pk}:{version}:{keys_version}"
+
+    @staticmethod
+    def _version_key(pk: int) -> str:
+        return f"item-page-version:{pk}"
+
+
+class ItemCatalogVersion:
+    """
+    Версия каталога товаров.
+
+    Меняется при любом изменении товаров (сигналы Item, синхронизация цен со Stripe, импорт)
+    и используется как ETag каталога. Хранится в общем кэше (CACHE_URL): в памяти процесса у каждого
+    воркера своя версия, поэтому без общего кэша при нескольких процессах ETag устаревает
+    (см. проверку simple_app_1.W001).
+
+    Methods:
+        - get() -> int:
+            Возвращает текущую версию каталога.
+        - bump() -> None:
+            Меняет версию каталога.
+
+    """
+    CACHE_KEY = 'item-catalog-version'
+
+    @classmethod
+    def get(cls) -> int:
+        """
+        Возвращает текущую версию каталога.
+
+        Returns:
+            int: Версия каталога.
+
+        """
+        version = cache.get(cls.CACHE_KEY)
+
+        if version is None:
+            cache.add(cls.CACHE_KEY, time.time_ns(), timeout=None)
+            version = cache.get(cls.CACHE_KEY)
+
+        return version
+
+    @classmethod
+    def bump(cls) -> None:
+        """
+        Меняет версию каталога.
+        """
+        cache.set(cls.CACHE_KEY, time.time_ns(), timeout=None)
+
 
 class ItemPaymentDataService:
     """
@@ -23,10 +347,12 @@ class ItemPaymentDataService:
     Methods:
         - generate_payment_data(request: HttpRequest, item: Item, currency: str) -> Tuple[Dict, str]:
             Генерирует данные для платежа на основе информации о товаре.
+        - agenerate_payment_data(request: HttpRequest, item: Item, currency: str) -> Tuple[Dict, str]:
+            Асинхронная версия generate_payment_data.
 
     """
     @classmethod
-    def generate_payment_data(cls, request: HttpRequest, item: Item, currency: str) -> Dict:
+    def generate_payment_data(cls, request: HttpRequest, item: Item, currency: str) -> Tuple[Dict, str]:
         """
         Генерирует данные для платежа на основе информации о товаре.
 
@@ -40,35 +366,183 @@ class ItemPaymentDataService:
 
         """
         try:
-            if currency == 'usd':
-                stripe_secret_key = STRIPE_SECRET_KEY_CURRENCY_1
-            else:
-                stripe_secret_key = STRIPE_SECRET_KEY_CURRENCY_2
+            stripe_secret_key = cls.get_secret_key(currency)
+            price_id = StripePriceCatalogService.get_price_id(item, stripe_secret_key)
+            return cls.build_payment_data(request, price_id), stripe_secret_key
+        except Exception as e:
+            logger.error(f"An error occurred in ItemPaymentDataService: {str(e)}")
+            raise
 
-            payment_data = {
-                'payment_method_types': ['card'],
-                'line_items': [
+    @classmethod
+    async def agenerate_payment_data(cls, request: HttpRequest, item: Item, currency: str) -> Tuple[Dict, str]:
+        """
+        Асинхронная версия generate_payment_data.
+        """
+        try:
+            stripe_secret_key = cls.get_secret_key(currency)
+            price_id = await StripePriceCatalogService.aget_price_id(item, stripe_secret_key)
+            return cls.build_payment_data(request, price_id), stripe_secret_key
+        except Exception as e:
+            logger.error(f"An error occurred in ItemPaymentDataService: {str(e)}")
+            raise
+
+    @staticmethod
+    def get_secret_key(currency: str) -> str:
+        if currency == 'usd':
+            return STRIPE_SECRET_KEY_CURRENCY_1
+
+        return STRIPE_SECRET_KEY_CURRENCY_2
+
+    @staticmethod
+    def build_payment_data(request: HttpRequest, price_id: str) -> Dict:
+        return {
+            'payment_method_types': ['card'],
+            'line_items': [
+                {
+                    'price': price_id,
+                    'quantity': 1,
+                }
+            ],
+            'mode': 'payment',
+            'success_url': request.build_absolute_uri(reverse('success')),
+            'cancel_url': request.build_absolute_uri(reverse('cancel')),
+        }
+
+
+class OrderLoader:
+    """
+    Загрузчик заказа вместе со всеми связанными данными.
+
+    Заказ, скидка, налог и сохранённая стоимость загружаются одним запросом, товары в заказе вместе
+    с товарами - вторым. Количество запросов не зависит от числа позиций в заказе.
+
+    Methods:
+        - get_queryset() -> QuerySet:
+            Возвращает QuerySet заказов с подгруженными связанными данными.
+        - load(order_id: int) -> Order:
+            Загружает заказ по идентификатору.
+        - aload(order_id: int) -> Order:
+            Асинхронная версия load.
+
+    """
+    @classmethod
+    def get_queryset(cls) -> QuerySet:
+        """
+        Возвращает QuerySet заказов с подгруженными скидкой, налогом, стоимостью и товарами.
+
+        Returns:
+            QuerySet: QuerySet заказов.
+
+        """
+        return (
+            Order.objects
+            .select_related('discount', 'tax')
+            .prefetch_related(
+                Prefetch('order_item', queryset=OrderItem.objects.select_related('item'))
+            )
+        )
+
+    @classmethod
+    def load(cls, order_id: int) -> Order:
+        """
+        Загружает заказ по идентификатору.
+
+        Parameters:
+            - order_id (int): Идентификатор заказа.
+
+        Returns:
+            Order: Объект заказа.
+
+        Raises:
+            - Order.DoesNotExist: Если заказ не найден.
+
+        """
+        return cls.get_queryset().get(pk=order_id)
+
+    @classmethod
+    async def aload(cls, order_id: int) -> Order:
+        """
+        Асинхронная версия load.
+        """
+        return await cls.get_queryset().aget(pk=order_id)
+
+
+class OrderQuoteService:
+    """
+    Расчёт стоимости заказа (PricingEngine) для страницы заказа, /order/<id>/quote и данных для Stripe.
+
+    Расчёт строится по снимкам цен позиций (OrderItem.unit_price, OrderItem.currency) и кэшируется
+    на ORDER_QUOTE_CACHE_SECONDS; Order.objects.update_totals() сбрасывает кэш при изменении заказа.
+
+    Methods:
+        - build_quote(order: Order) -> Quote:
+            Рассчитывает стоимость загруженного заказа (OrderLoader).
+        - get_quote(order_id: int) -> Dict:
+            Возвращает расчёт стоимости заказа в виде словаря, из кэша или рассчитывая его.
+
+    """
+
+    @staticmethod
+    def build_quote(order: Order) -> Quote:
+        """
+        Рассчитывает стоимость заказа, загруженного через OrderLoader, без дополнительных запросов.
+
+        Parameters:
+            - order (Order): Объект заказа.
+
+        Returns:
+            Quote: Расчёт стоимости.
+
+        """
+        lines = [
+            PriceLine(order_item, order_item.unit_price, order_item.get_currency_display(), order_item.quantity)
+            for order_item in order.order_item.all()
+        ]
+        return PricingEngine.quote(
+            lines,
+            discount_percent=order.discount.amount if order.discount else None,
+            tax_rate=order.tax.rate if order.tax else None,
+        )
+
+    @classmethod
+    def get_quote(cls, order_id: int) -> Dict:
+        """
+        Возвращает расчёт стоимости заказа в виде словаря, из кэша или рассчитывая его.
+
+        Parameters:
+            - order_id (int): Идентификатор заказа.
+
+        Returns:
+            Dict: Итоговые суммы заказа и позиции (lines) с ценой, скидкой, налогом и итогом.
+
+        Raises:
+            - Order.DoesNotExist: Если заказ не найден.
+
+        """
+        cache_key = quote_cache_key(order_id)
+        data = cache.get(cache_key)
+
+        if data is None:
+            order = OrderLoader.load(order_id)
+            quote = cls.build_quote(order)
+            data = {
+                'order_id': order.pk,
+                'discount': str(order.discount) if order.discount else None,
+                'tax': str(order.tax) if order.tax else None,
+                **quote.as_dict(),
+                'lines': [
                     {
-                        'price_data': {
-                            'currency': currency,
-                            'product_data': {
-                                'name': item.name,
-                                'description': item.description,
-                            },
-                            'unit_amount': int(item.price * 100),
-                        },
-                        'quantity': 1,
+                        'id': line.key.pk,
+                        'item_id': line.key.item_id,
+                        'name': line.key.item.name,
+                        **line.as_dict(),
                     }
+                    for line in quote.lines
                 ],
-                'mode': 'payment',
-                'success_url': request.build_absolute_uri(reverse('success')),
-                'cancel_url': request.build_absolute_uri(reverse('cancel')),
             }
+            cache.set(cache_key, data, timeout=settings.ORDER_QUOTE_CACHE_SECONDS)
 
-            return payment_data, stripe_secret_key
-        except Exception as e:
-            logger.error(f"An error occurred in ItemPaymentDataService: {str(e)}")
-            raise
+        return data
 
 
 class OrderPaymentDataService:
@@ -77,7 +551,8 @@ class OrderPaymentDataService:
 
     Methods:
         - generate_payment_data(request: HttpRequest, order: Order) -> Dict:
-            Генерирует данные для платежа на основе информации о заказе.
+            Генерирует данные для платежа на основе расчёта стоимости заказа (OrderQuoteService).
+            Если в заказе товары в разных валютах, все позиции пересчитываются в одну валюту оплаты.
 
     """
     @classmethod
@@ -85,53 +560,61 @@ class OrderPaymentDataService:
         """
         Генерирует данные для платежа на основе информации о заказе.
 
+        Сумма позиций в Stripe Checkout равна итогу расчёта: скидка и налог уже распределены по позициям.
+        Если итог позиции не делится на количество без остатка, позиция передаётся одной строкой с количеством 1.
+
         Parameters:
             - request (HttpRequest): Объект, представляющий входящий HTTP-запрос.
-            - order (Order): Объект заказа.
+            - order (Order): Объект заказа, загруженный через OrderLoader.
 
         Returns:
             Dict: Словарь с данными для платежа.
 
         """
         try:
+            quote = OrderQuoteService.build_quote(order)
             line_items = []
 
-            for item in order.order_item.all():
-                description = f"{item.item.description}."
+            for line in quote.lines:
+                order_item = line.key
+                description = f"{order_item.item.description}."
 
-                if (order.tax and order.tax.rate) or (order.discount and order.discount.amount):
-                    description += f" Начальная цена: {item.item.get_formatted_price()}."
+                if quote.tax or quote.discount or line.original_currency != quote.currency:
+                    description += f" Начальная цена: {line.original_unit_price:.2f} {line.original_currency}."
 
-                unit_amount = int(item.item.price)
+                if quote.tax:
+                    description += f" Добавлен налог {quote.tax_rate}%."
 
-                if order.tax and order.tax.rate:
-                    unit_amount -= unit_amount * int(order.tax.rate) / 100
-                    description += f" Добавлен налог {order.tax.rate}%."
+                if quote.discount:
+                    description += f" Добавлена скидка {quote.discount_percent}%."
 
-                if order.discount and order.discount.amount:
-                    unit_amount -= unit_amount * int(order.discount.amount) / 100
-                    description += f" Добавлена скидка {order.discount.amount}%."
+                total = int(line.total * 100)
+                name = order_item.item.name
+                quantity = line.quantity
 
-                unit_amount *= 100
-                unit_amount = round(unit_amount)
+                if total % quantity:
+                    name, quantity = f"{name} x {quantity}", 1
 
                 line_items.append(
                     {
                         'price_data': {
-                            'currency': item.item.get_currency_display(),
+                            'currency': quote.currency,
                             'product_data': {
-                                'name': item.item.name,
+                                'name': name,
                                 'description': description,
                             },
-                            'unit_amount': unit_amount,
+                            'unit_amount': total // quantity,
                         },
-                        'quantity': item.quantity,
+                        'quantity': quantity,
                     }
                 )
 
             payment_data = {
                 'payment_method_types': ['card'],
                 'line_items': line_items,
+                'client_reference_id': f"order-{order.pk}",
+                'metadata': {'order_id': order.pk},
+                'payment_intent_data': {'metadata': {'order_id': order.pk}},
                 'mode': 'payment',
                 'success_url': request.build_absolute_uri(reverse('success')),
                 'cancel_url': request.build_absolute_uri(reverse('cancel')),
@@ -147,67 +630,1187 @@ class PaymentSessionCreator:
     """
     Сервис создания сессии оплаты через Stripe Checkout.
 
+    Сессии с одинаковыми данными для одного товара или заказа и одного покупателя переиспользуются:
+    они кэшируются до конца окна CHECKOUT_SESSION_REUSE_SECONDS, создаются с ключом идемпотентности Stripe,
+    а одновременные одинаковые запросы в процессе ждут одного обращения к Stripe. Покупатель определяется
+    заголовком Idempotency-Key или ключом сессии Django (get_reuse_key), разные покупатели получают разные
+    сессии. Завершённая или истёкшая сессия удаляется из кэша вебхуком (forget_session).
+
     Methods:
-        - create_session(stripe_secret_key: str, payment_data: dict) -> str:
-            Создает сессию оплаты.
+        - get_reuse_key(request: HttpRequest, object_key: str) -> Optional[str]:
+            Возвращает ключ переиспользования сессии для покупателя.
+        - create_session(stripe_secret_key: str, payment_data: dict, reuse_key: Optional[str] = None) -> str:
+            Создает сессию оплаты или возвращает уже созданную.
+        - acreate_session(stripe_secret_key: str, payment_data: dict, reuse_key: Optional[str] = None) -> str:
+            Асинхронная версия create_session.
+        - forget_session(session_id: str) -> None:
+            Удаляет сессию из кэша, чтобы она больше не переиспользовалась.
 
     """
+    # Stripe принимает expires_at не раньше чем через 30 минут после создания сессии
+    MIN_SESSION_LIFETIME = 30 * 60
+
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+    # Цикл событий -> {ключ кэша: asyncio.Lock}
+    _async_locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
     @classmethod
-    def create_session(cls, stripe_secret_key: str, payment_data: dict) -> str:
+    def get_reuse_key(cls, request: HttpRequest, object_key: str) -> Optional[str]:
         """
-        Создает сессию оплаты через Stripe Checkout.
+        Возвращает ключ переиспользования сессии для покупателя.
+
+        Покупатель определяется заголовком Idempotency-Key, а без него - ключом существующей сессии Django.
+        В ключ попадает только хэш значения.
 
         Parameters:
-            - stripe_secret_key (str): Секретный ключ Stripe.
-            - payment_data (dict): Словарь с данными для создания сессии оплаты.
+            - request (HttpRequest): Объект, представляющий входящий HTTP-запрос.
+            - object_key (str): Идентификатор оплачиваемого объекта (например, "item-1" или "order-5").
 
         Returns:
-            str: ID созданной сессии оплаты.
+            Optional[str]: Ключ для create_session или None, если покупателя определить нельзя
+            (тогда сессия не переиспользуется).
 
         """
-        try:
-            stripe.api_key = stripe_secret_key
-            session = stripe.checkout.Session.create(**payment_data)
-            return session.id
-        except Exception as e:
-            logger.error(f"An error occurred in PaymentSessionCreator: {str(e)}")
-            raise
+        token = request.headers.get('Idempotency-Key')
 
+        if token:
+            caller = f"token-{hashlib.sha256(token.encode()).hexdigest()[:32]}"
+        else:
+            session = getattr(request, 'session', None)
+            session_key = session.session_key if session is not None else None
 
-class OrderCreationService:
-    """
-    Сервис для создания заказов.
+            if not session_key:
+                return None
 
-    Methods:
-        - create_order(order_items_data: List[dict]) -> int:
-            Создает заказ на основе предоставленных данных.
+            caller = f"session-{hashlib.sha256(session_key.encode()).hexdigest()[:32]}"
 
-    """
+        return f"{object_key}:{caller}"
 
-    @staticmethod
-    def create_order(order_items_data: List[dict]) -> int:
+    @classmethod
+    def create_session(cls, stripe_secret_key: str, payment_data: dict, reuse_key: Optional[str] = None) -> str:
         """
-        Создает заказ на основе предоставленных данных.
+        Создает сессию оплаты через Stripe Checkout.
 
         Parameters:
-            - order_items_data (List[dict]): Список словарей с данными о товарах в заказе.
+            - stripe_secret_key (str): Секретный ключ Stripe.
+            - payment_data (dict): Словарь с данными для создания сессии оплаты.
+            - reuse_key (Optional[str]): Ключ оплачиваемого объекта и покупателя (см. get_reuse_key).
+              Если указан, сессия с теми же данными переиспользуется до истечения окна.
 
         Returns:
-            - int: Идентификатор созданного заказа.
+            str: ID созданной сессии оплаты.
 
         """
         try:
-            order = Order.objects.create()
+            if reuse_key is None:
+                return cls._create(stripe_secret_key, payment_data)
+
+            generation = cache.get(cls._generation_cache_key(reuse_key), 0)
+            cache_key, window_end, timeout = cls._reuse_window(stripe_secret_key, payment_data, reuse_key, generation)
+            session_id = cache.get(cache_key)
+
+            if session_id is not None:
+                return session_id
 
-            for item_data in order_items_data:
-                item = Item.objects.get(id=item_data['item_id'])
-                quantity = item_data['quantity']
+            with cls._locks_guard:
+                lock = cls._locks.setdefault(cache_key, threading.Lock())
 
-                order_item = OrderItem.objects.create(order=order, item=item, quantity=quantity)
+            try:
+                with lock:
+                    session_id = cache.get(cache_key)
 
-            return order.id
+                    if session_id is None:
+                        # expires_at зависит только от окна, поэтому повтор запроса с тем же ключом
+                        # идемпотентности из другого процесса вернёт ту же сессию
+                        session_id = cls._create(
+                            stripe_secret_key,
+                            {**payment_data, 'expires_at': window_end + cls.MIN_SESSION_LIFETIME},
+                            idempotency_key=cache_key,
+                        )
+                        cache.set_many(
+                            {cache_key: session_id, cls._session_cache_key(session_id): (reuse_key, cache_key)},
+                            timeout=timeout,
+                        )
+            finally:
+                with cls._locks_guard:
+                    cls._locks.pop(cache_key, None)
+
+            return session_id
         except Exception as e:
-            logger.error(f"An error occurred in OrderCreationService: {str(e)}")
+            logger.error(f"An error occurred in PaymentSessionCreator: {str(e)}")
             raise
 
+    @classmethod
+    async def acreate_session(
+            cls, stripe_secret_key: str, payment_data: dict, reuse_key: Optional[str] = None
+    ) -> str:
+        """
+        Асинхронная версия create_session: ожидание ответа Stripe не занимает поток.
+
+        Одновременные одинаковые запросы в пределах одного цикла событий ждут одного обращения к Stripe.
+
+        Parameters:
+            - stripe_secret_key (str): Секретный ключ Stripe.
+            - payment_data (dict): Словарь с данными для создания сессии оплаты.
+            - reuse_key (Optional[str]): Ключ оплачиваемого объекта и покупателя (см. get_reuse_key).
+
+        Returns:
+            str: ID созданной сессии оплаты.
+
+        """
+        try:
+            if reuse_key is None:
+                return await cls._acreate(stripe_secret_key, payment_data)
+
+            generation = await cache.aget(cls._generation_cache_key(reuse_key), 0)
+            cache_key, window_end, timeout = cls._reuse_window(stripe_secret_key, payment_data, reuse_key, generation)
+            session_id = await cache.aget(cache_key)
+
+            if session_id is not None:
+                return session_id
+
+            # asyncio.Lock привязан к циклу событий, поэтому блокировки хранятся отдельно для каждого цикла
+            with cls._locks_guard:
+                locks = cls._async_locks.setdefault(asyncio.get_running_loop(), {})
+                lock = locks.setdefault(cache_key, asyncio.Lock())
+
+            try:
+                async with lock:
+                    session_id = await cache.aget(cache_key)
+
+                    if session_id is None:
+                        session_id = await cls._acreate(
+                            stripe_secret_key,
+                            {**payment_data, 'expires_at': window_end + cls.MIN_SESSION_LIFETIME},
+                            idempotency_key=cache_key,
+                        )
+                        await cache.aset_many(
+                            {cache_key: session_id, cls._session_cache_key(session_id): (reuse_key, cache_key)},
+                            timeout=timeout,
+                        )
+            finally:
+                if not lock.locked():
+                    locks.pop(cache_key, None)
+
+            return session_id
+        except Exception as e:
+            logger.error(f"An error occurred in PaymentSessionCreator: {str(e)}")
+            raise
+
+    @classmethod
+    def forget_session(cls, session_id: str) -> None:
+        """
+        Удаляет сессию из кэша, чтобы следующий запрос создал новую (после checkout.session.completed
+        или checkout.session.expired).
+
+        Меняется и поколение ключа покупателя: иначе новая сессия получила бы прежний ключ
+        идемпотентности, и Stripe вернул бы закрытую сессию.
+
+        Parameters:
+            - session_id (str): ID сессии оплаты.
+
+        """
+        session_cache_key = cls._session_cache_key(session_id)
+        cached = cache.get(session_cache_key)
+
+        if cached is None:
+            return
+
+        reuse_key, cache_key = cached
+        cache.set(
+            cls._generation_cache_key(reuse_key), uuid.uuid4().hex[:12], timeout=settings.CHECKOUT_SESSION_REUSE_SECONDS
+        )
+        cache.delete_many([cache_key, session_cache_key])
+
+    @staticmethod
+    def _session_cache_key(session_id: str) -> str:
+        return f"checkout-session-id:{session_id}"
+
+    @staticmethod
+    def _generation_cache_key(reuse_key: str) -> str:
+        return f"checkout-session-generation:{reuse_key}"
+
+    @classmethod
+    def _reuse_window(
+            cls, stripe_secret_key: str, payment_data: dict, reuse_key: str, generation: Union[int, str] = 0
+    ) -> Tuple[str, int, int]:
+        """
+        Возвращает ключ кэша сессии (он же ключ идемпотентности), конец окна и время жизни ключа.
+        """
+        window = settings.CHECKOUT_SESSION_REUSE_SECONDS
+        now = int(time.time())
+        window_end = (now // window + 1) * window
+        fingerprint = hashlib.sha256(
+            json.dumps([stripe_secret_key, payment_data], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return f"checkout-session:{reuse_key}:{generation}:{fingerprint}:{window_end}", window_end, window_end - now
+
+    @classmethod
+    def _create(cls, stripe_secret_key: str, payment_data: dict, idempotency_key: Optional[str] = None) -> str:
+        client = StripeClientRegistry.get_client(stripe_secret_key)
+        options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+        session = client.checkout.sessions.create(params=payment_data, options=options)
+        return session.id
+
+    @classmethod
+    async def _acreate(cls, stripe_secret_key: str, payment_data: dict, idempotency_key: Optional[str] = None) -> str:
+        client = StripeClientRegistry.get_client(stripe_secret_key)
+        options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+        session = await client.checkout.sessions.create_async(params=payment_data, options=options)
+        return session.id
+
+
+class OrderCreationService:
+    """
+    Сервис для создания заказов.
+
+    Methods:
+        - create_order(order_items_data: List[dict]) -> int:
+            Создает заказ на основе предоставленных данных.
+        - acreate_order(order_items_data: List[dict]) -> int:
+            Асинхронная версия create_order.
+        - create_orders(orders_data: List[List[dict]]) -> List[int]:
+            Создает несколько заказов за один проход.
+
+    """
+
+    @classmethod
+    def create_order(cls, order_items_data: List[dict]) -> int:
+        """
+        Создает заказ на основе предоставленных данных.
+
+        Parameters:
+            - order_items_data (List[dict]): Список словарей с данными о товарах в заказе.
+
+        Returns:
+            - int: Идентификатор созданного заказа.
+
+        """
+        return cls.create_orders([order_items_data])[0]
+
+    @classmethod
+    async def acreate_order(cls, order_items_data: List[dict]) -> int:
+        """
+        Асинхронная версия create_order. Транзакция выполняется в отдельном потоке (sync_to_async).
+        """
+        return await sync_to_async(cls.create_order)(order_items_data)
+
+    @staticmethod
+    def create_orders(orders_data: List[List[dict]]) -> List[int]:
+        """
+        Создает несколько заказов за один проход: товары всех заказов выбираются одним запросом,
+        заказы и товары в заказах создаются через bulk_create в одной транзакции. Цены и валюты товаров
+        фиксируются в позициях, стоимость заказов рассчитывается PricingEngine до вставки.
+
+        Parameters:
+            - orders_data (List[List[dict]]): Список заказов, каждый - список словарей с данными о товарах.
+
+        Returns:
+            - List[int]: Идентификаторы созданных заказов в порядке входных данных.
+
+        Raises:
+            - Item.DoesNotExist: Если какой-либо из товаров не найден. В этом случае ничего не создается.
+
+        """
+        try:
+            item_ids = {item_data['item_id'] for order_items_data in orders_data for item_data in order_items_data}
+
+            with transaction.atomic():
+                items = Item.objects.in_bulk(item_ids)
+                missing_ids = sorted(item_ids - items.keys())
+
+                if missing_ids:
+                    raise Item.DoesNotExist(f"Items not found: {missing_ids}")
+
+                orders = Order.objects.bulk_create([
+                    Order(total=PricingEngine.quote_total([
+                        PriceLine(
+                            None,
+                            items[item_data['item_id']].price,
+                            items[item_data['item_id']].get_currency_display(),
+                            item_data['quantity'],
+                        )
+                        for item_data in order_items_data
+                    ]))
+                    for order_items_data in orders_data
+                ])
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        item=items[item_data['item_id']],
+                        quantity=item_data['quantity'],
+                        unit_price=items[item_data['item_id']].price,
+                        currency=items[item_data['item_id']].currency,
+                    )
+                    for order, order_items_data in zip(orders, orders_data)
+                    for item_data in order_items_data
+                ])
+
+            return [order.id for order in orders]
+        except Exception as e:
+            logger.error(f"An error occurred in OrderCreationService: {str(e)}")
+            raise
+
+
+class StripeEventInbox:
+    """
+    Приём событий вебхука Stripe.
+
+    Событие проверяется по подписи и сохраняется в таблицу StripeEvent одним INSERT,
+    повторная доставка того же события игнорируется.
+
+    Methods:
+        - receive(payload: bytes, signature: str) -> bool:
+            Проверяет и сохраняет событие.
+
+    """
+    EVENT_TYPES = (
+        'checkout.session.completed',
+        'checkout.session.async_payment_succeeded',
+        'checkout.session.async_payment_failed',
+        'checkout.session.expired',
+    )
+    # После этих событий сессия больше не переиспользуется для новых запросов оплаты
+    SESSION_CLOSED_EVENT_TYPES = ('checkout.session.completed', 'checkout.session.expired')
+    EVENT_TYPE_PREFIXES = ('payment_intent.',)
+
+    @classmethod
+    def receive(cls, payload: bytes, signature: str) -> bool:
+        """
+        Проверяет подпись события и сохраняет его в inbox.
+
+        Parameters:
+            - payload (bytes): Тело запроса вебхука.
+            - signature (str): Заголовок Stripe-Signature.
+
+        Returns:
+            bool: True, если событие сохранено, False, если тип события не обрабатывается.
+
+        Raises:
+            - stripe.SignatureVerificationError: Если подпись не подходит ни к одному из секретов.
+            - ValueError: Если тело запроса не является JSON-объектом события.
+
+        """
+        cls.verify_signature(payload, signature)
+        event = json.loads(payload)
+
+        if event['type'] not in cls.EVENT_TYPES and not event['type'].startswith(cls.EVENT_TYPE_PREFIXES):
+            return False
+
+        StripeEvent.objects.bulk_create(
+            [StripeEvent(event_id=event['id'], type=event['type'], payload=event)],
+            ignore_conflicts=True,
+        )
+
+        session_id = event['data']['object'].get('id')
+
+        if event['type'] in cls.SESSION_CLOSED_EVENT_TYPES and session_id:
+            PaymentSessionCreator.forget_session(session_id)
+
+        return True
+
+    @staticmethod
+    def verify_signature(payload: bytes, signature: str) -> None:
+        """
+        Проверяет подпись события по секретам вебхуков всех аккаунтов Stripe.
+        """
+        error = stripe.SignatureVerificationError('No webhook secrets configured', signature, payload)
+
+        for secret in settings.STRIPE_WEBHOOK_SECRETS:
+            try:
+                stripe.WebhookSignature.verify_header(
+                    payload.decode('utf-8'), signature, secret, settings.STRIPE_WEBHOOK_TOLERANCE
+                )
+                return
+            except stripe.SignatureVerificationError as e:
+                error = e
+
+        raise error
+
+
+class StripeEventProcessor:
+    """
+    Пакетная обработка событий Stripe из inbox.
+
+    Необработанные события выбираются пакетом с SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько обработчиков могут работать параллельно. Изменения статусов заказов применяются
+    несколькими UPDATE на весь пакет: сначала ошибки оплаты, затем оплаты, оплаченный заказ
+    не переводится в ошибку.
+
+    Methods:
+        - process_batch(batch_size: int) -> int:
+            Обрабатывает один пакет событий.
+
+    """
+    PAID_EVENT_TYPES = (
+        'checkout.session.async_payment_succeeded',
+        'payment_intent.succeeded',
+    )
+    FAILED_EVENT_TYPES = (
+        'checkout.session.async_payment_failed',
+        'payment_intent.payment_failed',
+    )
+
+    @classmethod
+    def process_batch(cls, batch_size: int = 500) -> int:
+        """
+        Обрабатывает один пакет необработанных событий.
+
+        Parameters:
+            - batch_size (int): Максимальное количество событий в пакете.
+
+        Returns:
+            int: Количество обработанных событий.
+
+        """
+        try:
+            with transaction.atomic():
+                events = list(
+                    StripeEvent.objects
+                    .filter(processed_at__isnull=True)
+                    .order_by('pk')
+                    .select_for_update(skip_locked=True)[:batch_size]
+                )
+
+                if not events:
+                    return 0
+
+                paid_order_ids, failed_order_ids = set(), set()
+
+                for event in events:
+                    order_id = cls.get_order_id(event.payload)
+                    status = cls.get_status(event.type, event.payload)
+
+                    if order_id is None or status is None:
+                        continue
+
+                    if status == Order.STATUS_PAID:
+                        paid_order_ids.add(order_id)
+                    else:
+                        failed_order_ids.add(order_id)
+
+                now = timezone.now()
+                Order.objects.filter(pk__in=failed_order_ids - paid_order_ids).exclude(
+                    status=Order.STATUS_PAID
+                ).update(status=Order.STATUS_FAILED)
+                Order.objects.filter(pk__in=paid_order_ids).exclude(
+                    status=Order.STATUS_PAID
+                ).update(status=Order.STATUS_PAID, paid_at=now)
+                StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=now)
+
+            return len(events)
+        except Exception as e:
+            logger.error(f"An error occurred in StripeEventProcessor: {str(e)}")
+            raise
+
+    @classmethod
+    def get_status(cls, event_type: str, payload: dict) -> Optional[int]:
+        """
+        Возвращает статус заказа, в который его переводит событие, или None.
+        """
+        if event_type == 'checkout.session.completed':
+            payment_status = payload['data']['object'].get('payment_status')
+            return Order.STATUS_PAID if payment_status in ('paid', 'no_payment_required') else None
+
+        if event_type in cls.PAID_EVENT_TYPES:
+            return Order.STATUS_PAID
+
+        if event_type in cls.FAILED_EVENT_TYPES:
+            return Order.STATUS_FAILED
+
+        return None
+
+    @staticmethod
+    def get_order_id(payload: dict) -> Optional[int]:
+        """
+        Возвращает идентификатор заказа из metadata или client_reference_id объекта события.
+        """
+        obj = payload['data']['object']
+        order_id = (obj.get('metadata') or {}).get('order_id')
+
+        if order_id is None and (obj.get('client_reference_id') or '').startswith('order-'):
+            order_id = obj['client_reference_id'][len('order-'):]
+
+        try:
+            return int(order_id) if order_id is not None else None
+        except ValueError:
+            return None
+
+
+class ItemImportService:
+    """
+    Сервис потокового импорта товаров из CSV или JSONL.
+
+    Строки читаются по одной, проверяются по модели Item и сохраняются пакетами через
+    INSERT ... ON CONFLICT (sku) DO UPDATE, поэтому расход памяти не зависит от размера файла.
+    Товар определяется артикулом (sku): существующие товары обновляются, новые создаются.
+
+    Methods:
+        - read_rows(stream: TextIO, file_format: str) -> Iterator[Tuple[int, Union[Dict, str]]]:
+            Читает строки файла.
+        - build_item(row: Union[Dict, str]) -> Item:
+            Создает и проверяет товар по строке файла.
+        - import_rows(rows, batch_size, on_error, on_batch) -> Dict:
+            Импортирует строки пакетами.
+        - save_batch(items: List[Item]) -> List[int]:
+            Сохраняет пакет товаров.
+
+    """
+    FORMATS = ('csv', 'jsonl')
+    UPDATE_FIELDS = ['name', 'description', 'price', 'currency', 'updated_at']
+    EXCLUDED_FIELDS = ['stripe_price_id', 'stripe_product_id', 'stripe_price_fingerprint', 'updated_at']
+
+    @classmethod
+    def read_rows(cls, stream: TextIO, file_format: str) -> Iterator[Tuple[int, Union[Dict, str]]]:
+        """
+        Читает строки файла, не загружая его в память целиком.
+
+        Parameters:
+            - stream (TextIO): Открытый файл.
+            - file_format (str): Формат файла: "csv" (с заголовком) или "jsonl".
+
+        Returns:
+            Iterator[Tuple[int, Union[Dict, str]]]: Номер строки и словарь (CSV) или исходная строка (JSONL).
+
+        """
+        if file_format == 'csv':
+            reader = csv.DictReader(stream)
+
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                if line.strip():
+                    yield line_number, line
+
+    @classmethod
+    def build_item(cls, row: Union[Dict, str]) -> Item:
+        """
+        Создает товар по строке файла и проверяет его по полям модели Item.
+
+        Parameters:
+            - row (Union[Dict, str]): Словарь с полями sku, name, description, price, currency или строка JSON.
+
+        Returns:
+            Item: Несохранённый товар.
+
+        Raises:
+            - ValidationError: Если строка не соответствует модели.
+
+        """
+        if isinstance(row, str):
+            try:
+                row = json.loads(row)
+            except ValueError as e:
+                raise ValidationError(f'Некорректный JSON: {str(e)}')
+
+        if not isinstance(row, dict):
+            raise ValidationError('Строка должна быть объектом')
+
+        if not row.get('sku'):
+            raise ValidationError({'sku': ['Обязательное поле.']})
+
+        currency = row.get('currency') or 1
+        currency_codes = {code: value for value, code in Item.CURRENCY_CHOICES}
+
+        item = Item(
+            sku=str(row['sku']).strip(),
+            name=row.get('name'),
+            description=row.get('description'),
+            price=row.get('price'),
+            currency=currency_codes.get(str(currency).lower(), currency),
+        )
+        item.full_clean(exclude=cls.EXCLUDED_FIELDS, validate_unique=False)
+        return item
+
+    @classmethod
+    def import_rows(
+            cls,
+            rows: Iterable[Tuple[int, Union[Dict, str]]],
+            batch_size: int = 1000,
+            on_error: Optional[Callable[[int, ValidationError], None]] = None,
+            on_batch: Optional[Callable[[Dict], None]] = None,
+    ) -> Dict:
+        """
+        Импортирует строки пакетами по batch_size товаров.
+
+        Некорректные строки пропускаются и передаются в on_error. Если артикул встречается
+        в пакете несколько раз, сохраняется последняя строка.
+
+        Parameters:
+            - rows (Iterable[Tuple[int, Union[Dict, str]]]): Строки из read_rows.
+            - batch_size (int): Количество товаров в одном INSERT.
+            - on_error (Optional[Callable]): Вызывается с номером строки и ошибкой.
+            - on_batch (Optional[Callable]): Вызывается со статистикой после каждого пакета.
+
+        Returns:
+            Dict: Статистика: rows (прочитано строк), imported (сохранено товаров), errors (пропущено строк).
+
+        """
+        stats = {'rows': 0, 'imported': 0, 'errors': 0}
+        batch: Dict[str, Item] = {}
+
+        for line_number, row in rows:
+            stats['rows'] += 1
+
+            try:
+                item = cls.build_item(row)
+            except ValidationError as e:
+                stats['errors'] += 1
+
+                if on_error:
+                    on_error(line_number, e)
+
+                continue
+
+            batch[item.sku] = item
+
+            if len(batch) >= batch_size:
+                stats['imported'] += len(cls.save_batch(list(batch.values())))
+                batch = {}
+
+                if on_batch:
+                    on_batch(stats)
+
+        if batch:
+            stats['imported'] += len(cls.save_batch(list(batch.values())))
+
+            if on_batch:
+                on_batch(stats)
+
+        return stats
+
+    @classmethod
+    def save_batch(cls, items: List[Item]) -> List[int]:
+        """
+        Сохраняет пакет товаров одним INSERT ... ON CONFLICT. Стоимость существующих заказов не меняется:
+        цены в них зафиксированы при создании.
+
+        Сигналы post_save при bulk_create не отправляются, поэтому кэш страниц товаров
+        и версия каталога сбрасываются здесь.
+
+        Parameters:
+            - items (List[Item]): Товары с уникальными артикулами.
+
+        Returns:
+            List[int]: Идентификаторы сохранённых товаров.
+
+        """
+        try:
+            with transaction.atomic():
+                items = Item.objects.bulk_create(
+                    items,
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=cls.UPDATE_FIELDS,
+                )
+                pks = [item.pk for item in items]
+
+            ItemPageCache.invalidate_many(pks)
+            ItemCatalogVersion.bump()
+            return pks
+        except Exception as e:
+            logger.error(f"An error occurred in ItemImportService: {str(e)}")
+            raise
+
+
+class OrderExportService:
+    """
+    Сервис потоковой выгрузки заказов с позициями в CSV или JSONL.
+
+    Заказы читаются одним запросом с присоединёнными позициями, товарами, скидками и налогами
+    через серверный курсор (QuerySet.iterator), строки кодируются и отдаются порциями, поэтому
+    расход памяти не зависит от объёма выгрузки, а первые байты доступны до чтения всех строк.
+    Одна строка выгрузки соответствует одной позиции заказа; заказ без позиций выгружается одной строкой
+    с пустыми полями позиции.
+
+    Methods:
+        - filter_orders(params: Dict) -> QuerySet:
+            Возвращает заказы, отобранные фильтрами OrderFilter.
+        - iter_rows(orders: QuerySet, chunk_size: int) -> Iterator[Tuple]:
+            Читает строки выгрузки.
+        - stream(rows: Iterable[Tuple], file_format: str, compress: bool) -> Iterator[bytes]:
+            Кодирует строки в CSV или JSONL, при необходимости сжимая их gzip.
+        - astream(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+            Отдаёт порции синхронного потока асинхронно (для запуска через ASGI).
+
+    """
+    FORMATS = ('csv', 'jsonl')
+    COLUMNS = [
+        'order_id', 'user_id', 'status', 'created_at', 'paid_at', 'discount_percent', 'tax_rate', 'order_total',
+        'line_id', 'item_id', 'sku', 'item_name', 'quantity', 'unit_price', 'currency',
+    ]
+    FIELDS = [
+        'id', 'user_id', 'status', 'created_at', 'paid_at', 'discount__amount', 'tax__rate', 'total',
+        'order_item__id', 'order_item__item_id', 'order_item__item__sku', 'order_item__item__name',
+        'order_item__quantity', 'order_item__unit_price', 'order_item__currency',
+    ]
+    ROWS_PER_CHUNK = 1000
+
+    @classmethod
+    def filter_orders(cls, params: Dict) -> QuerySet:
+        """
+        Отбирает заказы фильтрами списка заказов (status, user, created_after, created_before,
+        paid_after, paid_before).
+
+        Parameters:
+            - params (Dict): Значения фильтров.
+
+        Returns:
+            QuerySet: Отобранные заказы.
+
+        Raises:
+            - ValidationError: Если значения фильтров некорректны.
+
+        """
+        order_filter = OrderFilter(params, queryset=Order.objects.all())
+
+        if not order_filter.is_valid():
+            raise ValidationError(order_filter.errors)
+
+        return order_filter.qs
+
+    @classmethod
+    def iter_rows(cls, orders: QuerySet, chunk_size: int = 2000) -> Iterator[Tuple]:
+        """
+        Читает строки выгрузки через серверный курсор в порядке номеров заказов и позиций.
+
+        Parameters:
+            - orders (QuerySet): Заказы.
+            - chunk_size (int): Количество строк, получаемых из БД за одно обращение.
+
+        Returns:
+            Iterator[Tuple]: Значения в порядке COLUMNS (статус и валюта - кодами, даты - в ISO 8601).
+
+        """
+        statuses = dict(Order.STATUS_CHOICES)
+        currencies = dict(Item.CURRENCY_CHOICES)
+        rows = orders.order_by('id', 'order_item__id').values_list(*cls.FIELDS).iterator(chunk_size=chunk_size)
+
+        # Вне транзакции серверный курсор объявляется WITH HOLD, и PostgreSQL материализует весь результат
+        # до выдачи первой строки; внутри транзакции строки читаются по мере выгрузки
+        with transaction.atomic():
+            for order_id, user_id, status, created_at, paid_at, *values, currency in rows:
+                yield (
+                    order_id, user_id, statuses.get(status, status), created_at.isoformat(),
+                    paid_at.isoformat() if paid_at else None, *values, currencies.get(currency, currency),
+                )
+
+    @classmethod
+    def stream(cls, rows: Iterable[Tuple], file_format: str, compress: bool = False) -> Iterator[bytes]:
+        """
+        Кодирует строки выгрузки порциями по ROWS_PER_CHUNK строк.
+
+        Parameters:
+            - rows (Iterable[Tuple]): Строки выгрузки (см. iter_rows).
+            - file_format (str): "csv" (с заголовком) или "jsonl".
+            - compress (bool): Сжимать ли вывод gzip. Каждая порция сбрасывается из компрессора
+              (Z_SYNC_FLUSH), чтобы получатель не ждал заполнения его буфера.
+
+        Returns:
+            Iterator[bytes]: Порции файла.
+
+        """
+        compressor = zlib.compressobj(wbits=31) if compress else None
+
+        def encode(text: str) -> bytes:
+            data = text.encode()
+            return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else data
+
+        for text in cls.encode_rows(rows, file_format):
+            yield encode(text)
+
+        if compressor:
+            yield compressor.flush()
+
+    @classmethod
+    async def astream(cls, chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Асинхронно отдаёт порции из stream(). Под ASGI Django целиком буферизует синхронный итератор
+        StreamingHttpResponse, поэтому каждая порция читается отдельным вызовом sync_to_async. Вызовы
+        выполняются в одном потоке (thread_sensitive) с представлением: серверный курсор остаётся
+        на том же соединении с БД.
+
+        Parameters:
+            - chunks (Iterator[bytes]): Порции файла (см. stream).
+
+        Returns:
+            AsyncIterator[bytes]: Те же порции.
+
+        """
+        next_chunk = sync_to_async(next, thread_sensitive=True)
+
+        try:
+            while True:
+                chunk = await next_chunk(chunks, None)
+
+                if chunk is None:
+                    return
+
+                yield chunk
+        finally:
+            # Закрывает серверный курсор, если клиент отключился до конца выгрузки
+            close = getattr(chunks, 'close', None)
+
+            if close:
+                await sync_to_async(close, thread_sensitive=True)()
+
+    @classmethod
+    def encode_rows(cls, rows: Iterable[Tuple], file_format: str) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if file_format == 'csv' else None
+
+        if writer:
+            writer.writerow(cls.COLUMNS)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        pending = 0
+
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(cls.COLUMNS, row)), ensure_ascii=False, default=str))
+                buffer.write('\n')
+
+            pending += 1
+
+            if pending == cls.ROWS_PER_CHUNK:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        if pending:
+            yield buffer.getvalue()
+
+
+class StripeCatalogSyncService:
+    """
+    Сервис инкрементальной синхронизации товаров со Stripe.
+
+    Товары перебираются пакетами по возрастанию идентификатора. В Stripe отправляются только товары,
+    у которых изменились название, описание, цена или валюта (см. StripePriceCatalogService.needs_sync).
+    Запросы выполняются в пуле из workers потоков, частота запросов ограничивается отдельно для каждого
+    аккаунта Stripe, ответы 429 повторяются с экспоненциальной задержкой. Товар без валюты или с валютой
+    без ключа Stripe и товар, который не удалось синхронизировать, пропускаются и учитываются в failed.
+    После каждого пакета в файл checkpoint_path записывается идентификатор, до которого все товары
+    обработаны успешно (не дальше первой ошибки), и прерванная синхронизация продолжается с него.
+    После полного прохода файл удаляется: не синхронизированные товары будут повторены следующим запуском.
+
+    Methods:
+        - run(restart: bool, on_progress: Callable) -> Dict:
+            Синхронизирует каталог.
+        - sync_one(item: Item) -> None:
+            Синхронизирует один товар с повторами при 429.
+
+    """
+
+    def __init__(
+            self,
+            workers: int = 8,
+            rate: float = 20.0,
+            max_retries: int = 5,
+            backoff: float = 0.5,
+            chunk_size: int = 200,
+            checkpoint_path: Optional[Path] = None,
+    ):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.secret_keys = {1: STRIPE_SECRET_KEY_CURRENCY_1, 2: STRIPE_SECRET_KEY_CURRENCY_2}
+        self.rate_limiters = {key: RateLimiter(rate, burst=max(1, int(rate))) for key in self.secret_keys.values()}
+
+    def run(self, restart: bool = False, on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Синхронизирует каталог, продолжая с сохранённой контрольной точки.
+
+        Parameters:
+            - restart (bool): Игнорировать контрольную точку и начать с начала.
+            - on_progress (Optional[Callable]): Вызывается со статистикой после каждого пакета.
+
+        Returns:
+            Dict: Статистика: scanned, synced, skipped (не изменились), failed.
+
+        """
+        stats = {'scanned': 0, 'synced': 0, 'skipped': 0, 'failed': 0}
+        last_pk = 0 if restart else self.load_checkpoint()
+        first_failed_pk = None
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stripe-sync') as pool:
+            while True:
+                items = list(Item.objects.filter(pk__gt=last_pk).order_by('pk')[:self.chunk_size])
+
+                if not items:
+                    break
+
+                pending = [item for item in items if StripePriceCatalogService.needs_sync(item)]
+                synced = []
+
+                for item, error in zip(pending, pool.map(self.sync_one, pending)):
+                    if error is None:
+                        synced.append(item)
+                    else:
+                        logger.error(f"An error occurred in StripeCatalogSyncService: item {item.pk}: {str(error)}")
+                        stats['failed'] += 1
+                        first_failed_pk = first_failed_pk or item.pk
+
+                if synced:
+                    Item.objects.bulk_update(synced, StripePriceCatalogService.SYNC_FIELDS)
+                    ItemCatalogVersion.bump()
+
+                last_pk = items[-1].pk
+                # Продолжение после прерывания должно повторить товары с ошибками
+                self.save_checkpoint(last_pk if first_failed_pk is None else first_failed_pk - 1)
+
+                stats['scanned'] += len(items)
+                stats['synced'] += len(synced)
+                stats['skipped'] += len(items) - len(pending)
+
+                if on_progress:
+                    on_progress(stats)
+
+        self.clear_checkpoint()
+        return stats
+
+    def sync_one(self, item: Item) -> Optional[Exception]:
+        """
+        Синхронизирует товар, повторяя запросы после ответа 429 с экспоненциальной задержкой
+        (или через Retry-After) и после отказа разомкнутого предохранителя.
+
+        Parameters:
+            - item (Item): Объект товара.
+
+        Returns:
+            Optional[Exception]: None при успехе или ошибка, после которой товар пропущен.
+
+        """
+        stripe_secret_key = self.secret_keys.get(item.currency)
+
+        if not stripe_secret_key:
+            return ValueError(f"No Stripe secret key for currency {item.currency}")
+
+        rate_limiter = self.rate_limiters[stripe_secret_key]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                StripePriceCatalogService.sync_item(item, stripe_secret_key, save=False, throttle=rate_limiter.acquire)
+                return None
+            except (stripe.RateLimitError, CircuitOpenError) as e:
+                if attempt == self.max_retries:
+                    return e
+
+                if isinstance(e, CircuitOpenError):
+                    retry_after = e.retry_after
+                else:
+                    retry_after = (e.headers or {}).get('Retry-After')
+
+                delay = float(retry_after) if retry_after else self.backoff * 2 ** attempt
+                time.sleep(delay + random.uniform(0, self.backoff))
+            except Exception as e:
+                return e
+
+    def load_checkpoint(self) -> int:
+        """
+        Возвращает идентификатор последнего обработанного товара из файла контрольной точки.
+        """
+        if self.checkpoint_path and self.checkpoint_path.exists():
+            return json.loads(self.checkpoint_path.read_text())['last_pk']
+
+        return 0
+
+    def save_checkpoint(self, last_pk: int) -> None:
+        if not self.checkpoint_path:
+            return
+
+        tmp_path = self.checkpoint_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'last_pk': last_pk}))
+        tmp_path.replace(self.checkpoint_path)
+
+    def clear_checkpoint(self) -> None:
+        if self.checkpoint_path:
+            self.checkpoint_path.unlink(missing_ok=True)
+
+
+class CheckoutJobQueue:
+    """
+    Очередь заданий на создание сессий оплаты в PostgreSQL.
+
+    Эндпоинты оплаты ставят задание и сразу отвечают его идентификатором, не дожидаясь Stripe.
+    Обработчики (manage.py process_checkout_jobs) забирают задания через SELECT ... FOR UPDATE SKIP LOCKED,
+    поэтому могут работать в нескольких процессах. Неудачная попытка повторяется с экспоненциальной
+    задержкой до CHECKOUT_JOB_MAX_ATTEMPTS раз, задание упавшего обработчика снова становится доступным
+    через CHECKOUT_JOB_TIMEOUT секунд.
+
+    Methods:
+        - enqueue(request: HttpRequest, kind: str, object_id: int) -> CheckoutJob:
+            Ставит задание в очередь.
+        - aenqueue(request: HttpRequest, kind: str, object_id: int) -> CheckoutJob:
+            Асинхронная версия enqueue.
+        - claim(batch_size: int) -> List[CheckoutJob]:
+            Забирает доступные задания.
+        - process(job: CheckoutJob) -> bool:
+            Создает сессию оплаты для задания.
+        - purge(older_than: timedelta) -> int:
+            Удаляет завершённые задания.
+
+    """
+
+    @classmethod
+    def enqueue(cls, request: HttpRequest, kind: str, object_id: int) -> CheckoutJob:
+        """
+        Ставит задание в очередь.
+
+        Parameters:
+            - request (HttpRequest): Объект, представляющий входящий HTTP-запрос (для ссылок success и cancel).
+            - kind (str): CheckoutJob.KIND_ITEM или CheckoutJob.KIND_ORDER.
+            - object_id (int): Идентификатор товара или заказа.
+
+        Returns:
+            CheckoutJob: Созданное задание.
+
+        """
+        return CheckoutJob.objects.create(kind=kind, object_id=object_id, base_url=request.build_absolute_uri('/'))
+
+    @classmethod
+    async def aenqueue(cls, request: HttpRequest, kind: str, object_id: int) -> CheckoutJob:
+        """
+        Асинхронная версия enqueue (для асинхронных представлений).
+        """
+        return await CheckoutJob.objects.acreate(
+            kind=kind, object_id=object_id, base_url=request.build_absolute_uri('/')
+        )
+
+    @classmethod
+    def claim(cls, batch_size: int = 1) -> List[CheckoutJob]:
+        """
+        Забирает доступные задания и переводит их в статус running.
+
+        Parameters:
+            - batch_size (int): Максимальное количество заданий.
+
+        Returns:
+            List[CheckoutJob]: Забранные задания.
+
+        """
+        now = timezone.now()
+
+        with transaction.atomic():
+            jobs = list(
+                CheckoutJob.objects
+                .filter(
+                    Q(status=CheckoutJob.STATUS_PENDING, available_at__lte=now)
+                    | Q(
+                        status=CheckoutJob.STATUS_RUNNING,
+                        started_at__lt=now - timedelta(seconds=settings.CHECKOUT_JOB_TIMEOUT),
+                    )
+                )
+                .order_by('available_at')
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+
+            if jobs:
+                CheckoutJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                    status=CheckoutJob.STATUS_RUNNING, started_at=now, attempts=F('attempts') + 1
+                )
+
+        for job in jobs:
+            job.status = CheckoutJob.STATUS_RUNNING
+            job.started_at = now
+            job.attempts += 1
+
+        return jobs
+
+    @classmethod
+    def process(cls, job: CheckoutJob) -> bool:
+        """
+        Создает сессию оплаты для задания и сохраняет результат.
+
+        Результат сохраняется, только если задание не было забрано повторно другим обработчиком.
+
+        Parameters:
+            - job (CheckoutJob): Задание, полученное из claim.
+
+        Returns:
+            bool: True, если сессия создана.
+
+        """
+        claimed = CheckoutJob.objects.filter(pk=job.pk, started_at=job.started_at)
+        now = timezone.now()
+
+        try:
+            session_id = cls.create_session(job)
+        except Exception as e:
+            logger.error(f"An error occurred in CheckoutJobQueue: {str(e)}")
+
+            if isinstance(e, CircuitOpenError):
+                # Запрос к Stripe не выполнялся, попытка не засчитывается
+                claimed.update(
+                    status=CheckoutJob.STATUS_PENDING,
+                    error=str(e),
+                    attempts=F('attempts') - 1,
+                    available_at=now + timedelta(seconds=e.retry_after),
+                )
+            elif isinstance(e, (Item.DoesNotExist, Order.DoesNotExist)) or job.attempts >= settings.CHECKOUT_JOB_MAX_ATTEMPTS:
+                claimed.update(status=CheckoutJob.STATUS_FAILED, error=str(e), finished_at=now)
+            else:
+                claimed.update(
+                    status=CheckoutJob.STATUS_PENDING,
+                    error=str(e),
+                    available_at=now + timedelta(seconds=2 ** job.attempts),
+                )
+
+            return False
+
+        claimed.update(status=CheckoutJob.STATUS_DONE, session_id=session_id, error="", finished_at=now)
+        return True
+
+    @classmethod
+    def create_session(cls, job: CheckoutJob) -> str:
+        """
+        Создает сессию оплаты так же, как синхронные эндпоинты /buy и /buy_all.
+        Повторные попытки одного задания переиспользуют одну сессию.
+        """
+        request = AbsoluteUrlBuilder(job.base_url)
+
+        if job.kind == CheckoutJob.KIND_ITEM:
+            item = Item.objects.get(pk=job.object_id)
+            payment_data, stripe_secret_key = ItemPaymentDataService.generate_payment_data(
+                request, item, item.get_currency_display()
+            )
+            return PaymentSessionCreator.create_session(stripe_secret_key, payment_data, reuse_key=f"job-{job.pk}")
+
+        order = OrderLoader.load(job.object_id)
+        payment_data = OrderPaymentDataService.generate_payment_data(request, order)
+        return PaymentSessionCreator.create_session(STRIPE_SECRET_KEY, payment_data, reuse_key=f"job-{job.pk}")
+
+    @classmethod
+    def purge(cls, older_than: timedelta) -> int:
+        """
+        Удаляет выполненные и неудавшиеся задания, завершённые раньше older_than назад.
+
+        Returns:
+            int: Количество удалённых заданий.
+
+        """
+        return CheckoutJob.objects.filter(
+            status__in=[CheckoutJob.STATUS_DONE, CheckoutJob.STATUS_FAILED],
+            finished_at__lt=timezone.now() - older_than,
+        ).delete()[0]
+
+
+class AbsoluteUrlBuilder:
+    """
+    Замена HttpRequest для построения абсолютных ссылок вне запроса (в обработчике очереди).
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
 
+    def build_absolute_uri(self, location: str) -> str:
+        return urljoin(self.base_url, location)
@@ -0,0 +1,70 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Discount, Item, Order, OrderItem, Tax
+from .service import ItemCatalogVersion, ItemPageCache
+
+
+@receiver(post_save, sender=Order)
+def update_order_total_on_save(sender, instance: Order, **kwargs) -> None:
+    """
+    Пересчитывает стоимость заказа после его сохранения (могли измениться скидка или налог).
+    """
+    Order.objects.filter(pk=instance.pk).update_totals()
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_total_on_order_item_change(sender, instance: OrderItem, **kwargs) -> None:
+    """
+    Пересчитывает стоимость заказа при добавлении, изменении или удалении товара в заказе.
+    """
+    Order.objects.filter(pk=instance.order_id).update_totals()
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_item_page(sender, instance: Item, **kwargs) -> None:
+    """
+    Сбрасывает закэшированную страницу товара и версию каталога после изменения или удаления товара.
+    """
+    ItemPageCache.invalidate(instance.pk)
+    ItemCatalogVersion.bump()
+
+
+@receiver(post_save, sender=Discount)
+def update_order_totals_on_discount_change(sender, instance: Discount, **kwargs) -> None:
+    """
+    Пересчитывает стоимость заказов со скидкой после её изменения.
+    """
+    Order.objects.filter(discount=instance).update_totals()
+
+
+@receiver(post_save, sender=Tax)
+def update_order_totals_on_tax_change(sender, instance: Tax, **kwargs) -> None:
+    """
+    Пересчитывает стоимость заказов с налогом после его изменения.
+    """
+    Order.objects.filter(tax=instance).update_totals()
+
+
+@receiver(pre_delete, sender=Discount)
+@receiver(pre_delete, sender=Tax)
+def remember_affected_orders(sender, instance, **kwargs) -> None:
+    """
+    Запоминает заказы, у которых после удаления скидки или налога поле станет NULL.
+    """
+    field_name = 'discount' if sender is Discount else 'tax'
+    instance._affected_order_ids = list(Order.objects.filter(**{field_name: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Discount)
+@receiver(post_delete, sender=Tax)
+def update_order_totals_on_delete(sender, instance, **kwargs) -> None:
+    """
+    Пересчитывает стоимость заказов, потерявших скидку или налог.
+    """
+    affected_order_ids = getattr(instance, '_affected_order_ids', [])
+
+    if affected_order_ids:
+        Order.objects.filter(pk__in=affected_order_ids).update_totals()
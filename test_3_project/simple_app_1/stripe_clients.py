@@ -0,0 +1,492 @@
+import asyncio
+import hashlib
+import math
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import measure
+
+
+class CircuitOpenError(stripe.APIConnectionError):
+    """
+    Обращение к Stripe отклонено без запроса: предохранитель аккаунта разомкнут.
+
+    Attributes:
+        - retry_after (int): Через сколько секунд имеет смысл повторить запрос.
+
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'Stripe временно недоступен, повторите через {retry_after} с', should_retry=False)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Предохранитель обращений к одному аккаунту Stripe.
+
+    После failure_threshold ошибок подряд (таймаут, ошибка соединения, ответ 5xx) размыкается,
+    и следующие reset_timeout секунд запросы отклоняются сразу (CircuitOpenError). Затем пропускает
+    один пробный запрос: при успехе замыкается, при ошибке снова размыкается.
+
+    Attributes:
+        - failure_threshold (int): Количество ошибок подряд, после которого предохранитель размыкается.
+        - reset_timeout (float): Время в секундах до пробного запроса.
+        - state (int): Текущее состояние (STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN).
+        - rejections (int): Количество отклонённых запросов.
+
+    """
+    STATE_CLOSED = 0
+    STATE_OPEN = 1
+    STATE_HALF_OPEN = 2
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.STATE_CLOSED
+        self.rejections = 0
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """
+        Проверяет, можно ли выполнить запрос. Вызывает CircuitOpenError, если нельзя.
+        """
+        with self._lock:
+            if self.state == self.STATE_CLOSED:
+                return
+
+            remaining = self._opened_at + self.reset_timeout - self._clock()
+
+            if self.state == self.STATE_OPEN and remaining <= 0:
+                self.state = self.STATE_HALF_OPEN
+
+            if self.state == self.STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+            self.rejections += 1
+
+        raise CircuitOpenError(retry_after=max(1, math.ceil(remaining)))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.STATE_CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        Снимает отметку пробного запроса, прерванного не по вине Stripe (отмена запроса, ошибка в приложении),
+        чтобы следующий запрос стал новым пробным. Состояние предохранителя не меняется.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+
+            if self.state == self.STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.STATE_OPEN
+                self._opened_at = self._clock()
+
+            self._probe_in_flight = False
+
+    def record_response(self, status_code: int) -> None:
+        """
+        Учитывает ответ Stripe: 5xx считается ошибкой, остальные ответы - успехом.
+        """
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+
+class RetryBudget:
+    """
+    Общий для процесса бюджет повторных запросов к Stripe.
+
+    Каждый исходный запрос пополняет бюджет на ratio, каждый повтор расходует единицу. Кроме того,
+    бюджет пополняется на min_per_second в секунду, чтобы при малом трафике повторы оставались возможны.
+    Когда Stripe деградирует, повторы не умножают нагрузку больше чем на (1 + ratio).
+
+    Attributes:
+        - ratio (float): Доля повторов от числа исходных запросов.
+        - min_per_second (float): Гарантированное количество повторов в секунду.
+        - capacity (float): Максимальный запас повторов.
+        - retries (int): Количество разрешённых повторов.
+        - rejected (int): Количество повторов, отклонённых из-за исчерпания бюджета.
+
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, capacity: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self.retries = 0
+        self.rejected = 0
+        self._balance = min(capacity, min_per_second)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def balance(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._balance
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill()
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """
+        Расходует единицу бюджета на повтор. Возвращает False, если бюджет исчерпан.
+        """
+        with self._lock:
+            self._refill()
+
+            if self._balance < 1:
+                self.rejected += 1
+                return False
+
+            self._balance -= 1
+            self.retries += 1
+            return True
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._balance = min(self.capacity, self._balance + (now - self._updated_at) * self.min_per_second)
+        self._updated_at = now
+
+
+class InstrumentedRequestsClient(stripe.RequestsClient):
+    """
+    HTTP-клиент Stripe, замеряющий длительность каждого обращения к API (метрика stripe).
+
+    Если переданы предохранитель и бюджет повторов, запросы при разомкнутом предохранителе отклоняются
+    сразу, а повторы после таймаутов и ответов 5xx выполняются (с задержкой и разбросом), только пока
+    предохранитель замкнут и бюджет не исчерпан. Асинхронные запросы проходят через те же проверки.
+    """
+
+    def __init__(
+            self, breaker: Optional[CircuitBreaker] = None, retry_budget: Optional[RetryBudget] = None, **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.breaker = breaker
+        self.retry_budget = retry_budget
+
+    def request_with_retries(self, *args, **kwargs):
+        if self.retry_budget is not None:
+            self.retry_budget.deposit()
+
+        return super().request_with_retries(*args, **kwargs)
+
+    async def request_with_retries_async(self, *args, **kwargs):
+        if self.retry_budget is not None:
+            self.retry_budget.deposit()
+
+        return await super().request_with_retries_async(*args, **kwargs)
+
+    def request(self, method, url, headers, post_data=None):
+        if self.breaker is not None:
+            self.breaker.before_call()
+
+        try:
+            with measure('stripe'):
+                response = super().request(method, url, headers, post_data)
+        except BaseException as e:
+            self._record_error(e)
+            raise
+
+        if self.breaker is not None:
+            self.breaker.record_response(response[1])
+
+        return response
+
+    async def request_async(self, method, url, headers, post_data=None):
+        if self.breaker is not None:
+            self.breaker.before_call()
+
+        try:
+            response = await super().request_async(method, url, headers, post_data)
+        except BaseException as e:
+            # В том числе asyncio.CancelledError, если клиент ASGI отключился во время запроса
+            self._record_error(e)
+            raise
+
+        if self.breaker is not None:
+            self.breaker.record_response(response[1])
+
+        return response
+
+    def _record_error(self, error: BaseException) -> None:
+        """
+        Учитывает исключение запроса: ошибка соединения считается ошибкой Stripe, любое другое исключение
+        только освобождает пробный запрос, иначе предохранитель остался бы разомкнутым навсегда.
+        """
+        if self.breaker is None:
+            return
+
+        if isinstance(error, stripe.APIConnectionError):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def _should_retry(self, response, api_connection_error, num_retries, max_network_retries):
+        if not super()._should_retry(response, api_connection_error, num_retries, max_network_retries):
+            return False
+
+        if self.breaker is not None and self.breaker.state == CircuitBreaker.STATE_OPEN:
+            return False
+
+        return self.retry_budget is None or self.retry_budget.withdraw()
+
+
+class InstrumentedHTTPXClient(stripe.HTTPXClient):
+    """
+    Асинхронный HTTP-клиент Stripe (httpx) с ограниченным пулом соединений, замеряющий длительность
+    каждого обращения к API (метрика stripe). Используется методами *_async клиента Stripe.
+
+    Соединения httpx.AsyncClient привязаны к циклу событий, в котором открыты, поэтому для каждого
+    цикла (например, каждого asyncio.run или потока async_to_sync) создаётся свой клиент с пулом
+    pool_size соединений. Клиент закрытого цикла удаляется из реестра вместе с циклом.
+    """
+
+    def __init__(self, timeout: httpx.Timeout, pool_size: int, **kwargs):
+        super().__init__(timeout=timeout, **kwargs)
+        self._pool_size = pool_size
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._async_clients_lock = threading.Lock()
+
+    @property
+    def _client_async(self) -> httpx.AsyncClient:
+        """
+        Клиент httpx текущего цикла событий, создаваемый при первом обращении из цикла.
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+
+            if client is None:
+                client = httpx.AsyncClient(
+                    verify=stripe.ca_bundle_path,
+                    limits=httpx.Limits(max_connections=self._pool_size, max_keepalive_connections=self._pool_size),
+                )
+                self._async_clients[loop] = client
+
+        return client
+
+    @_client_async.setter
+    def _client_async(self, client: httpx.AsyncClient) -> None:
+        # Общий клиент из stripe.HTTPXClient.__init__ не используется: клиенты создаются для каждого цикла
+        pass
+
+    async def close_async(self):
+        with self._async_clients_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+
+        if client is not None:
+            await client.aclose()
+
+    async def request_async(self, method, url, headers, post_data=None):
+        with measure('stripe'):
+            return await super().request_async(method, url, headers, post_data)
+
+
+class StripeClientRegistry:
+    """
+    Реестр долгоживущих клиентов Stripe.
+
+    Для каждого секретного ключа создается один StripeClient со своим пулом keep-alive соединений,
+    таймаутами и предохранителем. Клиенты не используют глобальный stripe.api_key, поэтому их можно безопасно
+    вызывать из нескольких потоков. Синхронные методы работают через requests, асинхронные (*_async) -
+    через httpx с отдельным пулом STRIPE_HTTP_ASYNC_POOL_SIZE соединений. Бюджет повторов общий для всех клиентов.
+
+    Methods:
+        - get_client(stripe_secret_key: str) -> stripe.StripeClient:
+            Возвращает клиент Stripe для секретного ключа.
+        - get_breaker(stripe_secret_key: str) -> CircuitBreaker:
+            Возвращает предохранитель аккаунта.
+        - reset() -> None:
+            Закрывает соединения и очищает реестр.
+
+    """
+    _clients: Dict[str, stripe.StripeClient] = {}
+    _sessions: Dict[str, requests.Session] = {}
+    _breakers: Dict[str, CircuitBreaker] = {}
+    _retry_budget: Optional[RetryBudget] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, stripe_secret_key: str) -> stripe.StripeClient:
+        """
+        Возвращает клиент Stripe для секретного ключа, создавая его при первом обращении.
+
+        Parameters:
+            - stripe_secret_key (str): Секретный ключ Stripe.
+
+        Returns:
+            stripe.StripeClient: Клиент Stripe.
+
+        """
+        client = cls._clients.get(stripe_secret_key)
+
+        if client is None:
+            with cls._lock:
+                client = cls._clients.get(stripe_secret_key)
+
+                if client is None:
+                    client = cls._create_client(stripe_secret_key)
+                    cls._clients[stripe_secret_key] = client
+
+        return client
+
+    @classmethod
+    def get_breaker(cls, stripe_secret_key: str) -> CircuitBreaker:
+        """
+        Возвращает предохранитель аккаунта Stripe, создавая клиент при первом обращении.
+        """
+        cls.get_client(stripe_secret_key)
+        return cls._breakers[stripe_secret_key]
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Закрывает соединения всех клиентов и очищает реестр.
+        """
+        with cls._lock:
+            for session in cls._sessions.values():
+                session.close()
+
+            cls._clients = {}
+            cls._sessions = {}
+            cls._breakers = {}
+            cls._retry_budget = None
+
+    @classmethod
+    def metrics(cls) -> List[str]:
+        """
+        Метрики предохранителей и бюджета повторов в текстовом формате Prometheus.
+
+        Аккаунт обозначается префиксом хэша секретного ключа.
+        """
+        with cls._lock:
+            breakers = dict(cls._breakers)
+            retry_budget = cls._retry_budget
+
+        accounts = [
+            (hashlib.sha256(key.encode()).hexdigest()[:8], breaker) for key, breaker in sorted(breakers.items())
+        ]
+        lines = ['# TYPE stripe_circuit_breaker_state gauge']
+        lines.extend(
+            f'stripe_circuit_breaker_state{{account="{account}"}} {breaker.state}' for account, breaker in accounts
+        )
+        lines.append('# TYPE stripe_circuit_breaker_rejections_total counter')
+        lines.extend(
+            f'stripe_circuit_breaker_rejections_total{{account="{account}"}} {breaker.rejections}'
+            for account, breaker in accounts
+        )
+
+        if retry_budget is not None:
+            lines.extend([
+                '# TYPE stripe_retry_budget_balance gauge',
+                f'stripe_retry_budget_balance {retry_budget.balance:.2f}',
+                '# TYPE stripe_retries_total counter',
+                f'stripe_retries_total {retry_budget.retries}',
+                '# TYPE stripe_retries_rejected_total counter',
+                f'stripe_retries_rejected_total {retry_budget.rejected}',
+            ])
+
+        return lines
+
+    @classmethod
+    def _create_client(cls, stripe_secret_key: str) -> stripe.StripeClient:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        cls._sessions[stripe_secret_key] = session
+
+        if cls._retry_budget is None:
+            cls._retry_budget = RetryBudget(
+                ratio=settings.STRIPE_RETRY_BUDGET_RATIO,
+                min_per_second=settings.STRIPE_RETRY_BUDGET_MIN_PER_SECOND,
+            )
+
+        breaker = CircuitBreaker(
+            failure_threshold=settings.STRIPE_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.STRIPE_BREAKER_RESET_TIMEOUT,
+        )
+        cls._breakers[stripe_secret_key] = breaker
+
+        http_client = InstrumentedRequestsClient(
+            breaker=breaker,
+            retry_budget=cls._retry_budget,
+            session=session,
+            timeout=(settings.STRIPE_HTTP_CONNECT_TIMEOUT, settings.STRIPE_HTTP_READ_TIMEOUT),
+            async_fallback_client=InstrumentedHTTPXClient(
+                timeout=httpx.Timeout(settings.STRIPE_HTTP_READ_TIMEOUT, connect=settings.STRIPE_HTTP_CONNECT_TIMEOUT),
+                pool_size=settings.STRIPE_HTTP_ASYNC_POOL_SIZE,
+            ),
+        )
+        base_addresses = {'api': settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else {}
+        return stripe.StripeClient(
+            stripe_secret_key,
+            http_client=http_client,
+            base_addresses=base_addresses,
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+        )
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов (token bucket), общий для нескольких потоков.
+
+    Attributes:
+        - rate (float): Допустимое количество запросов в секунду.
+        - burst (int): Количество запросов, которые можно выполнить подряд без ожидания.
+
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Ждёт, пока можно будет выполнить следующий запрос.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
@@ -0,0 +1,171 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    # Очередь по умолчанию (5) переполняется при одновременных подключениях, и клиент повторяет SYN через секунду
+    request_queue_size = 128
+
+
+class StripeStubServer:
+    """
+    Локальная замена Stripe API для тестов и нагрузочных замеров.
+
+    Поднимает HTTP-сервер в отдельном потоке и отвечает на создание Product, Price и Checkout Session
+    и обновление Product с настраиваемой задержкой. Повторные запросы с тем же Idempotency-Key получают
+    тот же ответ. Для проверки отказоустойчивости можно внедрять сбои: следующие rate_limited_requests
+    запросов получают ответ 429 (с заголовком Retry-After, если задан retry_after), следующие
+    failing_requests - ответ 500, следующие stalled_requests отвечают с задержкой stall секунд
+    (больше таймаута клиента).
+
+    Использование:
+        with StripeStubServer(latency=0.2) as stub:
+            # settings.STRIPE_API_BASE = stub.url
+
+    Attributes:
+        - latency (float): Задержка ответа в секундах.
+        - url (str): Адрес сервера, передаваемый в STRIPE_API_BASE.
+        - request_count (int): Количество обработанных запросов.
+        - requests (List[Tuple[str, Dict[str, str]]]): Путь и параметры каждого запроса.
+        - idempotency_keys (List[Optional[str]]): Заголовок Idempotency-Key каждого запроса.
+        - rate_limited_requests (int): Сколько следующих запросов отклонить с ответом 429.
+        - retry_after (Optional[int]): Значение заголовка Retry-After в ответе 429.
+        - failing_requests (int): Сколько следующих запросов завершить ответом 500.
+        - stalled_requests (int): Сколько следующих запросов задержать на stall секунд.
+        - stall (float): Задержка зависших запросов в секундах.
+
+    """
+    OBJECTS = {
+        '/v1/products': ('prod', 'product'),
+        '/v1/prices': ('price', 'price'),
+        '/v1/checkout/sessions': ('cs_test', 'checkout.session'),
+    }
+
+    def __init__(self, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.request_count = 0
+        self.requests: List[Tuple[str, Dict[str, str]]] = []
+        self.idempotency_keys: List[Optional[str]] = []
+        self.rate_limited_requests = 0
+        self.retry_after: Optional[int] = None
+        self.failing_requests = 0
+        self.stalled_requests = 0
+        self.stall = 5.0
+        self._ids = itertools.count(1)
+        self._idempotent_responses: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._server = _StubHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'StripeStubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StripeStubServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, path: str, params: Dict[str, str], idempotency_key: Optional[str]) -> Tuple[int, dict]:
+        """
+        Формирует ответ на запрос к API. Возвращает HTTP-статус и тело ответа.
+        """
+        with self._lock:
+            self.request_count += 1
+            self.requests.append((path, params))
+            self.idempotency_keys.append(idempotency_key)
+
+            if self.rate_limited_requests > 0:
+                self.rate_limited_requests -= 1
+                return 429, {'error': {'type': 'invalid_request_error', 'code': 'rate_limit', 'message': 'Too many requests'}}
+
+            if self.failing_requests > 0:
+                self.failing_requests -= 1
+                return 500, {'error': {'type': 'api_error', 'message': 'Internal server error'}}
+
+            stalled = self.stalled_requests > 0
+
+            if stalled:
+                self.stalled_requests -= 1
+
+        if stalled:
+            time.sleep(self.stall)
+
+        with self._lock:
+            if idempotency_key and idempotency_key in self._idempotent_responses:
+                return 200, self._idempotent_responses[idempotency_key]
+
+        collection, _, object_id = path.rpartition('/')
+
+        if path in self.OBJECTS:
+            prefix, object_name = self.OBJECTS[path]
+            object_id = f'{prefix}_stub_{next(self._ids)}'
+        elif collection in self.OBJECTS:
+            object_name = self.OBJECTS[collection][1]
+        else:
+            return 404, {'error': {'type': 'invalid_request_error', 'message': f'Unrecognized request URL: {path}'}}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = {'id': object_id, 'object': object_name, 'livemode': False}
+
+        if object_name == 'checkout.session':
+            body['url'] = f'{self.url}/pay/{body["id"]}'
+
+        with self._lock:
+            if idempotency_key:
+                body = self._idempotent_responses.setdefault(idempotency_key, body)
+
+        return 200, body
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                params = {
+                    key: values[-1]
+                    for key, values in parse_qs(self.rfile.read(length).decode()).items()
+                }
+                status, body = stub.handle(self.path, params, self.headers.get('Idempotency-Key'))
+                payload = json.dumps(body).encode()
+
+                try:
+                    self.send_response(status)
+
+                    if status == 429 and stub.retry_after is not None:
+                        self.send_header('Retry-After', str(stub.retry_after))
+
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except ConnectionError:
+                    # Клиент не дождался ответа зависшего запроса и закрыл соединение
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
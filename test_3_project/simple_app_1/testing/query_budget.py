@@ -0,0 +1,188 @@
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class EndpointBudget:
+    """
+    Бюджет запросов к БД для одного эндпоинта (имени URL из simple_app_1/urls.py).
+
+    Attributes:
+        - max_queries (int): Наибольшее допустимое число запросов за один вызов.
+        - method (str): HTTP-метод ("get" или "post").
+        - args (Optional[Callable[[Any], list]]): Аргументы reverse() по тестовым данным (объекту теста).
+        - data (Optional[Callable[[Any], Any]]): Тело запроса (JSON) или параметры GET по тестовым данным.
+        - headers (Optional[Callable[[Any, Any], dict]]): Дополнительные заголовки по тестовым данным и телу запроса.
+        - allow_full_scans (Tuple[str, ...]): Большие таблицы, полное чтение которых для эндпоинта ожидаемо
+          (например, выгрузка всех заказов).
+
+    """
+
+    def __init__(
+            self,
+            max_queries: int,
+            method: str = 'get',
+            args: Optional[Callable[[Any], list]] = None,
+            data: Optional[Callable[[Any], Any]] = None,
+            headers: Optional[Callable[[Any, Any], dict]] = None,
+            allow_full_scans: Iterable[str] = (),
+    ):
+        self.max_queries = max_queries
+        self.method = method
+        self.args = args
+        self.data = data
+        self.headers = headers
+        self.allow_full_scans = tuple(allow_full_scans)
+
+
+class QueryProfile:
+    """
+    Профиль запросов к БД при выполнении фрагмента кода.
+
+    Записывает все запросы (CaptureQueriesContext), а explain() получает для каждого уникального
+    SELECT (в том числе объявленного серверным курсором) план EXPLAIN (ANALYZE, BUFFERS).
+    full_scans() находит полное чтение больших таблиц: Seq Scan, а также Index Scan без условия
+    по индексу, если над ним нет Limit. Планы строятся с enable_seqscan = off: на небольших тестовых
+    данных PostgreSQL предпочитает полное чтение любой таблицы, а так оно остаётся в плане, только
+    если подходящего индекса нет. Перед EXPLAIN затронутые таблицы анализируются (ANALYZE), чтобы план
+    не зависел от работы autovacuum, а соединения ограничены вложенными циклами без материализации:
+    как и на больших таблицах, внутренняя таблица читается по индексу для каждой строки внешней.
+    Всё выполняется в транзакции, которая затем откатывается.
+
+    Использование:
+        with QueryProfile() as profile:
+            client.get(url)
+
+        profile.explain()
+        profile.full_scans(large_tables={'simple_app_1_order'})
+
+    Attributes:
+        - queries (List[Dict[str, str]]): Выполненные запросы (sql и time), как в connection.queries.
+        - plans (Dict[str, dict]): План каждого уникального SELECT (после explain()).
+
+    """
+    DECLARE_CURSOR = re.compile(r'^DECLARE\s.*?\sCURSOR\s(?:WITH(?:OUT)?\s+HOLD\s+)?FOR\s+(.*)$', re.DOTALL)
+    FULL_INDEX_SCANS = ('Index Scan', 'Index Only Scan')
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+        self.queries: List[Dict[str, str]] = []
+        self.plans: Dict[str, dict] = {}
+        self._context = CaptureQueriesContext(connections[using])
+
+    def __enter__(self) -> 'QueryProfile':
+        self._context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._context.__exit__(exc_type, exc_value, traceback)
+        self.queries = list(self._context.captured_queries)
+
+    def explain(self) -> Dict[str, dict]:
+        """
+        Получает планы уникальных SELECT. На других СУБД, кроме PostgreSQL, ничего не делает.
+
+        Returns:
+            Dict[str, dict]: SQL-запрос и корневой узел плана (FORMAT JSON).
+
+        """
+        connection = connections[self.using]
+
+        if connection.vendor != 'postgresql':
+            return self.plans
+
+        statements = dict.fromkeys(filter(None, (self.get_select(query['sql']) for query in self.queries)))
+
+        with transaction.atomic(using=self.using), connection.cursor() as cursor:
+            # Без свежей статистики план зависит от того, успел ли autovacuum проанализировать таблицы
+            tables = [
+                connection.ops.quote_name(table)
+                for table in connection.introspection.table_names(cursor)
+                if any(f'"{table}"' in sql for sql in statements)
+            ]
+
+            if tables:
+                cursor.execute(f'ANALYZE {", ".join(tables)}')
+
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_hashjoin = off')
+            cursor.execute('SET LOCAL enable_mergejoin = off')
+            cursor.execute('SET LOCAL enable_material = off')
+
+            for sql in statements:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+                self.plans[sql] = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+
+            transaction.set_rollback(True, using=self.using)
+
+        return self.plans
+
+    def full_scans(self, large_tables: Iterable[str]) -> List[Tuple[str, str]]:
+        """
+        Возвращает полные чтения больших таблиц в полученных планах.
+
+        Parameters:
+            - large_tables (Iterable[str]): Имена таблиц, которые в рабочей БД большие.
+
+        Returns:
+            List[Tuple[str, str]]: Таблица и SQL-запрос.
+
+        """
+        large_tables = set(large_tables)
+        return [
+            (node['Relation Name'], sql)
+            for sql, plan in self.plans.items()
+            for node, _, limited in self.walk(plan)
+            if node.get('Relation Name') in large_tables and (
+                node['Node Type'] == 'Seq Scan'
+                or node['Node Type'] in self.FULL_INDEX_SCANS and 'Index Cond' not in node and not limited
+            )
+        ]
+
+    @classmethod
+    def get_select(cls, sql: str) -> Optional[str]:
+        """
+        Возвращает SELECT из запроса (для DECLARE ... CURSOR FOR - объявленный запрос) или None.
+        """
+        sql = sql.strip()
+        match = cls.DECLARE_CURSOR.match(sql)
+
+        if match:
+            sql = match.group(1)
+
+        return sql if sql.upper().startswith(('SELECT', 'WITH')) else None
+
+    def report(self) -> str:
+        """
+        Текстовый отчет для сообщений об ошибках: запросы и их планы с числом строк и прочитанных блоков.
+        """
+        lines = [f'Запросов: {len(self.queries)}']
+
+        for index, query in enumerate(self.queries, start=1):
+            lines.append(f'{index}. {query["sql"]}')
+            plan = self.plans.get(self.get_select(query['sql']))
+
+            for node, depth, _ in self.walk(plan) if plan else ():
+                relation = f' on {node["Relation Name"]}' if 'Relation Name' in node else ''
+                index_name = f' using {node["Index Name"]}' if 'Index Name' in node else ''
+                lines.append(
+                    f'{"   " * (depth + 1)}-> {node["Node Type"]}{relation}{index_name} '
+                    f'(rows={node.get("Actual Rows")}, '
+                    f'buffers={node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0)})'
+                )
+
+        return '\n'.join(lines)
+
+    @classmethod
+    def walk(cls, node: dict, depth: int = 0, limited: bool = False) -> Iterable[Tuple[dict, int, bool]]:
+        """
+        Обходит узлы плана: узел, глубина и признак того, что выше есть Limit.
+        """
+        yield node, depth, limited
+
+        for child in node.get('Plans', ()):
+            yield from cls.walk(child, depth + 1, limited or node['Node Type'] == 'Limit')
@@ -1,3 +1,2003 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import stripe
+
+from .checks import check_shared_cache
+from .currency import CurrencyConverter, StaleRatesError, StaticRateProvider, build_converter, set_converter
+from .logs import QueueFileHandler, RequestIdFilter, request_id_var
+from .models import CheckoutJob, Item, Order, OrderItem, Discount, Tax, StripeEvent
+from .pagination import EstimatedCountPaginator
+from .pricing import PriceLine, PricingEngine
+from .testing.query_budget import EndpointBudget, QueryProfile
+from .service import (
+    CheckoutJobQueue, ItemCatalogVersion, ItemImportService, ItemPaymentDataService, OrderLoader, OrderPaymentDataService,
+    OrderCreationService, OrderExportService, OrderQuoteService, PaymentSessionCreator, StripeCatalogSyncService, StripeEventProcessor,
+    StripePriceCatalogService,
+)
+from .stripe_clients import (
+    CircuitBreaker, CircuitOpenError, InstrumentedRequestsClient, RetryBudget, StripeClientRegistry,
+)
+from .stripe_stub import StripeStubServer
+from .validators import OrderPayloadError, OrderPayloadValidator
+
+
+def create_order(lines: int) -> Order:
+    """
+    Создает заказ со скидкой, налогом и заданным числом позиций.
+    """
+    order = Order.objects.create(
+        discount=Discount.objects.create(name='Скидка', amount=10),
+        tax=Tax.objects.create(name='Налог', rate=20),
+    )
+    items = Item.objects.bulk_create([
+        Item(name=f'Товар {i}', description='Описание', price=100 + i) for i in range(lines)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, item=item, quantity=2, unit_price=item.price, currency=item.currency) for item in items
+    ])
+    Order.objects.filter(pk=order.pk).update_totals()
+    order.refresh_from_db()
+    return order
+
+
+class OrderLoaderTests(TestCase):
+    """
+    Количество запросов при загрузке заказа не зависит от числа позиций.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def test_payment_data_query_count_is_constant(self):
+        request = RequestFactory().get('/')
+
+        for lines in (1, 5, 25):
+            order_id = create_order(lines).pk
+
+            with self.subTest(lines=lines), self.assertNumQueries(2):
+                order = OrderLoader.load(order_id)
+                payment_data = OrderPaymentDataService.generate_payment_data(request, order)
+                order.total_price
+
+            self.assertEqual(len(payment_data['line_items']), lines)
+
+    def test_order_view_query_count_is_constant(self):
+        for lines in (1, 5, 25):
+            order_id = create_order(lines).pk
+
+            with self.subTest(lines=lines), self.assertNumQueries(2):
+                response = self.client.get(reverse('order', args=[order_id]))
+
+            self.assertEqual(response.status_code, 200)
+
+    def test_loaded_total_matches_stored_total(self):
+        order = create_order(3)
+        Order.objects.filter(pk=order.pk).update_totals()
+        order.refresh_from_db()
+
+        self.assertEqual(OrderLoader.load(order.pk).total_price, order.total)
+
+    def test_total_price_without_stored_total_is_computed_without_writes(self):
+        order = create_order(3)
+        expected = order.total
+        Order.objects.filter(pk=order.pk).update(total=None)
+        loaded = OrderLoader.load(order.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(loaded.total_price, expected)
+
+        self.assertEqual(len(queries), 0)
+        self.assertIsNone(Order.objects.get(pk=order.pk).total)
+
+    def test_missing_order_returns_404(self):
+        response = self.client.get(reverse('order', args=[0]))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderTotalTests(TestCase):
+    """
+    Сохранённая стоимость заказа пересчитывается при изменении скидки, налога и позиций.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def setUp(self):
+        # Позиции 2 x 100 и 2 x 101, скидка 10%, налог 20%: (402 - 40.20) * 1.2
+        self.order = create_order(2)
+
+    def assertTotal(self, total):
+        self.order.refresh_from_db(fields=['total'])
+        self.assertEqual(self.order.total, Decimal(total))
+
+    def test_initial_total(self):
+        self.assertTotal('434.16')
+
+    def test_discount_change(self):
+        discount = self.order.discount
+        discount.amount = 50
+        discount.save()
+        self.assertTotal('241.20')
+
+        discount.delete()
+        self.assertTotal('482.40')
+
+    def test_tax_change(self):
+        tax = self.order.tax
+        tax.rate = 0
+        tax.save()
+        self.assertTotal('361.80')
+
+        tax.delete()
+        self.assertTotal('361.80')
+        Tax.objects.create(name='Другой налог', rate=10)
+        self.assertTotal('361.80')
+
+    def test_order_item_change(self):
+        first, second = self.order.order_item.order_by('pk')
+        first.quantity = 1
+        first.save()
+        self.assertTotal('326.16')
+
+        second.delete()
+        self.assertTotal('108.00')
+
+        OrderItem.objects.create(order=self.order, item=second.item, quantity=1, unit_price=50, currency=1)
+        self.assertTotal('162.00')
+
+    def test_with_totals_matches_pricing_engine_in_one_query(self):
+        empty = Order.objects.create()
+
+        with self.assertNumQueries(1):
+            orders = {order.pk: order for order in Order.objects.with_totals().filter(pk__in=[self.order.pk, empty.pk])}
+
+        order = orders[self.order.pk]
+        self.assertEqual(
+            (order.subtotal, order.discount_amount, order.tax_amount, order.total_amount),
+            (Decimal('402.00'), Decimal('40.20'), Decimal('72.36'), Decimal('434.16')),
+        )
+        self.assertEqual(order.total_price, Decimal('434.16'))
+        self.assertEqual(orders[empty.pk].total_amount, Decimal('0.00'))
+
+    def test_with_totals_uses_stored_total_for_mixed_currencies(self):
+        item = Item.objects.create(name='RUB', description='-', price=1000, currency=2)
+        OrderItem.objects.create(order=self.order, item=item, quantity=1, unit_price=item.price, currency=item.currency)
+        Order.objects.filter(pk=self.order.pk).update(total=Decimal('999.99'))
+
+        order = Order.objects.with_totals().get(pk=self.order.pk)
+
+        self.assertEqual((order.subtotal, order.tax_amount, order.total_amount), (None, None, Decimal('999.99')))
+
+    def test_order_discount_change(self):
+        self.order.discount = Discount.objects.create(name='Без скидки', amount=0)
+        self.order.save()
+        self.assertTotal('482.40')
+
+    def test_backfill_recalculates_totals_from_price_snapshots(self):
+        migration = import_module('simple_app_1.migrations.0011_orderitem_unit_price_currency')
+        other = create_order(1)
+        Order.objects.update(total=None)
+        OrderItem.objects.filter(order=other).update(unit_price=0, currency=2)
+
+        migration.snapshot_prices(django_apps, None)
+        migration.recalculate_order_totals(django_apps, None)
+
+        self.assertTotal('434.16')
+        other.refresh_from_db()
+        self.assertEqual(other.order_item.get().unit_price, Decimal('100.00'))
+        self.assertEqual(other.total, Decimal('216.00'))
+        self.assertFalse(Order.objects.filter(total__isnull=True).exists())
+
+
+class StripeClientRegistryTests(SimpleTestCase):
+    """
+    Один долгоживущий клиент Stripe на каждый секретный ключ.
+    """
+
+    def tearDown(self):
+        StripeClientRegistry.reset()
+
+    def test_one_client_per_secret_key(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(StripeClientRegistry.get_client, ['sk_test_usd', 'sk_test_rub'] * 50))
+
+        self.assertEqual(len({id(client) for client in clients[0::2]}), 1)
+        self.assertEqual(len({id(client) for client in clients[1::2]}), 1)
+        self.assertIsNot(clients[0], clients[1])
+
+    def test_async_calls_from_separate_event_loops(self):
+        cache.clear()
+        stub = StripeStubServer().start()
+        self.addCleanup(stub.stop)
+        payment_data = {'line_items': [{'price': 'price_1', 'quantity': 1}], 'mode': 'payment'}
+
+        with override_settings(STRIPE_API_BASE=stub.url):
+            session_ids = [
+                asyncio.run(PaymentSessionCreator.acreate_session('sk_test_usd', payment_data, reuse_key=reuse_key))
+                for reuse_key in ('item-1', 'item-2')
+            ]
+
+        self.assertEqual(len(set(session_ids)), 2)
+        self.assertEqual(stub.request_count, 2)
+
+
+class PaymentSessionReuseTests(SimpleTestCase):
+    """
+    Повторные и одновременные запросы оплаты переиспользуют одну сессию Stripe.
+    """
+
+    payment_data = {'line_items': [{'price': 'price_1', 'quantity': 1}], 'mode': 'payment'}
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+        self.calls_lock = threading.Lock()
+
+    def fake_create(self, stripe_secret_key, payment_data, idempotency_key=None):
+        time.sleep(0.05)
+
+        with self.calls_lock:
+            self.calls.append((payment_data, idempotency_key))
+            return f'cs_test_{len(self.calls)}'
+
+    def test_concurrent_identical_requests_share_one_session(self):
+        with mock.patch.object(PaymentSessionCreator, '_create', side_effect=self.fake_create):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                session_ids = list(executor.map(
+                    lambda _: PaymentSessionCreator.create_session('sk_test', self.payment_data, reuse_key='item-1'),
+                    range(16),
+                ))
+
+        self.assertEqual(set(session_ids), {'cs_test_1'})
+        self.assertEqual(len(self.calls), 1)
+        payment_data, idempotency_key = self.calls[0]
+        self.assertIn('expires_at', payment_data)
+        self.assertTrue(idempotency_key.startswith('checkout-session:item-1:'))
+
+    def test_changed_payment_data_creates_new_session(self):
+        changed_data = {**self.payment_data, 'line_items': [{'price': 'price_2', 'quantity': 1}]}
+
+        with mock.patch.object(PaymentSessionCreator, '_create', side_effect=self.fake_create):
+            first = PaymentSessionCreator.create_session('sk_test', self.payment_data, reuse_key='item-1')
+            second = PaymentSessionCreator.create_session('sk_test', changed_data, reuse_key='item-1')
+            third = PaymentSessionCreator.create_session('sk_test', self.payment_data, reuse_key='item-1')
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(first, third)
+        self.assertEqual(len(self.calls), 2)
+
+
+class ItemPaymentViewTests(TestCase):
+    """
+    Оплата товара на локальной замене Stripe.
+    """
+
+    def setUp(self):
+        cache.clear()
+        StripeClientRegistry.reset()
+        self.stub = StripeStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(StripeClientRegistry.reset)
+
+    def test_price_is_created_once_and_session_is_reused(self):
+        item = Item.objects.create(name='Товар', description='Описание', price=10)
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            first = self.client.get(reverse('buy', args=[item.pk]), headers={'Idempotency-Key': 'buyer-1'})
+            second = self.client.get(reverse('buy', args=[item.pk]), headers={'Idempotency-Key': 'buyer-1'})
+
+        item.refresh_from_db()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertTrue(item.stripe_price_id.startswith('price_'))
+        self.assertEqual(item.stripe_price_fingerprint, item.get_stripe_price_fingerprint())
+        self.assertEqual(self.stub.request_count, 3)
+
+    def test_sessions_are_not_shared_between_buyers(self):
+        item = Item.objects.create(name='Товар', description='Описание', price=10)
+        url = reverse('buy', args=[item.pk])
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            first = self.client.get(url, headers={'Idempotency-Key': 'buyer-1'}).json()
+            other_buyer = self.client.get(url, headers={'Idempotency-Key': 'buyer-2'}).json()
+            anonymous = [self.client.get(url).json() for _ in range(2)]
+
+            session = SessionStore()
+            session.create()
+            self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+            by_session = [self.client.get(url).json() for _ in range(2)]
+
+        self.assertNotEqual(first, other_buyer)
+        self.assertNotEqual(anonymous[0], anonymous[1])
+        self.assertEqual(by_session[0], by_session[1])
+        self.assertEqual(len({response['session_id'] for response in [first, other_buyer, *anonymous, *by_session]}), 5)
+
+    def test_session_is_reused_only_for_pending_order(self):
+        get_user_model().objects.create(id=1, username='admin')
+        order = create_order(1)
+        url = reverse('buy_all', args=[order.pk])
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            pending = [self.client.get(url, headers={'Idempotency-Key': 'buyer-1'}).json() for _ in range(2)]
+            Order.objects.filter(pk=order.pk).update(status=Order.STATUS_FAILED)
+            failed = [self.client.get(url, headers={'Idempotency-Key': 'buyer-1'}).json() for _ in range(2)]
+
+        self.assertEqual(pending[0], pending[1])
+        self.assertEqual(len({response['session_id'] for response in [pending[0], *failed]}), 3)
+
+    @override_settings(STRIPE_WEBHOOK_SECRETS=['whsec_usd'])
+    def test_webhook_forgets_completed_and_expired_sessions(self):
+        item = Item.objects.create(name='Товар', description='Описание', price=10)
+
+        def buy():
+            return self.client.get(reverse('buy', args=[item.pk]), headers={'Idempotency-Key': 'buyer-1'}).json()
+
+        for event_type in ('checkout.session.completed', 'checkout.session.expired'):
+            with self.subTest(event_type=event_type), override_settings(STRIPE_API_BASE=self.stub.url):
+                session_id = buy()['session_id']
+                self.assertEqual(buy()['session_id'], session_id)
+
+                payload = json.dumps({'id': f'evt_{event_type}', 'type': event_type, 'data': {'object': {'id': session_id}}})
+                response = self.client.post(
+                    reverse('stripe_webhook'), payload, content_type='application/json',
+                    **signed_webhook_headers(self, payload),
+                )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(buy()['session_id'], session_id)
+
+
+class StripePriceCatalogTests(TestCase):
+    """
+    Stripe Price создаётся один раз для отпечатка цены и пересоздаётся при изменении цены.
+    """
+
+    def setUp(self):
+        StripeClientRegistry.reset()
+        self.stub = StripeStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(StripeClientRegistry.reset)
+        settings_override = override_settings(STRIPE_API_BASE=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.item = Item.objects.create(name='Товар', description='Описание', price=10)
+
+    def price_requests(self):
+        return [
+            (params, key)
+            for (path, params), key in zip(self.stub.requests, self.stub.idempotency_keys)
+            if path == '/v1/prices'
+        ]
+
+    def test_price_is_created_once_per_fingerprint(self):
+        first = StripePriceCatalogService.get_price_id(self.item, 'sk_test_usd')
+        item = Item.objects.get(pk=self.item.pk)
+        second = StripePriceCatalogService.get_price_id(item, 'sk_test_usd')
+
+        self.assertEqual(first, second)
+        self.assertEqual(item.stripe_price_id, first)
+        self.assertEqual(self.stub.request_count, 2)
+
+    def test_price_is_recreated_when_price_changes(self):
+        first = StripePriceCatalogService.get_price_id(self.item, 'sk_test_usd')
+        Item.objects.filter(pk=self.item.pk).update(price=20)
+        item = Item.objects.get(pk=self.item.pk)
+
+        second = StripePriceCatalogService.get_price_id(item, 'sk_test_usd')
+
+        item.refresh_from_db()
+        self.assertNotEqual(first, second)
+        self.assertEqual(item.stripe_price_id, second)
+        self.assertEqual(item.stripe_price_fingerprint, item.get_stripe_price_fingerprint())
+        self.assertEqual([params['unit_amount'] for params, _ in self.price_requests()], ['1000', '2000'])
+
+    def test_price_idempotency_key_includes_product(self):
+        StripePriceCatalogService.get_price_id(self.item, 'sk_test_usd')
+        Item.objects.filter(pk=self.item.pk).update(currency=2)
+        item = Item.objects.get(pk=self.item.pk)
+
+        StripePriceCatalogService.get_price_id(item, 'sk_test_rub')
+
+        item.refresh_from_db()
+        (_, usd_key), (rub_params, rub_key) = self.price_requests()
+        self.assertEqual(rub_params['product'], item.stripe_product_id)
+        self.assertIn(item.stripe_product_id, rub_key)
+        self.assertNotEqual(usd_key, rub_key)
+
+
+class ItemViewCacheTests(TestCase):
+    """
+    Кэширование страницы товара и условные запросы.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.item = Item.objects.create(name='Товар', description='Описание', price=10)
+        self.url = reverse('item', args=[self.item.pk])
+
+    def test_cached_page_is_served_without_queries(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('Last-Modified', second)
+
+    def test_conditional_request_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_item_change_invalidates_page(self):
+        etag = self.client.get(self.url)['ETag']
+        self.item.price = 20
+        self.item.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '20')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deleted_item_returns_404(self):
+        self.client.get(self.url)
+        self.item.delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class QueueFileHandlerTests(SimpleTestCase):
+    """
+    Логи пишутся в файл фоновым потоком JSON-строками с идентификатором запроса.
+    """
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.log')
+        os.close(fd)
+        self.addCleanup(os.remove, self.filename)
+        self.logger = logging.getLogger('simple_app_1.tests.queue')
+        self.logger.propagate = False
+
+    def make_handler(self, **kwargs):
+        handler = QueueFileHandler(self.filename, **kwargs)
+        handler.addFilter(RequestIdFilter())
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def test_records_are_written_as_json_with_request_id(self):
+        handler = self.make_handler()
+
+        token = request_id_var.set('req-1')
+
+        try:
+            self.logger.error('Ошибка %s', 42)
+        finally:
+            request_id_var.reset(token)
+
+        handler.close()
+
+        with open(self.filename, encoding='utf-8') as f:
+            record = json.loads(f.readline())
+
+        self.assertEqual(record['message'], 'Ошибка 42')
+        self.assertEqual(record['level'], 'ERROR')
+        self.assertEqual(record['request_id'], 'req-1')
+
+    def test_full_queue_drops_records_without_blocking(self):
+        handler = self.make_handler(max_queue_size=1)
+        handler.listener.stop()
+
+        for i in range(5):
+            self.logger.error('record %s', i)
+
+        self.assertEqual(handler.dropped, 4)
+        handler.queue.get_nowait()
+        handler.close()
+
+    def test_response_carries_request_id(self):
+        response = self.client.get(reverse('success'), HTTP_X_REQUEST_ID='req-42')
+
+        self.assertEqual(response['X-Request-ID'], 'req-42')
+
+
+class MetricsMiddlewareTests(TestCase):
+    """
+    Server-Timing и гистограммы /metrics.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.item = Item.objects.create(name='Товар', description='Описание', price=10)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('item', args=[self.item.pk]))
+
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('template;dur=', response['Server-Timing'])
+
+    def test_stripe_latency_is_measured(self):
+        StripeClientRegistry.reset()
+        self.addCleanup(StripeClientRegistry.reset)
+
+        with StripeStubServer() as stub, override_settings(STRIPE_API_BASE=stub.url):
+            response = self.client.get(reverse('buy', args=[self.item.pk]))
+
+        self.assertIn('desc="Stripe x3"', response['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('item', args=[self.item.pk]))
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'request_duration_seconds_bucket{view="item",le="+Inf"}')
+        self.assertContains(response, 'request_db_queries_count{view="item"}')
+        self.assertContains(response, 'app_log_records_dropped_total')
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'], METRICS_TOKEN='secret')
+    def test_metrics_access(self):
+        url = reverse('metrics')
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer secret'}).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer '}).status_code, 403)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRETS=['whsec_usd', 'whsec_rub'])
+class StripeWebhookTests(TestCase):
+    """
+    Вебхук Stripe сохраняет события в inbox, обработчик применяет их к заказам пакетом.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def post_event(self, event_id, event_type, obj, secret='whsec_rub'):
+        payload = json.dumps({'id': event_id, 'type': event_type, 'data': {'object': obj}})
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('stripe_webhook'),
+            payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}',
+        )
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.post_event('evt_1', 'payment_intent.succeeded', {}, secret='whsec_other')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_duplicate_and_unhandled_events_are_not_stored(self):
+        obj = {'metadata': {'order_id': '1'}}
+
+        with self.assertNumQueries(1):
+            self.post_event('evt_1', 'payment_intent.succeeded', obj)
+
+        self.post_event('evt_1', 'payment_intent.succeeded', obj)
+        self.post_event('evt_2', 'customer.created', obj)
+
+        self.assertEqual(list(StripeEvent.objects.values_list('event_id', flat=True)), ['evt_1'])
+
+    def test_events_are_applied_in_batch(self):
+        paid, failed, paid_after_failure = Order.objects.bulk_create([Order(), Order(), Order()])
+        self.post_event('evt_1', 'checkout.session.completed', {
+            'client_reference_id': f'order-{paid.pk}', 'payment_status': 'paid',
+        })
+        self.post_event('evt_2', 'payment_intent.payment_failed', {'metadata': {'order_id': str(failed.pk)}})
+        self.post_event('evt_3', 'payment_intent.payment_failed', {'metadata': {'order_id': str(paid_after_failure.pk)}})
+        self.post_event('evt_4', 'payment_intent.succeeded', {'metadata': {'order_id': str(paid_after_failure.pk)}})
+        self.post_event('evt_5', 'payment_intent.payment_failed', {'metadata': {'order_id': str(paid.pk)}})
+
+        with self.assertNumQueries(6):
+            self.assertEqual(StripeEventProcessor.process_batch(), 5)
+
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[paid.pk], Order.STATUS_PAID)
+        self.assertEqual(statuses[failed.pk], Order.STATUS_FAILED)
+        self.assertEqual(statuses[paid_after_failure.pk], Order.STATUS_PAID)
+        self.assertEqual(StripeEventProcessor.process_batch(), 0)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """
+    Предупреждение о кэше в памяти процесса.
+    """
+
+    def test_warns_about_local_cache_without_debug(self):
+        with override_settings(DEBUG=False):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['simple_app_1.W001'])
+
+        shared_cache = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+
+        with override_settings(DEBUG=False, CACHES=shared_cache):
+            self.assertEqual(check_shared_cache(None), [])
+
+        with override_settings(DEBUG=True):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class OrderListViewTests(TestCase):
+    """
+    Список заказов: keyset-пагинация, фильтры и выбор полей.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create(id=1, username='admin', is_staff=True)
+        cls.orders = Order.objects.bulk_create([
+            Order(status=Order.STATUS_PAID if i % 2 else Order.STATUS_PENDING) for i in range(7)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_requires_admin(self):
+        self.client.logout()
+
+        self.assertEqual(self.client.get(reverse('order_list')).status_code, 403)
+
+    def test_cursor_pagination_walks_all_orders(self):
+        ids = []
+        url = reverse('order_list') + '?page_size=3'
+
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(order['id'] for order in data['results'])
+            url = data['next']
+
+        self.assertEqual(ids, sorted((order.pk for order in self.orders), reverse=True))
+
+    def test_filter_and_sparse_fields(self):
+        response = self.client.get(reverse('order_list'), {'status': Order.STATUS_PAID, 'fields': 'id,status'})
+
+        results = response.json()['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(set(results[0]), {'id', 'status'})
+
+
+class ItemCatalogViewTests(TestCase):
+    """
+    Каталог товаров: пагинация, выборка по идентификаторам и ETag версии каталога.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.items = Item.objects.bulk_create([
+            Item(name=f'Товар {i}', description='Описание', price=10 + i, currency=1 + i % 2) for i in range(5)
+        ])
+
+    def test_bulk_fetch_by_ids(self):
+        ids = [self.items[0].pk, self.items[3].pk]
+
+        response = self.client.get(reverse('item_catalog'), {'ids': ','.join(map(str, ids))})
+
+        results = response.json()['results']
+        self.assertEqual([item['id'] for item in results], ids)
+        self.assertEqual(results[1]['currency'], 'rub')
+
+    def test_not_modified_without_queries(self):
+        etag = self.client.get(reverse('item_catalog'))['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('item_catalog'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_item_change_changes_etag(self):
+        etag = self.client.get(reverse('item_catalog'))['ETag']
+        self.items[0].name = 'Новое имя'
+        self.items[0].save()
+
+        response = self.client.get(reverse('item_catalog'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Новое имя')
+
+
+def fixed_rate_provider() -> StaticRateProvider:
+    """
+    Источник курсов для CURRENCY_RATE_PROVIDER в тестах команд.
+    """
+    return StaticRateProvider({'usd': Decimal('1'), 'rub': Decimal('100')})
+
+
+class CurrencyConverterTests(SimpleTestCase):
+    """
+    Конвертация валют по таблице в памяти со снимком на случай недоступности источника.
+    """
+
+    def setUp(self):
+        self.snapshot = Path(tempfile.mkdtemp()) / 'rates.json'
+        self.provider = StaticRateProvider({'usd': Decimal('1'), 'rub': Decimal('100')})
+
+    def test_convert_uses_refreshed_rates(self):
+        converter = CurrencyConverter(self.provider, snapshot_path=self.snapshot)
+        converter.refresh()
+
+        self.assertEqual(converter.convert(Decimal('250'), 'rub', 'usd'), Decimal('2.5'))
+        self.assertEqual(converter.convert(Decimal('2'), 'usd', 'rub'), Decimal('200'))
+        self.assertTrue(self.snapshot.exists())
+
+    def test_snapshot_is_used_without_calling_provider(self):
+        CurrencyConverter(self.provider, snapshot_path=self.snapshot).refresh()
+        offline = StaticRateProvider({'usd': Decimal('1')})
+        converter = CurrencyConverter(offline, snapshot_path=self.snapshot)
+
+        self.assertEqual(converter.convert(Decimal('100'), 'rub', 'usd'), Decimal('1'))
+        self.assertEqual(offline.calls, 0)
+
+    def test_failed_refresh_keeps_previous_rates(self):
+        converter = CurrencyConverter(self.provider)
+        converter.refresh()
+        converter.provider = mock.Mock(get_rates=mock.Mock(side_effect=ConnectionError))
+
+        self.assertFalse(converter.refresh())
+        self.assertEqual(converter.convert(Decimal('100'), 'rub', 'usd'), Decimal('1'))
+
+    def test_stale_rates_are_rejected_until_snapshot_is_refreshed(self):
+        converter = CurrencyConverter(self.provider, snapshot_path=self.snapshot, max_age=60)
+        converter.refresh()
+        converter.updated_at -= 120
+        self.snapshot.write_text(json.dumps({'rates': {'usd': '1', 'rub': '100'}, 'fetched_at': '2020-01-01T00:00:00'}))
+
+        with self.assertRaisesMessage(StaleRatesError, 'Курсы валют устарели'):
+            converter.convert(Decimal('100'), 'rub', 'usd')
+
+        # Снимок обновлён другим процессом (refresh_currency_rates)
+        updated = StaticRateProvider({'usd': Decimal('1'), 'rub': Decimal('50')})
+        CurrencyConverter(updated, snapshot_path=self.snapshot).refresh()
+
+        self.assertEqual(converter.convert(Decimal('100'), 'rub', 'usd'), Decimal('2'))
+        self.assertEqual(converter.convert(Decimal('5'), 'usd', 'usd'), Decimal('5'))
+
+    def test_corrupt_snapshot_falls_back(self):
+        fallback = self.snapshot.with_name('fallback.json')
+        fallback.write_text(json.dumps({'rates': {'usd': '1', 'rub': '80'}, 'fetched_at': '2020-01-01T00:00:00'}))
+        self.snapshot.write_text('{"rates": {"rub": "not a number"')
+        converter = CurrencyConverter(self.provider, snapshot_path=self.snapshot, fallback_path=fallback)
+
+        self.assertEqual(converter.convert(Decimal('80'), 'rub', 'usd'), Decimal('1'))
+        self.assertTrue(converter.fallback_in_use)
+
+    def test_shipped_fallback_is_used_without_snapshot_despite_max_age(self):
+        with override_settings(
+                CURRENCY_RATE_PROVIDER='simple_app_1.tests.fixed_rate_provider',
+                CURRENCY_RATES_SNAPSHOT=str(self.snapshot),
+                CURRENCY_RATES_MAX_AGE=86400,
+        ):
+            converter = build_converter()
+
+        converter.provider = mock.Mock(get_rates=mock.Mock(side_effect=ConnectionError))
+        self.assertFalse(converter.refresh())
+
+        with self.assertLogs('simple_app_1.currency', level='WARNING'):
+            self.assertEqual(converter.convert(Decimal('915'), 'rub', 'usd'), Decimal('10'))
+
+        # Свежий снимок заменяет поставляемые курсы, и к нему снова применяется max_age
+        CurrencyConverter(self.provider, snapshot_path=self.snapshot).refresh()
+
+        self.assertEqual(converter.convert(Decimal('100'), 'rub', 'usd'), Decimal('1'))
+        self.assertFalse(converter.fallback_in_use)
+
+    def test_refresh_command_writes_snapshot(self):
+        provider = 'simple_app_1.tests.fixed_rate_provider'
+
+        with override_settings(CURRENCY_RATE_PROVIDER=provider, CURRENCY_RATES_SNAPSHOT=str(self.snapshot)):
+            call_command('refresh_currency_rates', stdout=StringIO())
+
+        self.assertEqual(json.loads(self.snapshot.read_text())['rates'], {'rub': '100', 'usd': '1'})
+
+
+class MixedCurrencyOrderTests(TestCase):
+    """
+    Заказ с товарами в разных валютах оплачивается в одной валюте.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def setUp(self):
+        converter = CurrencyConverter(StaticRateProvider({'usd': Decimal('1'), 'rub': Decimal('100')}))
+        converter.refresh()
+        set_converter(converter)
+        self.addCleanup(set_converter, None)
+
+    @override_settings(ORDER_CHARGE_CURRENCY='usd')
+    def test_line_items_are_normalized_to_charge_currency(self):
+        order = Order.objects.create()
+        OrderItem.objects.create(order=order, item=Item.objects.create(name='USD', description='-', price=10))
+        OrderItem.objects.create(
+            order=order, item=Item.objects.create(name='RUB', description='-', price=1550, currency=2)
+        )
+
+        payment_data = OrderPaymentDataService.generate_payment_data(RequestFactory().get('/'), OrderLoader.load(order.pk))
+
+        line_items = payment_data['line_items']
+        self.assertEqual({line['price_data']['currency'] for line in line_items}, {'usd'})
+        self.assertEqual([line['price_data']['unit_amount'] for line in line_items], [1000, 1550])
+
+    @override_settings(ORDER_CHARGE_CURRENCY='usd')
+    def test_stale_rates_leave_total_empty_and_return_503(self):
+        converter = CurrencyConverter(StaticRateProvider({'usd': Decimal('1'), 'rub': Decimal('100')}), max_age=60)
+        converter.refresh()
+        converter.updated_at -= 120
+        set_converter(converter)
+        usd = Item.objects.create(name='USD', description='-', price=10)
+        rub = Item.objects.create(name='RUB', description='-', price=1550, currency=2)
+
+        response = self.client.post(
+            reverse('order_create'),
+            {'items': [{'item_id': usd.pk, 'quantity': 1}, {'item_id': rub.pk, 'quantity': 1}]},
+            content_type='application/json',
+        )
+        order = Order.objects.get(pk=response.json()['order_id'])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(order.total)
+
+        # Пересчёт по сигналу при изменении скидки тоже не падает
+        order.discount = Discount.objects.create(name='Скидка', amount=10)
+        order.save()
+
+        for url in (reverse('order_quote', args=[order.pk]), reverse('order', args=[order.pk])):
+            with self.subTest(url=url):
+                quote = self.client.get(url)
+                self.assertEqual((quote.status_code, quote['Retry-After']), (503, '60'))
+
+        converter.refresh()
+        self.assertEqual(Order.objects.get(pk=order.pk).total_price, Decimal('22.95'))
+
+
+class ImportItemsCommandTests(TestCase):
+    """
+    Потоковый импорт товаров: upsert по артикулу, пропуск некорректных строк, пересчёт заказов.
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create(id=1, username='admin')
+        self.directory = Path(tempfile.mkdtemp())
+
+    def run_import(self, name, content, *args):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_items', str(path), *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_upserts_by_sku_in_batches(self):
+        Item.objects.create(sku='A-1', name='Старое имя', description='-', price=1)
+
+        stdout, stderr = self.run_import(
+            'items.csv',
+            'sku,name,description,price,currency\n'
+            'A-1,Товар 1,Описание,10.50,usd\n'
+            'A-2,Товар 2,Описание,20,rub\n'
+            'A-3,Товар 3,Описание,30,2\n',
+            '--batch-size', '2',
+        )
+
+        self.assertEqual(stderr, '')
+        self.assertIn('сохранено 3', stdout)
+        self.assertEqual(Item.objects.count(), 3)
+        item = Item.objects.get(sku='A-1')
+        self.assertEqual((item.name, item.price, item.currency), ('Товар 1', Decimal('10.50'), 1))
+        self.assertEqual(Item.objects.get(sku='A-3').currency, 2)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        stdout, stderr = self.run_import(
+            'items.jsonl',
+            '{"sku": "B-1", "name": "Товар", "description": "-", "price": "5"}\n'
+            '{"sku": "B-2", "name": "Товар", "description": "-", "price": "abc"}\n'
+            'not json\n'
+            '\n'
+            '{"name": "Без артикула", "description": "-", "price": "5"}\n',
+        )
+
+        self.assertEqual(list(Item.objects.values_list('sku', flat=True)), ['B-1'])
+        self.assertEqual([line.split(':')[0] for line in stderr.splitlines()], ['Строка 2', 'Строка 3', 'Строка 5'])
+        self.assertIn('ошибок 3', stdout)
+
+    def test_keeps_order_prices_and_bumps_catalog_version(self):
+        order = create_order(1)
+        item = order.order_item.get().item
+        Item.objects.filter(pk=item.pk).update(sku='C-1')
+        version = ItemCatalogVersion.get()
+
+        with mock.patch('simple_app_1.service.ItemPageCache.invalidate_many') as invalidate_many:
+            self.run_import('items.jsonl', '{"sku": "C-1", "name": "Товар", "description": "-", "price": 15}\n')
+
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('216.00'))
+        self.assertEqual(order.order_item.get().unit_price, Decimal('100.00'))
+        self.assertNotEqual(ItemCatalogVersion.get(), version)
+        invalidate_many.assert_called_once_with([item.pk])
+
+    def test_duplicate_sku_in_batch_keeps_last_row(self):
+        rows = [
+            (1, {'sku': 'D-1', 'name': 'Первый', 'description': '-', 'price': '1'}),
+            (2, {'sku': 'D-1', 'name': 'Второй', 'description': '-', 'price': '2'}),
+        ]
+
+        stats = ItemImportService.import_rows(rows)
+
+        self.assertEqual(stats, {'rows': 2, 'imported': 1, 'errors': 0})
+        self.assertEqual(Item.objects.get(sku='D-1').name, 'Второй')
+
+
+class StripeCatalogSyncTests(TestCase):
+    """
+    Синхронизация каталога со Stripe: только изменившиеся товары, повтор после 429, контрольная точка.
+    """
+
+    def setUp(self):
+        cache.clear()
+        StripeClientRegistry.reset()
+        self.stub = StripeStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(StripeClientRegistry.reset)
+        settings_override = override_settings(STRIPE_API_BASE=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.checkpoint = Path(tempfile.mkdtemp()) / 'checkpoint.json'
+        self.items = Item.objects.bulk_create([
+            Item(name=f'Товар {i}', description='Описание', price=10 + i, currency=1 + i % 2) for i in range(6)
+        ])
+
+    def sync(self, **kwargs):
+        service = StripeCatalogSyncService(workers=4, rate=1000, backoff=0, chunk_size=4, checkpoint_path=self.checkpoint)
+        return service.run(**kwargs)
+
+    def paths(self):
+        return [path for path, params in self.stub.requests]
+
+    def test_only_changed_items_are_synced(self):
+        stats = self.sync()
+
+        self.assertEqual(stats, {'scanned': 6, 'synced': 6, 'skipped': 0, 'failed': 0})
+        self.assertEqual(self.paths().count('/v1/products'), 6)
+        self.assertEqual(self.paths().count('/v1/prices'), 6)
+        self.assertFalse(Item.objects.filter(stripe_price_id='None').exists())
+        self.assertFalse(self.checkpoint.exists())
+
+        self.stub.requests.clear()
+        Item.objects.filter(pk=self.items[0].pk).update(name='Новое имя')
+        Item.objects.filter(pk=self.items[1].pk).update(price=99)
+
+        stats = self.sync()
+
+        self.assertEqual(stats, {'scanned': 6, 'synced': 2, 'skipped': 4, 'failed': 0})
+        product_id = Item.objects.get(pk=self.items[0].pk).stripe_product_id
+        self.assertEqual(sorted(self.paths()), ['/v1/prices', f'/v1/products/{product_id}'])
+
+    def test_admin_resync_updates_existing_products(self):
+        self.sync()
+        self.stub.requests.clear()
+        product_ids = dict(Item.objects.values_list('pk', 'stripe_product_id'))
+        admin_user = get_user_model().objects.create(username='staff', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+
+        self.client.post(reverse('admin:simple_app_1_item_changelist'), {
+            'action': 'resync_to_stripe', '_selected_action': [self.items[0].pk, self.items[1].pk],
+        })
+        stats = self.sync()
+
+        self.assertEqual(stats, {'scanned': 6, 'synced': 2, 'skipped': 4, 'failed': 0})
+        self.assertEqual(
+            sorted(self.paths()),
+            ['/v1/prices', '/v1/prices'] + sorted(f'/v1/products/{product_ids[item.pk]}' for item in self.items[:2]),
+        )
+        self.assertEqual(dict(Item.objects.values_list('pk', 'stripe_product_id')), product_ids)
+
+    def test_rate_limited_requests_are_retried(self):
+        self.stub.rate_limited_requests = 3
+
+        stats = self.sync()
+
+        self.assertEqual(stats['synced'], 6)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(len(set(Item.objects.values_list('stripe_product_id', flat=True))), 6)
+
+    def test_resumes_from_checkpoint(self):
+        self.checkpoint.write_text(json.dumps({'last_pk': self.items[3].pk}))
+
+        stats = self.sync()
+
+        self.assertEqual(stats['scanned'], 2)
+        self.assertEqual(
+            list(Item.objects.exclude(stripe_price_id='None').values_list('pk', flat=True)),
+            [self.items[4].pk, self.items[5].pk],
+        )
+        self.assertEqual(self.sync(restart=True)['synced'], 4)
+
+    def test_items_without_key_are_skipped_and_not_checkpointed_past(self):
+        Item.objects.filter(pk=self.items[1].pk).update(currency=None)
+        service = StripeCatalogSyncService(
+            workers=2, rate=1000, backoff=0, chunk_size=2, checkpoint_path=self.checkpoint
+        )
+        service.secret_keys = {**service.secret_keys, 2: ''}
+        checkpoints = []
+
+        with mock.patch.object(service, 'clear_checkpoint'):
+            stats = service.run(on_progress=lambda stats: checkpoints.append(service.load_checkpoint()))
+
+        # Товар без валюты и товары второй валюты (без ключа) не синхронизированы
+        self.assertEqual(stats, {'scanned': 6, 'synced': 3, 'skipped': 0, 'failed': 3})
+        self.assertEqual(
+            list(Item.objects.exclude(stripe_price_id='None').values_list('pk', flat=True)),
+            [self.items[0].pk, self.items[2].pk, self.items[4].pk],
+        )
+        self.assertEqual(checkpoints, [self.items[0].pk] * 3)
+
+
+class GenerateLoadDataCommandTests(TestCase):
+    """
+    Генератор синтетических данных: объёмы, детерминированность и корректная стоимость заказов.
+    """
+
+    def setUp(self):
+        converter = CurrencyConverter(StaticRateProvider({'usd': Decimal('1'), 'rub': Decimal('90')}))
+        converter.refresh()
+        set_converter(converter)
+        self.addCleanup(set_converter, None)
+
+    def generate(self, seed=0):
+        call_command(
+            'generate_load_data', items=50, orders=200, users=5, seed=seed, batch_size=70, stdout=StringIO()
+        )
+
+    def test_creates_rows_with_consistent_totals(self):
+        self.generate()
+
+        self.assertEqual(Item.objects.count(), 50)
+        self.assertEqual(Order.objects.count(), 200)
+        self.assertGreaterEqual(OrderItem.objects.count(), 200)
+        self.assertFalse(Order.objects.filter(order_item__isnull=True).exists())
+        self.assertTrue(Order.objects.filter(discount__isnull=False).exists())
+        self.assertTrue(Order.objects.filter(tax__isnull=False).exists())
+
+        totals = dict(Order.objects.values_list('pk', 'total'))
+        Order.objects.update_totals()
+        self.assertEqual(dict(Order.objects.values_list('pk', 'total')), totals)
+
+        # Последовательности сдвинуты после загрузки с явными идентификаторами
+        Item.objects.create(name='Товар', description='-', price=1)
+
+    def test_is_deterministic_for_seed(self):
+        self.generate(seed=7)
+        first = list(OrderItem.objects.order_by('pk').values_list('item__sku', 'quantity'))
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        Item.objects.all().delete()
+
+        self.generate(seed=7)
+        second = list(OrderItem.objects.order_by('pk').values_list('item__sku', 'quantity'))
+
+        self.assertEqual([quantity for sku, quantity in first], [quantity for sku, quantity in second])
+        self.assertEqual(len(first), len(second))
+
+
+class AsyncPaymentViewTests(TestCase):
+    """
+    Асинхронные эндпоинты оплаты: одновременные обращения к Stripe не ждут друг друга.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def setUp(self):
+        cache.clear()
+        StripeClientRegistry.reset()
+        self.stub = StripeStubServer(latency=0.3).start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(StripeClientRegistry.reset)
+
+    async def test_concurrent_checkouts_overlap(self):
+        items = [
+            await Item.objects.acreate(name=f'Товар {i}', description='-', price=10, stripe_price_id=f'price_{i}')
+            for i in range(8)
+        ]
+        for item in items:
+            item.stripe_price_fingerprint = item.get_stripe_price_fingerprint()
+            await item.asave()
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            started = time.perf_counter()
+            responses = await asyncio.gather(*[
+                self.async_client.get(reverse('buy_async', args=[item.pk])) for item in items
+            ])
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual([response.status_code for response in responses], [200] * 8)
+        self.assertEqual(len({response.json()['session_id'] for response in responses}), 8)
+        self.assertEqual(self.stub.request_count, 8)
+        self.assertLess(elapsed, 0.3 * 8 / 2)
+        self.assertIn('desc="Stripe x1"', responses[0]['Server-Timing'])
+
+    async def test_order_create_and_pay(self):
+        item = await Item.objects.acreate(name='Товар', description='-', price=10)
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            created = await self.async_client.post(
+                reverse('order_create_async'), {'items': [{'item_id': item.pk, 'quantity': 2}]},
+                content_type='application/json',
+            )
+            order_id = created.json()['order_id']
+            headers = {'Idempotency-Key': 'buyer-1'}
+            first = await self.async_client.get(reverse('buy_all_async', args=[order_id]), headers=headers)
+            second = await self.async_client.get(reverse('buy_all_async', args=[order_id]), headers=headers)
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual((await Order.objects.aget(pk=order_id)).total, Decimal('20.00'))
+        self.assertEqual(first.json()['session_id'], second.json()['session_id'])
+        self.assertEqual(self.stub.request_count, 1)
+
+    async def test_missing_objects(self):
+        missing_item = await self.async_client.get(reverse('buy_async', args=[999]))
+        missing_order = await self.async_client.get(reverse('buy_all_async', args=[999]))
+        bad_order = await self.async_client.post(
+            reverse('order_create_async'), {'items': [{'item_id': 999, 'quantity': 1}]},
+            content_type='application/json',
+        )
+
+        self.assertEqual(missing_item.status_code, 404)
+        self.assertEqual(missing_order.status_code, 404)
+        self.assertEqual(bad_order.status_code, 400)
+
+    @override_settings(CHECKOUT_JOBS_ENABLED=True)
+    async def test_job_mode_enqueues_instead_of_calling_stripe(self):
+        item = await Item.objects.acreate(name='Товар', description='-', price=10)
+        order = await Order.objects.acreate()
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            responses = [
+                await self.async_client.get(reverse('buy_async', args=[item.pk])),
+                await self.async_client.get(reverse('buy_all_async', args=[order.pk])),
+            ]
+            missing = await self.async_client.get(reverse('buy_all_async', args=[0]))
+
+        self.assertEqual([response.status_code for response in responses], [202, 202])
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(self.stub.request_count, 0)
+        self.assertEqual(
+            [(job.kind, job.object_id) async for job in CheckoutJob.objects.order_by('created_at')],
+            [(CheckoutJob.KIND_ITEM, item.pk), (CheckoutJob.KIND_ORDER, order.pk)],
+        )
+
+    async def test_order_create_requires_csrf_token_for_session_users(self):
+        item = await Item.objects.acreate(name='Товар', description='-', price=10)
+        client = AsyncClient(enforce_csrf_checks=True)
+        payload = {'items': [{'item_id': item.pk, 'quantity': 1}]}
+
+        anonymous = await client.post(reverse('order_create_async'), payload, content_type='application/json')
+        await client.aforce_login(await get_user_model().objects.aget(id=1))
+        without_token = await client.post(reverse('order_create_async'), payload, content_type='application/json')
+
+        self.assertEqual(anonymous.status_code, 201)
+        self.assertEqual(without_token.status_code, 403)
+
+
+@override_settings(CHECKOUT_JOBS_ENABLED=True, CHECKOUT_JOB_MAX_ATTEMPTS=2)
+class CheckoutJobQueueTests(TestCase):
+    """
+    Фоновое создание сессий оплаты: постановка в очередь, обработка, повторы и статус задания.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def setUp(self):
+        cache.clear()
+        StripeClientRegistry.reset()
+        self.stub = StripeStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(StripeClientRegistry.reset)
+        self.item = Item.objects.create(name='Товар', description='Описание', price=10)
+
+    def test_buy_enqueues_job_and_worker_creates_session(self):
+        response = self.client.get(reverse('buy', args=[self.item.pk]))
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.stub.request_count, 0)
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json()['status'], 'pending')
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            jobs = CheckoutJobQueue.claim()
+            self.assertEqual(CheckoutJobQueue.claim(), [])
+            self.assertTrue(CheckoutJobQueue.process(jobs[0]))
+
+        job = self.client.get(status_url).json()
+        self.assertEqual(job['status'], 'done')
+        self.assertTrue(job['session_id'].startswith('cs_test_stub_'))
+        self.assertEqual(CheckoutJob.objects.get().base_url, 'http://testserver/')
+
+    def test_order_job(self):
+        order = create_order(2)
+
+        response = self.client.get(reverse('buy_all', args=[order.pk]))
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            self.assertTrue(CheckoutJobQueue.process(CheckoutJobQueue.claim()[0]))
+
+        job = CheckoutJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.kind, job.object_id, job.status), ('order', order.pk, CheckoutJob.STATUS_DONE))
+        self.assertEqual(self.client.get(reverse('buy_all', args=[999])).status_code, 404)
+
+    def test_failed_attempt_is_retried_then_failed(self):
+        job = CheckoutJobQueue.enqueue(RequestFactory().get('/'), CheckoutJob.KIND_ITEM, self.item.pk)
+
+        with mock.patch.object(PaymentSessionCreator, 'create_session', side_effect=RuntimeError('Stripe недоступен')), \
+                override_settings(STRIPE_API_BASE=self.stub.url):
+            CheckoutJobQueue.process(CheckoutJobQueue.claim()[0])
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (CheckoutJob.STATUS_PENDING, 1))
+            self.assertEqual(CheckoutJobQueue.claim(), [])
+
+            CheckoutJob.objects.filter(pk=job.pk).update(available_at=job.created_at)
+            CheckoutJobQueue.process(CheckoutJobQueue.claim()[0])
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (CheckoutJob.STATUS_FAILED, 2, 'Stripe недоступен'))
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = CheckoutJobQueue.enqueue(RequestFactory().get('/'), CheckoutJob.KIND_ITEM, self.item.pk)
+        stale = CheckoutJobQueue.claim()[0]
+
+        with override_settings(CHECKOUT_JOB_TIMEOUT=0):
+            reclaimed = CheckoutJobQueue.claim()[0]
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            self.assertTrue(CheckoutJobQueue.process(reclaimed))
+
+        # Результат обработчика, у которого задание забрали, не перезаписывает итог
+        with mock.patch.object(PaymentSessionCreator, 'create_session', side_effect=RuntimeError('timeout')):
+            CheckoutJobQueue.process(stale)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (CheckoutJob.STATUS_DONE, 2))
+
+    def test_status_long_polling_and_unknown_job(self):
+        job = CheckoutJob.objects.create(
+            kind=CheckoutJob.KIND_ITEM, object_id=self.item.pk, base_url='/', status=CheckoutJob.STATUS_DONE,
+            session_id='cs_1',
+        )
+
+        response = self.client.get(reverse('checkout_job', args=[job.pk]), {'wait': 5})
+
+        self.assertEqual(response.json()['session_id'], 'cs_1')
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('checkout_job', args=[uuid.uuid4()])).status_code, 404)
+
+    def test_status_rejects_non_finite_wait(self):
+        job = CheckoutJob.objects.create(kind=CheckoutJob.KIND_ITEM, object_id=self.item.pk, base_url='/')
+
+        for wait in ('nan', 'inf', '-inf', 'abc'):
+            with self.subTest(wait=wait):
+                response = self.client.get(reverse('checkout_job', args=[job.pk]), {'wait': wait})
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(CHECKOUT_JOB_POLL_WAIT=0.5)
+    def test_status_wait_is_capped_by_setting(self):
+        job = CheckoutJob.objects.create(kind=CheckoutJob.KIND_ITEM, object_id=self.item.pk, base_url='/')
+
+        started = time.monotonic()
+        response = self.client.get(reverse('checkout_job', args=[job.pk]), {'wait': 3600})
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(response.json()['status'], 'pending')
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures_and_probes_after_timeout(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+
+        breaker.record_failure()
+        breaker.record_response(200)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_CLOSED)
+        breaker.record_response(502)
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_OPEN)
+
+        now[0] = 2.5
+        with self.assertRaises(CircuitOpenError) as context:
+            breaker.before_call()
+        self.assertEqual(context.exception.retry_after, 8)
+
+        now[0] = 10
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_OPEN)
+
+        now[0] = 20
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_CLOSED)
+        self.assertEqual(breaker.rejections, 2)
+
+    def test_cancelled_or_failed_probe_does_not_lock_breaker_open(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        client = InstrumentedRequestsClient(breaker=breaker)
+        breaker.record_failure()
+        now[0] = 10
+
+        with mock.patch.object(stripe.RequestsClient, 'request_async', side_effect=asyncio.CancelledError):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(client.request_async('get', 'https://api.stripe.com/v1/prices', {}))
+
+        with mock.patch.object(stripe.RequestsClient, 'request', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.request('get', 'https://api.stripe.com/v1/prices', {})
+
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_HALF_OPEN)
+
+        with mock.patch.object(stripe.RequestsClient, 'request', return_value=('{}', 200, {})):
+            client.request('get', 'https://api.stripe.com/v1/prices', {})
+
+        self.assertEqual((breaker.state, breaker.rejections), (CircuitBreaker.STATE_CLOSED, 0))
+
+    def test_retry_budget_limits_retries_to_share_of_requests(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0)
+
+        for _ in range(4):
+            budget.deposit()
+
+        self.assertEqual([budget.withdraw() for _ in range(3)], [True, True, False])
+        self.assertEqual((budget.retries, budget.rejected), (2, 1))
+
+
+@override_settings(STRIPE_BREAKER_FAILURE_THRESHOLD=2, STRIPE_BREAKER_RESET_TIMEOUT=30, STRIPE_MAX_NETWORK_RETRIES=1)
+class StripeResilienceTests(TestCase):
+    """
+    Отказоустойчивость обращений к Stripe на локальной замене Stripe с внедрёнными сбоями.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def setUp(self):
+        cache.clear()
+        StripeClientRegistry.reset()
+        self.stub = StripeStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(StripeClientRegistry.reset)
+        self.item = Item.objects.create(name='Товар', description='Описание', price=10, stripe_price_id='price_1')
+        self.item.stripe_price_fingerprint = self.item.get_stripe_price_fingerprint()
+        self.item.save()
+        self.stripe_secret_key = ItemPaymentDataService.get_secret_key(self.item.get_currency_display())
+
+    def test_breaker_opens_and_fails_fast_with_retry_after(self):
+        self.stub.failing_requests = 10
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            first = self.client.get(reverse('buy', args=[self.item.pk]))
+            second = self.client.get(reverse('buy', args=[self.item.pk]))
+
+        self.assertEqual(first.status_code, 503)
+        self.assertNotIn('Retry-After', first)
+        self.assertEqual(self.stub.request_count, 2)
+        self.assertEqual(second.status_code, 503)
+        self.assertEqual(second['Retry-After'], '30')
+        self.assertEqual(self.stub.request_count, 2)
+
+        metrics = '\n'.join(StripeClientRegistry.metrics())
+        self.assertRegex(metrics, r'stripe_circuit_breaker_state\{account="[0-9a-f]{8}"\} 1')
+        self.assertRegex(metrics, r'stripe_circuit_breaker_rejections_total\{account="[0-9a-f]{8}"\} 1')
+        self.assertIn('stripe_retries_total 1', metrics)
+
+    @override_settings(STRIPE_HTTP_READ_TIMEOUT=0.2)
+    def test_stalled_request_times_out_and_is_retried(self):
+        self.stub.stalled_requests = 1
+        self.stub.stall = 2
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            started = time.perf_counter()
+            response = self.client.get(reverse('buy', args=[self.item.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stub.request_count, 2)
+        self.assertLess(time.perf_counter() - started, 1.5)
+
+    @override_settings(STRIPE_RETRY_BUDGET_RATIO=0, STRIPE_RETRY_BUDGET_MIN_PER_SECOND=0)
+    def test_exhausted_retry_budget_disables_retries(self):
+        self.stub.failing_requests = 1
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            response = self.client.get(reverse('buy', args=[self.item.pk]))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.stub.request_count, 1)
+        self.assertIn('stripe_retries_rejected_total 1', StripeClientRegistry.metrics())
+
+    async def test_async_view_fails_fast_while_breaker_is_open(self):
+        breaker = StripeClientRegistry.get_breaker(self.stripe_secret_key)
+        breaker.record_failure()
+        breaker.record_failure()
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            response = await self.async_client.get(reverse('buy_async', args=[self.item.pk]))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.stub.request_count, 0)
+
+    def test_checkout_job_is_postponed_without_spending_attempt(self):
+        breaker = StripeClientRegistry.get_breaker(self.stripe_secret_key)
+        breaker.record_failure()
+        breaker.record_failure()
+        job = CheckoutJobQueue.enqueue(RequestFactory().get('/'), CheckoutJob.KIND_ITEM, self.item.pk)
+
+        with override_settings(STRIPE_API_BASE=self.stub.url):
+            self.assertFalse(CheckoutJobQueue.process(CheckoutJobQueue.claim()[0]))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (CheckoutJob.STATUS_PENDING, 0))
+        self.assertGreater(job.available_at, job.created_at + timedelta(seconds=25))
+        self.assertEqual(self.stub.request_count, 0)
+
+
+class PricingEngineTests(SimpleTestCase):
+    def test_percent_discount_then_tax_allocated_to_lines(self):
+        quote = PricingEngine.quote(
+            [PriceLine(1, Decimal('10.00'), 'usd', 1), PriceLine(2, Decimal('3.33'), 'usd', 3)],
+            discount_percent=Decimal('10'),
+            tax_rate=Decimal('20'),
+        )
+
+        self.assertEqual(quote.currency, 'usd')
+        self.assertEqual((quote.subtotal, quote.discount, quote.tax, quote.total), (
+            Decimal('19.99'), Decimal('2.00'), Decimal('3.60'), Decimal('21.59'),
+        ))
+        self.assertEqual(sum(line.discount for line in quote.lines), quote.discount)
+        self.assertEqual(sum(line.tax for line in quote.lines), quote.tax)
+        self.assertEqual(sum(line.total for line in quote.lines), quote.total)
+
+    def test_empty_order_costs_nothing(self):
+        quote = PricingEngine.quote([], discount_percent=Decimal('50'), tax_rate=Decimal('20'))
+
+        self.assertEqual(quote.total, Decimal('0.00'))
+
+
+class OrderQuoteTests(TestCase):
+    """
+    Стоимость заказа: снимок цен при создании, кэшируемый расчёт и совпадение с суммой в Stripe.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+
+    def setUp(self):
+        cache.clear()
+        self.item = Item.objects.create(name='Товар', description='-', price=Decimal('3.33'))
+        response = self.client.post(
+            reverse('order_create'), {'items': [{'item_id': self.item.pk, 'quantity': 3}]}, content_type='application/json'
+        )
+        self.order = Order.objects.get(pk=response.json()['order_id'])
+        self.order.discount = Discount.objects.create(name='Скидка', amount=10)
+        self.order.tax = Tax.objects.create(name='Налог', rate=20)
+        self.order.save()
+
+    def test_quote_matches_stored_total_and_stripe_amount(self):
+        quote = self.client.get(reverse('order_quote', args=[self.order.pk])).json()
+        self.order.refresh_from_db()
+
+        self.assertEqual(
+            (quote['subtotal'], quote['discount'], quote['tax'], quote['total']), ('9.99', '1.00', '1.80', '10.79')
+        )
+        self.assertEqual(quote['lines'][0]['name'], 'Товар')
+        self.assertEqual(self.order.total, Decimal('10.79'))
+
+        payment_data = OrderPaymentDataService.generate_payment_data(
+            RequestFactory().get('/'), OrderLoader.load(self.order.pk)
+        )
+        line_item = payment_data['line_items'][0]
+        self.assertEqual((line_item['price_data']['unit_amount'], line_item['quantity']), (1079, 1))
+        self.assertEqual(line_item['price_data']['product_data']['name'], 'Товар x 3')
+
+    def test_item_price_change_does_not_change_order(self):
+        Item.objects.filter(pk=self.item.pk).update(price=100)
+        self.item.refresh_from_db()
+        self.item.save()
+
+        self.assertEqual(OrderQuoteService.get_quote(self.order.pk)['total'], '10.79')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal('10.79'))
+
+    def test_quote_is_cached_until_order_changes(self):
+        OrderQuoteService.get_quote(self.order.pk)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('order_quote', args=[self.order.pk]))
+
+        Discount.objects.filter(pk=self.order.discount_id).get().delete()
+
+        quote = self.client.get(reverse('order_quote', args=[self.order.pk])).json()
+        self.assertEqual((quote['discount'], quote['total']), ('0.00', '11.99'))
+        self.assertEqual(self.client.get(reverse('order_quote', args=[0])).status_code, 404)
+        self.assertContains(self.client.get(reverse('order', args=[self.order.pk])), 'Общая стоимость: 11.99 usd')
+
+
+class AdminScaleTests(TestCase):
+    """
+    Админка заказов: число запросов не зависит от числа строк, поиск, оценка количества и массовые действия.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(id=1, username='admin', password='admin')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse(url_name)).status_code, 200)
+
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        create_order(2)
+        queries = {name: self.changelist_queries(name) for name in (
+            'admin:simple_app_1_order_changelist', 'admin:simple_app_1_orderitem_changelist'
+        )}
+
+        for _ in range(3):
+            create_order(3)
+
+        for name, count in queries.items():
+            self.assertEqual(self.changelist_queries(name), count, name)
+
+    def test_exact_search(self):
+        order = create_order(1)
+        other = create_order(1)
+        url = reverse('admin:simple_app_1_order_changelist')
+
+        response = self.client.get(url, {'q': str(order.pk)})
+        self.assertEqual(list(response.context['cl'].result_list), [order])
+
+        response = self.client.get(url, {'q': 'admin'})
+        self.assertEqual(set(response.context['cl'].result_list), {order, other})
+
+        response = self.client.get(url, {'q': 'adm'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_estimated_count_for_unfiltered_list(self):
+        create_order(1)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE simple_app_1_order')
+
+        with mock.patch.object(EstimatedCountPaginator, 'ESTIMATE_THRESHOLD', -1):
+            with CaptureQueriesContext(connection) as queries:
+                paginator = EstimatedCountPaginator(Order.objects.all(), 10)
+                self.assertEqual(paginator.count, 1)
+                self.assertEqual(EstimatedCountPaginator(Order.objects.filter(pk=0), 10).count, 0)
+
+        self.assertIn('reltuples', queries[0]['sql'])
+        self.assertIn('COUNT(*)', queries[1]['sql'])
+
+    def test_bulk_actions(self):
+        orders = [create_order(1) for _ in range(3)]
+        Order.objects.filter(pk=orders[0].pk).update(status=Order.STATUS_FAILED)
+        Item.objects.update(stripe_price_fingerprint='x', stripe_product_fingerprint='x')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('admin:simple_app_1_order_changelist'), {
+                'action': 'mark_paid', 'select_across': '1', 'index': '0', '_selected_action': [orders[0].pk],
+            })
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            Order.objects.filter(status=Order.STATUS_PAID, paid_at__isnull=False).count(), len(orders)
+        )
+
+        self.client.post(reverse('admin:simple_app_1_item_changelist'), {
+            'action': 'resync_to_stripe', 'select_across': '1', 'index': '0', '_selected_action': [orders[0].pk],
+        })
+        self.assertFalse(Item.objects.exclude(stripe_price_fingerprint='resync').exists())
+        self.assertTrue(all(StripePriceCatalogService.needs_sync(item) for item in Item.objects.all()))
+        self.assertEqual(str(OrderItem.objects.get(order=orders[0])), f'2 x товар #{orders[0].order_item.get().item_id}')
+
+
+class OrderExportTests(TestCase):
+    """
+    Потоковая выгрузка заказов: формат, фильтры, сжатие и команда export_orders.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create(id=1, username='admin', is_staff=True)
+        cls.paid = create_order(2)
+        Order.objects.filter(pk=cls.paid.pk).update(status=Order.STATUS_PAID)
+        cls.empty = Order.objects.create()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('order_export'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_has_line_per_order_item(self):
+        rows = list(csv.DictReader(self.export().decode().splitlines()))
+
+        self.assertEqual(list(rows[0]), OrderExportService.COLUMNS)
+        self.assertEqual([row['order_id'] for row in rows], [str(self.paid.pk)] * 2 + [str(self.empty.pk)])
+        self.assertEqual(
+            (rows[0]['status'], rows[0]['discount_percent'], rows[0]['quantity'], rows[0]['currency']),
+            ('paid', '10.00', '2', 'usd'),
+        )
+        self.assertEqual(rows[0]['order_total'], str(self.paid.total))
+        self.assertEqual((rows[2]['line_id'], rows[2]['status']), ('', 'pending'))
+
+    def test_filters_gzip_and_jsonl(self):
+        data = gzip.decompress(self.export(file_format='jsonl', gzip='1', status=Order.STATUS_PENDING))
+        rows = [json.loads(line) for line in data.decode().splitlines()]
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['order_id'], rows[0]['item_id']), (self.empty.pk, None))
+
+        self.assertEqual(self.client.get(reverse('order_export'), {'file_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('order_export'), {'created_after': 'вчера'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('order_export')).status_code, 403)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('order_export'))
+        data = b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(data.decode().splitlines()[0], ','.join(OrderExportService.COLUMNS))
+        self.assertEqual(len(data.decode().splitlines()), 4)
+
+    def test_command_writes_compressed_file(self):
+        stderr = StringIO()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'orders.csv.gz'
+            call_command('export_orders', str(path), '--status', str(Order.STATUS_PAID), '--chunk-size', '1',
+                         stderr=stderr)
+
+            with gzip.open(path, 'rt', newline='') as file:
+                rows = list(csv.DictReader(file))
+
+        self.assertEqual({row['order_id'] for row in rows}, {str(self.paid.pk)})
+        self.assertEqual(len(rows), 2)
+        self.assertIn('строк 2', stderr.getvalue())
+
+
+class OrderPayloadValidatorTests(TestCase):
+    """
+    Проверка данных для создания заказов: объединение позиций, ограничения и структурированные ошибки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+        cls.items = Item.objects.bulk_create([Item(name=f'Товар {i}', description='', price=100) for i in range(2)])
+
+    def errors(self, payload, validate=OrderPayloadValidator.validate_order):
+        with self.assertRaises(OrderPayloadError) as raised:
+            validate(json.dumps(payload).encode())
+
+        return [(error['field'], error['code']) for error in raised.exception.errors]
+
+    def test_merges_duplicates_with_one_query(self):
+        first, second = self.items
+        payload = {'items': [
+            {'item_id': first.pk, 'quantity': 1}, {'item_id': second.pk, 'quantity': '2'},
+            {'item_id': first.pk, 'quantity': 3},
+        ]}
+
+        with self.assertNumQueries(1):
+            lines = OrderPayloadValidator.validate_order(json.dumps(payload).encode())
+
+        self.assertEqual(lines, [{'item_id': first.pk, 'quantity': 4}, {'item_id': second.pk, 'quantity': 2}])
+
+    def test_structured_errors(self):
+        item = self.items[0]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.errors({'items': [
+                {'item_id': item.pk, 'quantity': 0}, {'item_id': True, 'quantity': 1}, 'x',
+                {'item_id': 2 ** 40, 'quantity': -1},
+            ]}), [
+                ('items.0.quantity', 'invalid'), ('items.1.item_id', 'invalid'), ('items.2', 'invalid'),
+                ('items.3.item_id', 'invalid'), ('items.3.quantity', 'invalid'),
+            ])
+
+        self.assertEqual(self.errors({'items': []}), [('items', 'invalid')])
+        self.assertEqual(self.errors([]), [('', 'invalid')])
+        self.assertEqual(
+            self.errors({'items': [{'item_id': 999999, 'quantity': 1}]}), [('items', 'does_not_exist')]
+        )
+        self.assertEqual(
+            self.errors({'orders': [{'items': [{'item_id': item.pk, 'quantity': 1}]}, {}]},
+                        OrderPayloadValidator.validate_batch),
+            [('orders.1.items', 'required')],
+        )
+
+        with override_settings(ORDER_MAX_LINES=1, ORDER_MAX_QUANTITY=5):
+            line = {'item_id': item.pk, 'quantity': 1}
+            self.assertEqual(self.errors({'items': [line, line]}), [('items', 'max_length')])
+            self.assertEqual(self.errors({'items': [{**line, 'quantity': 6}]}), [('items', 'max_value')])
+
+    def test_views_reject_bad_payloads_before_writing(self):
+        url = reverse('order_create')
+
+        with override_settings(ORDER_PAYLOAD_MAX_BYTES=64):
+            response = self.client.post(
+                url, {'items': [{'item_id': self.items[0].pk, 'quantity': 1}] * 10}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 413)
+
+        response = self.client.post(url, 'not json', content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['errors'][0]['code']), (400, 'parse_error'))
+
+        response = self.client.post(
+            reverse('order_create_batch'),
+            {'orders': [{'items': [{'item_id': self.items[0].pk, 'quantity': 1}]}, {'items': [{'item_id': 999999}]}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['field'], 'orders.1.items.0.quantity')
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post(
+            url, {'items': [{'item_id': self.items[1].pk, 'quantity': 1}] * 2}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.get(order_id=response.json()['order_id']).quantity, 2)
+
+
+class OrderBatchCreateTests(TestCase):
+    """
+    Пакетное создание заказов: фиксированное число запросов, одна транзакция и ограничение размера пакета.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create(id=1, username='admin')
+        cls.items = Item.objects.bulk_create([
+            Item(name=f'Товар {i}', description='', price=10 * (i + 1)) for i in range(3)
+        ])
+
+    def batch(self, orders_count):
+        return {'orders': [
+            {'items': [{'item_id': item.pk, 'quantity': index + 1} for item in self.items]}
+            for index in range(orders_count)
+        ]}
+
+    def test_creates_batch_with_fixed_number_of_queries(self):
+        url = reverse('order_create_batch')
+
+        # Проверка товаров, SELECT товаров (in_bulk), SAVEPOINT, INSERT заказов и позиций, RELEASE SAVEPOINT
+        with self.assertNumQueries(6):
+            response = self.client.post(url, self.batch(2), content_type='application/json')
+
+        with self.assertNumQueries(6):
+            self.client.post(url, self.batch(20), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        first, second = (Order.objects.get(pk=pk) for pk in response.json()['order_ids'])
+        self.assertEqual(first.total, Decimal('60.00'))
+        self.assertEqual(second.total, Decimal('120.00'))
+        self.assertEqual(
+            list(second.order_item.order_by('item_id').values_list('item_id', 'quantity', 'unit_price')),
+            [(item.pk, 2, item.price) for item in self.items],
+        )
+        self.assertEqual(Order.objects.count(), 22)
+
+    def test_unknown_item_rolls_back_whole_batch(self):
+        orders_data = [[{'item_id': self.items[0].pk, 'quantity': 1}], [{'item_id': 999999, 'quantity': 1}]]
+
+        with self.assertRaises(Item.DoesNotExist):
+            OrderCreationService.create_orders(orders_data)
+
+        # Товар удалён между проверкой данных и созданием заказов
+        with mock.patch.object(OrderPayloadValidator, 'check_items_exist'):
+            response = self.client.post(
+                reverse('order_create_batch'),
+                {'orders': [{'items': [{'item_id': 999999, 'quantity': 1}]}]},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    @override_settings(ORDER_BATCH_MAX_ORDERS=2)
+    def test_batch_size_is_capped(self):
+        url = reverse('order_create_batch')
+
+        with self.assertNumQueries(0):
+            response = self.client.post(url, self.batch(3), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0], {
+            'field': 'orders', 'code': 'max_length', 'message': 'Не более 2 заказов.',
+        })
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.client.post(url, self.batch(2), content_type='application/json').status_code, 201)
+
+
+def signed_webhook_headers(test, payload) -> dict:
+    timestamp = int(time.time())
+    signature = hmac.new(b'whsec_usd', f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return {'HTTP_STRIPE_SIGNATURE': f't={timestamp},v1={signature}'}
+
+
+@override_settings(STRIPE_WEBHOOK_SECRETS=['whsec_usd'])
+class QueryBudgetTests(TestCase):
+    """
+    Бюджеты запросов к БД для всех эндпоинтов simple_app_1/urls.py и отсутствие полного чтения больших таблиц.
+
+    Каждый эндпоинт вызывается на данных с несколькими заказами и позициями с пустым кэшем (худший случай):
+    N+1 запросов превышает бюджет. Планы всех SELECT проверяются через EXPLAIN (ANALYZE, BUFFERS)
+    (см. QueryProfile), в сообщении об ошибке выводятся запросы и планы. Новый эндпоинт должен
+    получить бюджет в BUDGETS.
+    """
+    LARGE_TABLES = {model._meta.db_table for model in (Item, Order, OrderItem, StripeEvent, CheckoutJob)}
+    BUDGETS = {
+        'buy': EndpointBudget(3, args=lambda test: [test.item.pk]),
+        'item': EndpointBudget(1, args=lambda test: [test.item.pk]),
+        'item_catalog': EndpointBudget(3),
+        'success': EndpointBudget(0),
+        'cancel': EndpointBudget(0),
+        'order_list': EndpointBudget(3),
+        'order_export': EndpointBudget(5, allow_full_scans=[
+            'simple_app_1_order', 'simple_app_1_orderitem', 'simple_app_1_item',
+        ]),
+        'order_create': EndpointBudget(8, method='post', data=lambda test: {'items': test.lines}),
+        'order_create_batch': EndpointBudget(
+            8, method='post', data=lambda test: {'orders': [{'items': test.lines}] * 3}
+        ),
+        'buy_all': EndpointBudget(4, args=lambda test: [test.order.pk]),
+        'order': EndpointBudget(2, args=lambda test: [test.order.pk]),
+        'order_quote': EndpointBudget(4, args=lambda test: [test.order.pk]),
+        'checkout_job': EndpointBudget(1, args=lambda test: [test.job.pk]),
+        'buy_async': EndpointBudget(1, args=lambda test: [test.item.pk]),
+        'buy_all_async': EndpointBudget(2, args=lambda test: [test.order.pk]),
+        'order_create_async': EndpointBudget(8, method='post', data=lambda test: {'items': test.lines}),
+        'stripe_webhook': EndpointBudget(
+            1, method='post', headers=signed_webhook_headers, data=lambda test: {
+                'id': 'evt_1', 'type': 'checkout.session.completed',
+                'data': {'object': {'client_reference_id': f'order-{test.order.pk}', 'payment_status': 'paid'}},
+            },
+        ),
+        'metrics': EndpointBudget(0),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create(id=1, username='admin', is_staff=True)
+        orders = [create_order(3) for _ in range(4)]
+        cls.order = orders[0]
+        cls.item = cls.order.order_item.first().item
+        Item.objects.update(stripe_price_id='price_1')
+
+        for item in Item.objects.all():
+            item.stripe_price_fingerprint = item.get_stripe_price_fingerprint()
+            item.save()
+
+        cls.lines = [{'item_id': item.pk, 'quantity': 2} for item in Item.objects.all()[:5]]
+        cls.job = CheckoutJob.objects.create(
+            kind=CheckoutJob.KIND_ORDER, object_id=cls.order.pk, base_url='http://testserver/'
+        )
+
+    def setUp(self):
+        StripeClientRegistry.reset()
+        self.stub = StripeStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(StripeClientRegistry.reset)
+        self.client.force_login(self.admin)
+
+    def call(self, name: str, budget: EndpointBudget):
+        url = reverse(name, args=budget.args(self) if budget.args else None)
+        data = budget.data(self) if budget.data else None
+
+        if budget.method == 'post':
+            body = json.dumps(data)
+            headers = budget.headers(self, body) if budget.headers else {}
+            response = self.client.post(url, body, content_type='application/json', **headers)
+        else:
+            response = self.client.get(url, data)
+
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+        return response
+
+    def test_every_url_has_budget(self):
+        from .urls import urlpatterns
+
+        self.assertEqual(set(self.BUDGETS), {pattern.name for pattern in urlpatterns})
+
+    def test_endpoints_stay_within_budget(self):
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(name), override_settings(STRIPE_API_BASE=self.stub.url):
+                cache.clear()
+
+                with QueryProfile() as profile:
+                    response = self.call(name, budget)
+
+                self.assertLess(response.status_code, 400)
+                self.assertLessEqual(len(profile.queries), budget.max_queries, profile.report())
+
+                profile.explain()
+                full_scans = [
+                    (table, sql) for table, sql in profile.full_scans(self.LARGE_TABLES)
+                    if table not in budget.allow_full_scans
+                ]
+                self.assertEqual(full_scans, [], profile.report())
+
+    def test_profile_flags_full_scans_of_large_tables(self):
+        with QueryProfile() as profile:
+            list(Order.objects.filter(telephone='+7'))
+            list(Order.objects.filter(status=Order.STATUS_PAID).order_by('-id')[:10])
+            list(Order.objects.order_by('id')[:10])
+
+        profile.explain()
+
+        self.assertEqual([table for table, _ in profile.full_scans(self.LARGE_TABLES)], ['simple_app_1_order'])
+        self.assertIn('telephone', profile.full_scans(self.LARGE_TABLES)[0][1])
+        self.assertIn('Index Scan on simple_app_1_order using order_status_id_idx', profile.report())
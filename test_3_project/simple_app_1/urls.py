@@ -1,14 +1,32 @@
 from django.urls import path
-from .api import ItemView, ItemPaymentView, OrderPaymentView, OrderView, OrderCreateView, SuccessView, CancelView
+from .api import (
+    ItemView, ItemPaymentView, OrderPaymentView, OrderView, OrderCreateView, OrderBatchCreateView, SuccessView,
+    CancelView, MetricsView, StripeWebhookView, OrderListView, ItemCatalogView, AsyncItemPaymentView,
+    AsyncOrderPaymentView, AsyncOrderCreateView, CheckoutJobStatusView, OrderQuoteView, OrderExportView
+)
 
 urlpatterns = [
     path('buy/<int:pk>', ItemPaymentView.as_view(), name='buy'),
     path('item/<int:pk>', ItemView.as_view(), name='item'),
+    path('catalog/items', ItemCatalogView.as_view(), name='item_catalog'),
     path('success', SuccessView.as_view(), name='success'),
     path('cancel', CancelView.as_view(), name='cancel'),
 
+    path('orders', OrderListView.as_view(), name='order_list'),
+    path('orders/export', OrderExportView.as_view(), name='order_export'),
     path('order/create', OrderCreateView.as_view(), name='order_create'),
+    path('order/create_batch', OrderBatchCreateView.as_view(), name='order_create_batch'),
     path('buy_all/<int:order_id>', OrderPaymentView.as_view(), name='buy_all'),
     path('order/<int:order_id>', OrderView.as_view(), name='order'),
+    path('order/<int:order_id>/quote', OrderQuoteView.as_view(), name='order_quote'),
+    path('checkout/jobs/<uuid:job_id>', CheckoutJobStatusView.as_view(), name='checkout_job'),
+
+    # Асинхронные версии эндпоинтов оплаты для запуска через ASGI
+    path('async/buy/<int:pk>', AsyncItemPaymentView.as_view(), name='buy_async'),
+    path('async/buy_all/<int:order_id>', AsyncOrderPaymentView.as_view(), name='buy_all_async'),
+    path('async/order/create', AsyncOrderCreateView.as_view(), name='order_create_async'),
+
+    path('webhooks/stripe', StripeWebhookView.as_view(), name='stripe_webhook'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 
 ]
@@ -0,0 +1,245 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Item
+
+
+class OrderPayloadError(Exception):
+    """
+    Ошибка проверки данных заказа.
+
+    Attributes:
+        - errors (List[Dict[str, str]]): Ошибки вида {"field": "items.0.quantity", "code": ..., "message": ...}.
+        - status_code (int): HTTP-статус ответа (400 или 413 для слишком большого запроса).
+
+    """
+
+    def __init__(self, errors: List[Dict[str, str]], status_code: int = 400):
+        super().__init__(errors)
+        self.errors = errors
+        self.status_code = status_code
+
+    def as_dict(self) -> Dict[str, List[Dict[str, str]]]:
+        return {'errors': self.errors}
+
+
+class OrderPayloadValidator:
+    """
+    Быстрая проверка данных для создания заказов (/order/create, /order/create_batch).
+
+    Проверка выполняется до обращения к сервису создания заказов и без механизма полей DRF:
+        - размер тела запроса не больше ORDER_PAYLOAD_MAX_BYTES (иначе 413, тело не читается);
+        - в заказе от 1 до ORDER_MAX_LINES позиций, в пакете не больше ORDER_BATCH_MAX_ORDERS заказов;
+        - item_id и quantity - целые числа (или строки из цифр), quantity от 1 до ORDER_MAX_QUANTITY;
+        - позиции с одинаковым item_id объединяются, количество суммируется;
+        - существование всех товаров проверяется одним запросом.
+
+    Все найденные ошибки возвращаются вместе (OrderPayloadError.errors) с путём к полю и кодом ошибки.
+
+    Attributes:
+        - MAX_INT (int): Наибольшее значение целочисленных полей (int4 в PostgreSQL).
+
+    Methods:
+        - validate_order(body: bytes, content_length: Optional[str]) -> List[dict]:
+            Проверяет данные одного заказа.
+        - validate_batch(body: bytes, content_length: Optional[str]) -> List[List[dict]]:
+            Проверяет данные пакета заказов.
+        - avalidate_order(body: bytes, content_length: Optional[str]) -> List[dict]:
+            Асинхронная версия validate_order.
+
+    """
+    MAX_INT = 2147483647
+
+    @classmethod
+    def validate_order(cls, body: bytes, content_length: Optional[str] = None) -> List[dict]:
+        """
+        Проверяет данные одного заказа: {"items": [{"item_id": 1, "quantity": 2}, ...]}.
+
+        Parameters:
+            - body (bytes): Тело запроса (JSON).
+            - content_length (Optional[str]): Заголовок Content-Length, если известен.
+
+        Returns:
+            List[dict]: Позиции заказа {"item_id": int, "quantity": int} без повторяющихся товаров.
+
+        Raises:
+            - OrderPayloadError: Если данные некорректны или товары не найдены.
+
+        """
+        data = cls.parse(body, content_length)
+        errors = []
+        lines = cls.clean_items(cls.get_field(data, 'items', '', errors), 'items', errors)
+        cls.check_items_exist({'items': lines}, errors)
+        cls.raise_for_errors(errors)
+        return lines
+
+    @classmethod
+    async def avalidate_order(cls, body: bytes, content_length: Optional[str] = None) -> List[dict]:
+        """
+        Асинхронная версия validate_order. Запрос к БД выполняется в отдельном потоке (sync_to_async).
+        """
+        return await sync_to_async(cls.validate_order)(body, content_length)
+
+    @classmethod
+    def validate_batch(cls, body: bytes, content_length: Optional[str] = None) -> List[List[dict]]:
+        """
+        Проверяет данные пакета заказов: {"orders": [{"items": [...]}, ...]}.
+
+        Parameters:
+            - body (bytes): Тело запроса (JSON).
+            - content_length (Optional[str]): Заголовок Content-Length, если известен.
+
+        Returns:
+            List[List[dict]]: Позиции каждого заказа в порядке входных данных.
+
+        Raises:
+            - OrderPayloadError: Если данные некорректны или товары не найдены.
+
+        """
+        data = cls.parse(body, content_length)
+        errors = []
+        orders = cls.get_field(data, 'orders', '', errors)
+        orders_lines = {}
+
+        if orders is not None:
+            if not isinstance(orders, list) or not orders:
+                cls.add_error(errors, 'orders', 'invalid', 'Ожидается непустой список заказов.')
+            elif len(orders) > settings.ORDER_BATCH_MAX_ORDERS:
+                cls.add_error(errors, 'orders', 'max_length', f'Не более {settings.ORDER_BATCH_MAX_ORDERS} заказов.')
+            else:
+                for index, order in enumerate(orders):
+                    path = f'orders.{index}'
+                    orders_lines[path + '.items'] = cls.clean_items(
+                        cls.get_field(order, 'items', path, errors), path + '.items', errors
+                    )
+
+        cls.check_items_exist(orders_lines, errors)
+        cls.raise_for_errors(errors)
+        return list(orders_lines.values())
+
+    @classmethod
+    def parse(cls, body: bytes, content_length: Optional[str] = None) -> Any:
+        """
+        Проверяет размер тела запроса и разбирает JSON.
+        """
+        max_bytes = settings.ORDER_PAYLOAD_MAX_BYTES
+
+        try:
+            declared_length = int(content_length or 0)
+        except ValueError:
+            declared_length = 0
+
+        if declared_length > max_bytes or len(body) > max_bytes:
+            raise OrderPayloadError(
+                [{'field': '', 'code': 'too_large', 'message': f'Размер запроса больше {max_bytes} байт.'}],
+                status_code=413,
+            )
+
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise OrderPayloadError([{'field': '', 'code': 'parse_error', 'message': f'Некорректный JSON: {str(e)}'}])
+
+    @classmethod
+    def get_field(cls, data: Any, name: str, path: str, errors: List[Dict[str, str]]) -> Any:
+        field = f'{path}.{name}' if path else name
+
+        if not isinstance(data, dict):
+            cls.add_error(errors, path, 'invalid', 'Ожидается объект.')
+            return None
+        if name not in data:
+            cls.add_error(errors, field, 'required', 'Обязательное поле.')
+            return None
+
+        return data[name]
+
+    @classmethod
+    def clean_items(cls, items: Any, path: str, errors: List[Dict[str, str]]) -> List[dict]:
+        """
+        Проверяет позиции заказа и объединяет позиции с одинаковым item_id.
+
+        Parameters:
+            - items (Any): Значение поля items.
+            - path (str): Путь к полю для сообщений об ошибках.
+            - errors (List[Dict[str, str]]): Список, в который добавляются ошибки.
+
+        Returns:
+            List[dict]: Позиции в порядке первого появления товара.
+
+        """
+        if items is None:
+            return []
+        if not isinstance(items, list) or not items:
+            cls.add_error(errors, path, 'invalid', 'Ожидается непустой список позиций.')
+            return []
+        if len(items) > settings.ORDER_MAX_LINES:
+            cls.add_error(errors, path, 'max_length', f'Не более {settings.ORDER_MAX_LINES} позиций.')
+            return []
+
+        quantities = {}
+
+        for index, line in enumerate(items):
+            if type(line) is not dict:
+                cls.add_error(errors, f'{path}.{index}', 'invalid', 'Ожидается объект.')
+                continue
+
+            item_id = cls.to_int(line.get('item_id'))
+            quantity = cls.to_int(line.get('quantity'))
+
+            valid = True
+
+            if item_id is None or not 0 < item_id <= cls.MAX_INT:
+                cls.add_error(errors, f'{path}.{index}.item_id', 'invalid', 'Ожидается положительное целое число.')
+                valid = False
+            if quantity is None or quantity < 1:
+                cls.add_error(errors, f'{path}.{index}.quantity', 'invalid', 'Ожидается положительное целое число.')
+                valid = False
+
+            if valid:
+                quantities[item_id] = quantities.get(item_id, 0) + quantity
+
+        for item_id, quantity in quantities.items():
+            if quantity > settings.ORDER_MAX_QUANTITY:
+                cls.add_error(
+                    errors, path, 'max_value',
+                    f'Количество товара {item_id} больше {settings.ORDER_MAX_QUANTITY}.',
+                )
+
+        return [{'item_id': item_id, 'quantity': quantity} for item_id, quantity in quantities.items()]
+
+    @classmethod
+    def check_items_exist(cls, lines_by_path: Dict[str, List[dict]], errors: List[Dict[str, str]]) -> None:
+        """
+        Проверяет одним запросом, что все товары существуют. Запрос не выполняется, если уже есть ошибки.
+        """
+        if errors:
+            return
+
+        item_ids = {line['item_id'] for lines in lines_by_path.values() for line in lines}
+        existing_ids = set(Item.objects.filter(pk__in=item_ids).values_list('pk', flat=True))
+
+        for path, lines in lines_by_path.items():
+            for line in lines:
+                if line['item_id'] not in existing_ids:
+                    cls.add_error(errors, path, 'does_not_exist', f"Товар {line['item_id']} не найден.")
+
+    @staticmethod
+    def to_int(value: Any) -> Optional[int]:
+        if type(value) is int:
+            return value
+        if isinstance(value, str) and len(value) <= 10 and value.isascii() and value.isdigit():
+            return int(value)
+
+        return None
+
+    @staticmethod
+    def add_error(errors: List[Dict[str, str]], field: str, code: str, message: str) -> None:
+        errors.append({'field': field, 'code': code, 'message': message})
+
+    @staticmethod
+    def raise_for_errors(errors: List[Dict[str, str]]) -> None:
+        if errors:
+            raise OrderPayloadError(errors)
@@ -40,6 +40,65 @@ STRIPE_SECRET_KEY_CURRENCY_1 = env('STRIPE_SECRET_KEY_CURRENCY_1')
 STRIPE_PUBLIC_KEY_CURRENCY_2 = env('STRIPE_PUBLIC_KEY_CURRENCY_2')
 STRIPE_SECRET_KEY_CURRENCY_2 = env('STRIPE_SECRET_KEY_CURRENCY_2')
 
+# Секреты вебхуков Stripe (по одному на аккаунт), через запятую
+STRIPE_WEBHOOK_SECRETS = env.list('STRIPE_WEBHOOK_SECRETS', default=[])
+STRIPE_WEBHOOK_TOLERANCE = env.int('STRIPE_WEBHOOK_TOLERANCE', default=300)
+
+# HTTP-клиенты Stripe: по одному пулу соединений на каждый секретный ключ
+STRIPE_HTTP_CONNECT_TIMEOUT = env.float('STRIPE_HTTP_CONNECT_TIMEOUT', default=2.0)
+STRIPE_HTTP_READ_TIMEOUT = env.float('STRIPE_HTTP_READ_TIMEOUT', default=10.0)
+STRIPE_HTTP_POOL_SIZE = env.int('STRIPE_HTTP_POOL_SIZE', default=10)
+# Пул соединений асинхронных представлений (ASGI): одновременных обращений к Stripe на цикл событий
+STRIPE_HTTP_ASYNC_POOL_SIZE = env.int('STRIPE_HTTP_ASYNC_POOL_SIZE', default=200)
+# Повторы после таймаутов и ответов 5xx: не больше STRIPE_MAX_NETWORK_RETRIES на запрос и не больше
+# STRIPE_RETRY_BUDGET_RATIO от числа запросов (плюс STRIPE_RETRY_BUDGET_MIN_PER_SECOND в секунду) на процесс
+STRIPE_MAX_NETWORK_RETRIES = env.int('STRIPE_MAX_NETWORK_RETRIES', default=2)
+STRIPE_RETRY_BUDGET_RATIO = env.float('STRIPE_RETRY_BUDGET_RATIO', default=0.1)
+STRIPE_RETRY_BUDGET_MIN_PER_SECOND = env.float('STRIPE_RETRY_BUDGET_MIN_PER_SECOND', default=1.0)
+# Предохранитель аккаунта: после STRIPE_BREAKER_FAILURE_THRESHOLD ошибок подряд запросы к Stripe
+# отклоняются сразу (ответ 503 с Retry-After) в течение STRIPE_BREAKER_RESET_TIMEOUT секунд
+STRIPE_BREAKER_FAILURE_THRESHOLD = env.int('STRIPE_BREAKER_FAILURE_THRESHOLD', default=5)
+STRIPE_BREAKER_RESET_TIMEOUT = env.float('STRIPE_BREAKER_RESET_TIMEOUT', default=30.0)
+# Адрес Stripe API; переопределяется для локальной замены Stripe (simple_app_1.stripe_stub)
+STRIPE_API_BASE = env('STRIPE_API_BASE', default=None)
+
+# Курсы валют: источник, период обновления и файл-снимок на случай недоступности источника
+CURRENCY_RATE_PROVIDER = env('CURRENCY_RATE_PROVIDER', default='simple_app_1.currency.ForexRateProvider')
+CURRENCY_RATES_TTL = env.int('CURRENCY_RATES_TTL', default=3600)
+# Курсы старше этого возраста (секунд) не используются для конвертации; 0 - без ограничения
+CURRENCY_RATES_MAX_AGE = env.int('CURRENCY_RATES_MAX_AGE', default=86400)
+CURRENCY_RATES_SNAPSHOT = env('CURRENCY_RATES_SNAPSHOT', default=str(BASE_DIR / 'currency_rates.json'))
+CURRENCY_RATES_BACKGROUND_REFRESH = env.bool('CURRENCY_RATES_BACKGROUND_REFRESH', default=True)
+# Валюта оплаты заказов, в которых есть товары в разных валютах
+ORDER_CHARGE_CURRENCY = env('ORDER_CHARGE_CURRENCY', default='usd')
+# Время хранения расчёта стоимости заказа (/order/<id>/quote), секунд; сбрасывается при изменении заказа
+ORDER_QUOTE_CACHE_SECONDS = env.int('ORDER_QUOTE_CACHE_SECONDS', default=300)
+# Ограничения данных для создания заказов (simple_app_1.validators.OrderPayloadValidator)
+ORDER_PAYLOAD_MAX_BYTES = env.int('ORDER_PAYLOAD_MAX_BYTES', default=262144)
+ORDER_MAX_LINES = env.int('ORDER_MAX_LINES', default=500)
+ORDER_MAX_QUANTITY = env.int('ORDER_MAX_QUANTITY', default=10000)
+ORDER_BATCH_MAX_ORDERS = env.int('ORDER_BATCH_MAX_ORDERS', default=100)
+
+# Общий кэш (например, redis://127.0.0.1:6379/1), по умолчанию - память процесса
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Время жизни закэшированной страницы товара, в секундах
+ITEM_PAGE_CACHE_SECONDS = env.int('ITEM_PAGE_CACHE_SECONDS', default=300)
+
+# Окно переиспользования сессий Stripe Checkout для одного товара или заказа, в секундах
+CHECKOUT_SESSION_REUSE_SECONDS = env.int('CHECKOUT_SESSION_REUSE_SECONDS', default=1800)
+
+# Создание сессий оплаты в фоне: /buy и /buy_all ставят задание в очередь (manage.py process_checkout_jobs)
+CHECKOUT_JOBS_ENABLED = env.bool('CHECKOUT_JOBS_ENABLED', default=False)
+# Количество попыток создать сессию до перевода задания в failed
+CHECKOUT_JOB_MAX_ATTEMPTS = env.int('CHECKOUT_JOB_MAX_ATTEMPTS', default=3)
+# Через сколько секунд задание, взятое упавшим обработчиком, снова становится доступным
+CHECKOUT_JOB_TIMEOUT = env.int('CHECKOUT_JOB_TIMEOUT', default=60)
+# Long polling статуса задания, в секундах; больше нуля имеет смысл только при запуске через ASGI
+CHECKOUT_JOB_POLL_WAIT = env.int('CHECKOUT_JOB_POLL_WAIT', default=0)
+
 # SECURITY WARNING: don't run with debug turned on in production!
 # DEBUG = True
 DEBUG = int(env("DEBUG", default=0))
@@ -74,6 +133,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "simple_app_1.middleware.RequestIdMiddleware",
+    "simple_app_1.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -164,15 +225,35 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGLEVEL = getenv("DJANGO_LOGLEVEL", "info").upper()
 
 
+# Доступ к /metrics: запросы с этих адресов или с заголовком "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'])
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Логи приложения пишутся в файл JSON-строками одним фоновым потоком
+APP_LOG_FILE = env('APP_LOG_FILE', default=str(BASE_DIR / 'app.log'))
+APP_LOG_QUEUE_SIZE = env.int('APP_LOG_QUEUE_SIZE', default=10000)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'simple_app_1.logs.RequestIdFilter',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'ERROR',
             'class': 'logging.FileHandler',
             'filename': 'django.log',
         },
+        'app_queue': {
+            'level': 'DEBUG',
+            'class': 'simple_app_1.logs.QueueFileHandler',
+            'filename': APP_LOG_FILE,
+            'max_queue_size': APP_LOG_QUEUE_SIZE,
+            'filters': ['request_id'],
+        },
     },
     'loggers': {
         'django': {
@@ -180,7 +261,10 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'simple_app_1': {
+            'handlers': ['app_queue'],
+            'level': LOGLEVEL,
+            'propagate': False,
+        },
     },
 }
-
-